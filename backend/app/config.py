@@ -1,22 +1,116 @@
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
+class AdmissionPool(BaseModel):
+    """Пул допуска запросов: сколько выполняется одновременно, сколько ждёт и как долго"""
+    limit: int = Field(..., ge=1)
+    queue: int = Field(0, ge=0)
+    timeout_seconds: float = Field(1.0, ge=0)
+
 class Settings(BaseSettings):
     app_name: str = "Платформа учёта урожая"
     debug: bool = True
     database_url: str = os.getenv("DATABASE_URL")
+    # Реплики только для чтения (GET-запросы журнала, статистики, справочников)
+    database_replica_urls: List[str] = []
+    # Реплика, не ответившая при подключении, исключается на это время
+    replica_retry_seconds: int = Field(30, ge=1)
+    # Пул соединений
+    pool_size: int = Field(5, ge=1)
+    max_overflow: int = Field(10, ge=0)
+    pool_timeout: int = Field(30, ge=1)
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # Ограничение времени выполнения запроса (только PostgreSQL), мс
+    statement_timeout_ms: Optional[int] = None
+    # Применять миграции при старте (удобно для разработки; в продакшене — python manage.py migrate)
+    auto_migrate: bool = False
+    # Асинхронный режим: роутеры работают как async def поверх AsyncSession
+    database_async: bool = False
+    # URL для async-драйвера; по умолчанию выводится из database_url (aiosqlite / asyncpg)
+    async_database_url: Optional[str] = None
     cors_origins: List[str] = [
         "http://localhost:5173",
         "http://localhost:3000",
         "http://127.0.0.1:5173",
         "http://127.0.0.1:3000",
     ]
+    # Хеширование паролей: стоимость bcrypt и отдельный ограниченный пул исполнителей
+    bcrypt_rounds: int = Field(12, ge=4, le=31)
+    password_hash_executor: str = Field("thread", pattern="^(thread|process)$")
+    password_hash_workers: int = Field(2, ge=1)
+    # Сколько запросов может ждать пул сверх занятых исполнителей; дальше — сразу 503
+    password_hash_queue_limit: int = Field(8, ge=0)
+    # Токены и кэши аутентификации
+    access_token_ttl_minutes: int = Field(60 * 24, ge=1)
+    token_cache_size: int = Field(4096, ge=1)
+    user_cache_size: int = Field(1024, ge=1)
+    user_cache_ttl_seconds: int = Field(30, ge=0)
+    # Резерв товара при оформлении заказа: срок оплаты и период проверки просроченных резервов (0 — не проверять)
+    reservation_ttl_minutes: int = Field(15, ge=1)
+    reservation_sweep_seconds: int = Field(30, ge=0)
+    # Справочники бригад, сборщиков и категорий в памяти воркера: как часто сверять их версию с базой
+    # (изменения других воркеров видны не позже этого срока; 0 — сверять при каждом обращении)
+    reference_check_seconds: float = Field(1.0, ge=0)
+    # Кэш списков каталога: как часто сверять версию каталога с базой (изменения других воркеров,
+    # в т.ч. остатки после заказов, видны не позже этого срока; 0 — сверять при каждом обращении)
+    catalog_check_seconds: float = Field(1.0, ge=0)
+    # Приём взвешиваний (POST /api/harvest/ingest): с буфером записи копятся в памяти воркера и пишутся
+    # пачкой по batch_rows записей или раз в flush_ms; durable — отвечать только после commit() пачки
+    harvest_ingest_buffered: bool = False
+    harvest_ingest_durable: bool = False
+    harvest_ingest_batch_rows: int = Field(500, ge=1)
+    harvest_ingest_flush_ms: int = Field(200, ge=1)
+    harvest_ingest_max_pending: int = Field(20000, ge=1)
+    # Сколько раз пробовать записать строку, которая падает не из-за соединения, прежде чем отклонить её
+    harvest_ingest_max_attempts: int = Field(3, ge=1)
+    # Допуск запросов: тяжёлые маршруты ограничены своими пулами и не вытесняют дешёвые;
+    # сверх лимита и очереди (или по истечении ожидания) — сразу 503 с Retry-After
+    admission_enabled: bool = True
+    admission_pools: Dict[str, AdmissionPool] = {
+        "analytics": AdmissionPool(limit=4, queue=8, timeout_seconds=2),
+        "bulk": AdmissionPool(limit=2, queue=2, timeout_seconds=5),
+        "journal": AdmissionPool(limit=8, queue=16, timeout_seconds=2),
+        "catalog": AdmissionPool(limit=32, queue=64, timeout_seconds=1),
+        "ingest": AdmissionPool(limit=256, queue=256, timeout_seconds=1),
+        "default": AdmissionPool(limit=16, queue=32, timeout_seconds=2),
+    }
+    # Префикс пути -> пул (берётся самый длинный совпавший); остальное — пул default
+    admission_routes: Dict[str, str] = {
+        "/api/harvest/stats": "analytics",
+        "/api/harvest/export": "bulk",
+        "/api/harvest/import": "bulk",
+        "/api/harvest/ingest": "ingest",
+        "/api/harvest": "journal",
+        "/api/products": "catalog",
+    }
+    # Приоритетные маршруты: проходят без очереди и лимитов
+    admission_exempt: List[str] = ["/health", "/metrics", "/assets/", "/images/", "/site"]
+    # Продакшен-запуск (python serve.py): воркеров — 0 значит по числу доступных ядер (с учётом квоты контейнера);
+    # keep-alive простаивающего соединения, очередь соединений ядра, предел соединений воркера (сверх — 503)
+    # и сколько секунд при остановке дослуживаются начатые запросы
+    server_host: str = "0.0.0.0"
+    server_port: int = Field(8000, ge=1, le=65535)
+    server_workers: int = Field(0, ge=0)
+    server_keep_alive_seconds: int = Field(5, ge=1)
+    server_backlog: int = Field(2048, ge=1)
+    server_limit_concurrency: Optional[int] = Field(None, ge=1)
+    server_graceful_timeout_seconds: int = Field(30, ge=1)
+    server_access_log: bool = False
+    # Запросы дольше порога (мс) пишутся в журнал вместе с самыми медленными SQL; 0 — не писать
+    slow_request_ms: int = Field(500, ge=0)
+    slow_request_statements: int = Field(3, ge=0)
     static_dir: str = "static"
     images_dir: str = "static/images"
+    # Страницы и стили фронтенда; отдаются с /site/ и /assets/ вместе со static_dir
+    frontend_dir: str = "../frontend"
+    # Сжатые варианты, HTML с версионированными ссылками и manifest.json
+    static_build_dir: str = "static/.build"
 
     class Config:
         env_file = ".env"
@@ -1,27 +1,257 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from contextlib import contextmanager
+import itertools
+import threading
+import time
 from .config import settings
+from .functional.request_metrics import record_query
 
-# Определяем connect_args в зависимости от типа базы данных
-connect_args = {}
-if settings.database_url.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+class MeteredQueuePool(QueuePool):
+    """QueuePool, который считает время ожидания свободного соединения"""
 
-engine = create_engine(
-    settings.database_url,
-    connect_args=connect_args
-)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+def make_connect_args(url: str) -> dict:
+    """connect_args в зависимости от типа базы данных"""
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    if url.startswith("postgresql") and settings.statement_timeout_ms:
+        return {"options": f"-c statement_timeout={settings.statement_timeout_ms}"}
+    return {}
+
+def instrument_engine(db_engine):
+    """Хуки движка: время каждого SQL-запроса попадает в статистику текущего HTTP-запроса"""
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - conn.info.pop("query_started", time.perf_counter()))
+
+    return db_engine
+
+def make_engine(url: str):
+    """Движок с настройками пула из Settings"""
+    return instrument_engine(create_engine(
+        url,
+        connect_args=make_connect_args(url),
+        poolclass=MeteredQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping
+    ))
+
+# Для async-драйверов передаём только общие для них параметры
+connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+engine = make_engine(settings.database_url)
+replica_engines = [make_engine(url) for url in settings.database_replica_urls]
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+class ReplicaRouter:
+    """Выбор соединения для чтения: реплики по кругу, при недоступности — основная база.
+
+    Работает и с асинхронными движками (connect_async); отметки о недоступных репликах
+    общие для всех потоков и меняются под блокировкой.
+    """
+
+    def __init__(self, primary, replicas, retry_seconds: int):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._order = itertools.cycle(range(len(replicas))) if replicas else None
+        self._down_until = [0.0] * len(replicas)
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._order)
+            indexes = [(start + shift) % len(self.replicas) for shift in range(len(self.replicas))]
+            return [index for index in indexes if self._down_until[index] <= now]
+
+    def _mark_down(self, index: int):
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def connect(self):
+        for index in self._candidates():
+            try:
+                return self.replicas[index].connect()
+            except DBAPIError:
+                self._mark_down(index)
+        return self.primary.connect()
+
+    async def connect_async(self):
+        """То же для AsyncEngine: открытое AsyncConnection"""
+        for index in self._candidates():
+            try:
+                return await self.replicas[index].connect()
+            except DBAPIError:
+                self._mark_down(index)
+        return await self.primary.connect()
+
+    def replica_status(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [{"healthy": down_until <= now} for down_until in self._down_until]
+
+replica_router = ReplicaRouter(engine, replica_engines, settings.replica_retry_seconds)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
-    finally: 
+    finally:
+        db.close()
+
+@contextmanager
+def read_session():
+    """Сессия только для чтения на реплике (или на основной базе, если реплик нет)"""
+    connection = replica_router.connect()
+    db = SessionLocal(bind=connection)
+    try:
+        yield db
+    finally:
         db.close()
+        connection.close()
+
+def get_read_db():
+    with read_session() as db:
+        yield db
+
+def pool_metrics(db_engine) -> dict:
+    pool = db_engine.pool
+    metrics = {"status": pool.status()}
+    if isinstance(pool, QueuePool):
+        metrics.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    if isinstance(pool, MeteredQueuePool):
+        metrics.update(
+            checkouts=pool.wait_count,
+            wait_seconds_total=round(pool.wait_seconds_total, 6),
+            wait_seconds_max=round(pool.wait_seconds_max, 6)
+        )
+    return metrics
+
+def database_metrics() -> dict:
+    """Метрики пулов основной базы и реплик (и асинхронных движков в async-режиме)"""
+    metrics = {
+        "primary": pool_metrics(engine),
+        "replicas": [
+            {**pool_metrics(replica), **status}
+            for replica, status in zip(replica_engines, replica_router.replica_status())
+        ]
+    }
+    if async_engine is not None:
+        metrics["async"] = {
+            "primary": pool_metrics(async_engine.sync_engine),
+            "replicas": [
+                {**pool_metrics(replica.sync_engine), **status}
+                for replica, status in zip(async_replica_engines, async_replica_router.replica_status())
+            ]
+        }
+    return metrics
+
+def upsert_insert(db, model):
+    """INSERT с поддержкой ON CONFLICT для диалекта сессии (PostgreSQL или SQLite)"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def make_async_url(url: str) -> str:
+    """URL синхронного драйвера -> URL асинхронного (sqlite -> aiosqlite, postgresql -> asyncpg)"""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}[dialect]
+    return f"{dialect}+{driver}://{rest}"
+
+def make_async_engine(url: str):
+    """Асинхронный движок с теми же настройками пула, что и у синхронного"""
+    return create_async_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping
+    )
+
+# Асинхронные движки создаются только в async-режиме (нужен aiosqlite или asyncpg);
+# чтение, как и в синхронном режиме, идёт на реплики через ReplicaRouter
+async_engine = None
+async_replica_engines = []
+async_replica_router = None
+AsyncSessionLocal = None
+if settings.database_async:
+    async_engine = make_async_engine(settings.async_database_url or make_async_url(settings.database_url))
+    async_replica_engines = [make_async_engine(make_async_url(url)) for url in settings.database_replica_urls]
+    for db_engine in [async_engine, *async_replica_engines]:
+        instrument_engine(db_engine.sync_engine)
+    async_replica_router = ReplicaRouter(async_engine, async_replica_engines, settings.replica_retry_seconds)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engines():
+    """Закрыть соединения асинхронных пулов при остановке (потоки aiosqlite иначе держат процесс)"""
+    for db_engine in [async_engine, *async_replica_engines]:
+        if db_engine is not None:
+            await db_engine.dispose()
+
+async def get_async_read_db():
+    """Асинхронная сессия только для чтения на реплике (или на основной базе, если реплик нет)"""
+    connection = await async_replica_router.connect_async()
+    try:
+        async with AsyncSessionLocal(bind=connection) as db:
+            yield db
+    finally:
+        await connection.close()
+
+# Индексы прежних версий моделей, которые не используются ни одним запросом
+OBSOLETE_INDEXES = (
+    "ix_users_birth_date", "ix_users_address", "ix_users_gender", "ix_users_hobby", "ix_users_blood_group",
+    "ix_collectors_full_name", "ix_collectors_birth_year", "ix_products_name", "ix_harvest_logs_harvest_date",
+)
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+def sync_indexes():
+    """Привести индексы существующей базы к моделям: создать недостающие, удалить устаревшие.
+    Представления пропускаются (журнал в SQLite — представление над таблицами сезонов)"""
+    with engine.begin() as connection:
+        for name in OBSOLETE_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        views = set(inspect(connection).get_view_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name in views:
+                continue
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
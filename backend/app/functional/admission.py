@@ -0,0 +1,130 @@
+from starlette.responses import JSONResponse
+import asyncio
+import math
+from ..config import settings
+
+SHED_DETAIL = "Сервер перегружен, повторите попытку позже"
+
+
+class AdmissionPool:
+    """Ограничение одновременных запросов одного пула с короткой очередью.
+
+    Работает в цикле событий воркера: запрос либо занимает слот, либо ждёт в очереди
+    не дольше timeout_seconds, либо (очередь полна / время вышло) сразу получает 503.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, timeout_seconds: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout_seconds = timeout_seconds
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.queue or not self.timeout_seconds:
+                self.shed["queue_full"] += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self.shed["timeout"] += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def retry_after(self) -> str:
+        return str(max(1, math.ceil(self.timeout_seconds)))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit, "queue": self.queue, "in_flight": self.in_flight, "waiting": self.waiting,
+            "admitted": self.admitted, "shed": dict(self.shed),
+        }
+
+
+class AdmissionController:
+    """Выбор пула по префиксу пути и учёт отказов"""
+
+    def __init__(self, pools: dict, routes: dict, exempt: list):
+        self.pools = {
+            name: AdmissionPool(name, config.limit, config.queue, config.timeout_seconds)
+            for name, config in pools.items()
+        }
+        # Самые длинные префиксы проверяются первыми
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0]), reverse=True)
+        self.exempt = tuple(exempt)
+
+    def pool_for(self, path: str):
+        if path.startswith(self.exempt):
+            return None
+        for prefix, name in self.routes:
+            if path.startswith(prefix):
+                return self.pools.get(name)
+        return self.pools.get("default")
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def render_metrics(self) -> str:
+        """Метрики пулов в формате Prometheus (дописываются к /metrics)"""
+        lines = [
+            "# HELP http_admission_shed_total Запросы, отклонённые контролем допуска (503)",
+            "# TYPE http_admission_shed_total counter",
+        ]
+        lines += [
+            f'http_admission_shed_total{{pool="{name}",reason="{reason}"}} {count}'
+            for name, pool in self.pools.items() for reason, count in pool.shed.items()
+        ]
+        for metric, description, kind, attribute in (
+            ("http_admission_admitted_total", "Запросы, допущенные к выполнению", "counter", "admitted"),
+            ("http_admission_in_flight", "Выполняющиеся запросы пула", "gauge", "in_flight"),
+            ("http_admission_waiting", "Запросы в очереди пула", "gauge", "waiting"),
+        ):
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+            lines += [f'{metric}{{pool="{name}"}} {getattr(pool, attribute)}' for name, pool in self.pools.items()]
+        return "\n".join(lines) + "\n"
+
+
+admission_controller = AdmissionController(
+    settings.admission_pools, settings.admission_routes, settings.admission_exempt
+)
+
+
+class AdmissionControlMiddleware:
+    """ASGI-middleware допуска: слот пула держится до конца ответа (включая потоковую выгрузку)"""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        pool = self.controller.pool_for(scope["path"]) if scope["type"] == "http" else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await pool.acquire():
+            response = JSONResponse(
+                {"detail": SHED_DETAIL}, status_code=503, headers={"Retry-After": pool.retry_after()}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
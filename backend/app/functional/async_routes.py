@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.params import Depends as DependsParam
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+import inspect
+from ..database import get_db, get_read_db, get_async_db, get_async_read_db
+
+# Зависимость синхронной сессии -> асинхронная: чтение остаётся на репликах
+ASYNC_DEPENDENCIES = {get_db: get_async_db, get_read_db: get_async_read_db}
+
+
+def _db_parameter(endpoint):
+    """Имя параметра сессии (Depends(get_db) или Depends(get_read_db)) у обработчика или None"""
+    for parameter in inspect.signature(endpoint).parameters.values():
+        if isinstance(parameter.default, DependsParam) and parameter.default.dependency in ASYNC_DEPENDENCIES:
+            return parameter.name
+    return None
+
+
+def run_sync_endpoint(endpoint, db_name: str, response_model=None):
+    """Обернуть синхронный обработчик в async def поверх AsyncSession.
+
+    Тело обработчика выполняется через AsyncSession.run_sync: обычный ORM-код работает
+    на асинхронном драйвере, не занимая поток пула. Ответ сериализуется там же, пока
+    ленивые связи ещё можно подгрузить.
+    """
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+
+    async def wrapper(**kwargs):
+        db = kwargs.pop(db_name)
+
+        def call(sync_db):
+            result = endpoint(**kwargs, **{db_name: sync_db})
+            if adapter is None or isinstance(result, Response):
+                return result
+            return jsonable_encoder(adapter.validate_python(result, from_attributes=True))
+
+        return await db.run_sync(call)
+
+    signature = inspect.signature(endpoint)
+    wrapper.__signature__ = signature.replace(parameters=[
+        parameter.replace(default=Depends(ASYNC_DEPENDENCIES[parameter.default.dependency]))
+        if parameter.name == db_name else parameter
+        for parameter in signature.parameters.values()
+    ])
+    wrapper.__name__ = endpoint.__name__
+    wrapper.__doc__ = endpoint.__doc__
+    return wrapper
+
+
+def asyncify_router(router: APIRouter) -> APIRouter:
+    """Копия роутера, где синхронные обработчики с get_db стали async def.
+
+    Обработчики, уже объявленные как async def, остаются на синхронной сессии (в пуле потоков).
+    """
+    async_router = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            async_router.routes.append(route)
+            continue
+        endpoint = route.endpoint
+        db_name = _db_parameter(endpoint)
+        if db_name and not inspect.iscoroutinefunction(endpoint):
+            endpoint = run_sync_endpoint(endpoint, db_name, route.response_model)
+        async_router.add_api_route(
+            route.path,
+            endpoint,
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=route.tags,
+            dependencies=route.dependencies,
+            summary=route.summary,
+            description=route.description,
+            responses=route.responses,
+            methods=route.methods,
+            name=route.name,
+            response_class=route.response_class,
+            include_in_schema=route.include_in_schema,
+        )
+    return async_router
@@ -1,9 +1,16 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
+import asyncio
+import threading
+import time
 import bcrypt
 import jwt
 import os
+from ..config import settings
+from .ttl_cache import TTLCache
+from .request_metrics import record_timing
 
 load_dotenv()
 security = HTTPBearer()
@@ -12,22 +19,87 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
-def hash_password(password: str) -> str:
+# bcrypt выполняется в отдельном пуле ограниченного размера, чтобы всплеск входов
+# не занимал все потоки сервера; при переполнении очереди запрос сразу получает 503
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(settings.password_hash_workers + settings.password_hash_queue_limit)
+
+def _get_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            executor_class = ProcessPoolExecutor if settings.password_hash_executor == "process" else ThreadPoolExecutor
+            _hash_executor = executor_class(max_workers=settings.password_hash_workers)
+        return _hash_executor
+
+async def _run_hashing(fn, *args):
+    """Выполнить bcrypt в пуле хеширования; обработчик ждёт результат, не занимая поток сервера"""
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"}
+        )
+    started = time.perf_counter()
+    try:
+        return await asyncio.wrap_future(_get_hash_executor().submit(fn, *args))
+    finally:
+        _hash_slots.release()
+        record_timing("hash", time.perf_counter() - started)
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+async def hash_password(password: str) -> str:
     """Хеширование пароля"""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return await _run_hashing(_hashpw, password, settings.bcrypt_rounds)
 
-def verify_password(password: str, hashed: str) -> bool:
+async def verify_password(password: str, hashed: str) -> bool:
     """Проверка пароля"""
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return await _run_hashing(_checkpw, password, hashed)
+
+def password_needs_rehash(hashed: str) -> bool:
+    """Хеш посчитан с меньшей стоимостью bcrypt, чем BCRYPT_ROUNDS ($2b$<rounds>$...); более стойкие не понижаем"""
+    try:
+        return int(hashed.split("$")[2]) < settings.bcrypt_rounds
+    except (IndexError, ValueError):
+        return True
+
+def invalidate_user(user_id: int):
+    """Сбросить закэшированный профиль после изменения строки пользователя"""
+    user_cache.invalidate(user_id)
+
+def shutdown_hash_executor():
+    """Остановить пул хеширования (при завершении приложения)"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=True)
+            _hash_executor = None
+
+# Проверенные токены -> user_id (живут до exp токена) и короткоживущий кэш профилей
+token_cache = TTLCache(settings.token_cache_size)
+user_cache = TTLCache(settings.user_cache_size)
 
 def create_token(user_id: int) -> str:
     """Создание JWT токена"""
-    return jwt.encode({"user_id": user_id}, SECRET_KEY, algorithm=ALGORITHM)
+    now = int(time.time())
+    payload = {"user_id": user_id, "iat": now, "exp": now + settings.access_token_ttl_minutes * 60}
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
     """Проверка JWT токена"""
+    token = credentials.credentials
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp"]})
+        token_cache.set(token, payload["user_id"], payload["exp"])
         return payload["user_id"]
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Недействительный токен")
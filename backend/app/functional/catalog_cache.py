@@ -0,0 +1,124 @@
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from sqlalchemy import event
+from typing import Callable
+import hashlib
+import threading
+import time
+from ..config import settings
+from ..models.reference import CatalogVersion
+
+
+class CatalogCache:
+    """Кэш готовых JSON-ответов каталога в памяти процесса.
+
+    Хранит тело ответа и сильный ETag по ключу (например, фильтру category_id).
+    Записи привязаны к версии каталога в базе (одна строка catalog_version): любая запись
+    в продукты, категории или остатки вызывает changed(db) до commit(). Этот воркер сбрасывает
+    кэш сразу после фиксации, остальные — не позже чем через check_seconds, когда сверят версию.
+    Поколение не даёт положить в кэш ответ, посчитанный до сброса.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.checks = 0
+
+    def changed(self, db: Session):
+        """Отметить изменение каталога в текущей транзакции (вызывать последним перед commit():
+        строка версии блокируется до конца транзакции)"""
+        db.query(CatalogVersion).filter(CatalogVersion.id == 1).update(
+            {CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False
+        )
+        db.info["catalog_changed"] = True
+
+    def invalidate(self):
+        """Сбросить кэш воркера и сверить версию при следующем обращении"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._checked_at = 0.0
+
+    def _check_version(self, db: Session):
+        """Сверить версию каталога с базой не чаще check_seconds; другая версия сбрасывает кэш"""
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_seconds:
+                return
+        version = db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() or 0
+        with self._lock:
+            self.checks += 1
+            if version != self._version:
+                self._entries.clear()
+                self._generation += 1
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def get_or_build(self, db: Session, key, build: Callable[[], bytes]) -> tuple:
+        """Вернуть (тело, ETag) из кэша или построить через build()"""
+        self._check_version(db)
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+            if entry:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        body = build()
+        entry = (body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+        return entry
+
+    def respond(self, request: Request, db: Session, key, build: Callable[[], bytes]) -> Response:
+        """Ответ с ETag; 304, если у клиента уже актуальная версия"""
+        body, etag = self.get_or_build(db, key, build)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        client_etags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+        if etag in client_etags:
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "checks": self.checks,
+                "entries": len(self._entries),
+            }
+
+
+# Кэш списков каталога, общий для роутеров продуктов и заказов (оформление и отмена меняют остатки)
+catalog_cache = CatalogCache(settings.catalog_check_seconds)
+
+
+@event.listens_for(Session, "after_commit")
+def _catalog_committed(session):
+    if session.info.pop("catalog_changed", False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _catalog_rolled_back(session):
+    session.info.pop("catalog_changed", None)
+
+
+def create_catalog_version(db: Session):
+    """Миграция: таблица версии каталога с единственной строкой"""
+    CatalogVersion.__table__.create(db.get_bind(), checkfirst=True)
+    if db.query(CatalogVersion.id).filter(CatalogVersion.id == 1).first() is None:
+        db.add(CatalogVersion(id=1, version=0))
+        db.commit()
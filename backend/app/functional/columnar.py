@@ -0,0 +1,70 @@
+from fastapi import HTTPException, Request, Response, status
+from datetime import date
+from typing import Optional
+import json
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необязателен: без него доступен только колоночный JSON
+    msgpack = None
+
+COLUMNAR_JSON = "application/vnd.garden.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.garden.columnar+msgpack"
+MSGPACK_MEDIA_TYPES = (COLUMNAR_MSGPACK, "application/msgpack", "application/x-msgpack")
+
+# Один URL отдаёт разные представления — кэши должны различать их по Accept
+VARY = {"Vary": "Accept"}
+
+
+def negotiate_columnar(request: Request, response: Response) -> Optional[str]:
+    """Запрошенный компактный формат по заголовку Accept: "json", "msgpack" или None (обычный JSON).
+
+    Vary: Accept ставится на ответ при любом исходе, в том числе обычному JSON: иначе кэш,
+    сохранивший его, отдаст JSON и клиенту, просившему колонки (и наоборот).
+    """
+    response.headers.update(VARY)
+    accept = request.headers.get("accept", "")
+    if COLUMNAR_JSON in accept:
+        return "json"
+    if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        if msgpack is None:
+            raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="MessagePack недоступен на сервере", headers=VARY)
+        return "msgpack"
+    return None
+
+
+def _plain_column(values: list) -> list:
+    # Даты и время — строками ISO, как в обычном JSON-ответе (MessagePack их не кодирует)
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, date):
+        return [value.isoformat() if value is not None else None for value in values]
+    return values
+
+
+def columnar_payload(keys, rows, lookups: dict = None, **extra) -> dict:
+    """Колоночное представление строк запроса (кортежей) без объектов на строку.
+
+    lookups — {имя справочника: (колонка id, колонка названия)}: названия не повторяются
+    в каждой строке, а выносятся в справочник {"id": [...], "name": [...]}.
+    """
+    lookups = lookups or {}
+    columns = dict(zip(keys, (list(column) for column in zip(*rows)))) if rows else {key: [] for key in keys}
+
+    tables = {}
+    for name, (id_column, name_column) in lookups.items():
+        table = dict(zip(columns[id_column], columns.pop(name_column)))
+        tables[name] = {"id": list(table), "name": list(table.values())}
+
+    return {
+        "count": len(rows),
+        "columns": {key: _plain_column(values) for key, values in columns.items()},
+        "lookups": tables,
+        **extra,
+    }
+
+
+def columnar_response(payload: dict, fmt: str) -> Response:
+    if fmt == "msgpack":
+        return Response(msgpack.packb(payload, use_bin_type=True), media_type=COLUMNAR_MSGPACK, headers=VARY)
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return Response(body, media_type=COLUMNAR_JSON, headers=VARY)
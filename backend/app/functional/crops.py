@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import inspect, text
+import difflib
+import threading
+import time
+from ..database import upsert_insert
+from ..models.crops import Crop
+from ..models.harvest import HarvestLog
+
+# Порог похожести для нечёткого поиска (опечатки, формы слова)
+FUZZY_RATIO = 0.8
+
+
+def normalize_crop_name(name: str) -> str:
+    """Ключ культуры: регистр, ё/е, лишние пробелы и окончание множественного числа не важны"""
+    key = " ".join(name.lower().replace("ё", "е").split())
+    if len(key) > 4 and key[-1] in "ыи":
+        key = key[:-1]
+    return key
+
+
+class CropDictionary:
+    """Справочник культур в памяти процесса: поиск по префиксу, подстроке и нечёткий.
+
+    Справочник маленький, поэтому держим его целиком и перечитываем раз в refresh_seconds
+    (или сразу, если встретилось незнакомое название), чтобы видеть культуры других воркеров.
+    """
+
+    def __init__(self, refresh_seconds: int = 60):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._entries = None  # normalized_name -> (id, name)
+        self._loaded_at = 0.0
+
+    def reload(self, db: Session):
+        entries = {
+            crop.normalized_name: (crop.id, crop.name)
+            for crop in db.query(Crop.id, Crop.name, Crop.normalized_name)
+        }
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+        return entries
+
+    def entries(self, db: Session) -> dict:
+        with self._lock:
+            entries = self._entries
+            stale = entries is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+        return self.reload(db) if stale else entries
+
+    def search(self, db: Session, query: str) -> list:
+        """id культур, подходящих под строку поиска"""
+        needle = normalize_crop_name(query)
+        return [
+            crop_id for key, (crop_id, _) in self.entries(db).items()
+            if key.startswith(needle) or needle in key
+            or difflib.SequenceMatcher(None, needle, key).ratio() >= FUZZY_RATIO
+        ]
+
+    def search_names(self, db: Session, query: str) -> list:
+        """Каноничные названия культур, подходящих под строку поиска (для таблиц итогов без crop_id)"""
+        ids = set(self.search(db, query))
+        return [name for crop_id, name in self.entries(db).values() if crop_id in ids]
+
+    def resolve(self, db: Session, name: str) -> tuple:
+        """(id, название) культуры по введённому названию; новая культура добавляется в справочник"""
+        key = normalize_crop_name(name)
+        entry = self.entries(db).get(key) or self.reload(db).get(key)
+        if entry:
+            return entry
+
+        # ON CONFLICT DO NOTHING: ту же культуру мог одновременно добавить другой запрос
+        db.execute(
+            upsert_insert(db, Crop)
+            .values(name=" ".join(name.split()), normalized_name=key)
+            .on_conflict_do_nothing(index_elements=["normalized_name"])
+        )
+        crop = db.query(Crop.id, Crop.name).filter(Crop.normalized_name == key).one()
+        # Перечитаем справочник при следующем обращении — уже после фиксации транзакции
+        with self._lock:
+            self._loaded_at = 0.0
+        return crop.id, crop.name
+
+
+crop_dictionary = CropDictionary()
+
+
+def migrate_crop_dictionary(db: Session) -> int:
+    """Миграция существующей базы на справочник культур.
+
+    Создаёт таблицу crops и колонку harvest_logs.crop_id с индексом, затем заполняет
+    справочник по уже введённым названиям и проставляет crop_id и каноничное название.
+    Возвращает число обновлённых записей журнала.
+    """
+    bind = db.get_bind()
+    Crop.__table__.create(bind, checkfirst=True)
+    if "crop_id" not in {column["name"] for column in inspect(bind).get_columns("harvest_logs")}:
+        db.execute(text("ALTER TABLE harvest_logs ADD COLUMN crop_id INTEGER REFERENCES crops(id)"))
+        db.commit()
+    # После разбиения журнала SQLite по сезонам индексы живут в таблицах сезонов
+    if HarvestLog.__tablename__ not in inspect(bind).get_view_names():
+        for index in HarvestLog.__table__.indexes:
+            if index.columns.keys() == ["crop_id"]:
+                index.create(bind, checkfirst=True)
+
+    updated = 0
+    names = [row[0] for row in db.query(HarvestLog.crop_type).filter(HarvestLog.crop_id.is_(None)).distinct()]
+    for name in names:
+        crop_id, crop_name = crop_dictionary.resolve(db, name)
+        updated += db.query(HarvestLog).filter(
+            HarvestLog.crop_id.is_(None), HarvestLog.crop_type == name
+        ).update({HarvestLog.crop_id: crop_id, HarvestLog.crop_type: crop_name}, synchronize_session=False)
+    db.commit()
+    return updated
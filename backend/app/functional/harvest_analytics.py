@@ -0,0 +1,188 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import Date, cast, func, select
+from datetime import date
+from ..models.harvest import HarvestDailyStat, HarvestCollectorDailyStat
+from ..models.collectors import Collector
+from ..models.brigades import Brigade
+
+# Все выборки идут по суточным итогам, а не по журналу: стоимость зависит от числа дней
+# и групп, а ограничение на число точек держит её в рамках и на многолетних периодах
+MAX_TIMESERIES_BUCKETS = 400
+MAX_TIMESERIES_GROUPS = 50
+
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 28}
+
+# Группировка -> (таблица итогов, колонка): по сборщикам — отдельные итоги HarvestCollectorDailyStat
+GROUP_COLUMNS = {
+    "crop": (HarvestDailyStat, "crop_type"),
+    "brigade": (HarvestDailyStat, "brigade_id"),
+    "collector": (HarvestCollectorDailyStat, "collector_id"),
+    "grade": (HarvestDailyStat, "quality_grade"),
+}
+
+# Названия для групп по id
+GROUP_NAMES = {
+    "brigade": (Brigade.id, Brigade.name),
+    "collector": (Collector.id, Collector.full_name),
+}
+
+
+def bucket_expression(db: Session, bucket: str, table=HarvestDailyStat):
+    """Начало интервала (день, понедельник недели, первое число месяца) для диалекта сессии"""
+    column = table.harvest_date
+    if bucket == "day":
+        return column
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc(bucket, column), Date)
+    if bucket == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", column)
+
+
+def _iso(value) -> str:
+    # SQLite возвращает даты из выражений строками, PostgreSQL — объектами date
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _date_range(db: Session, start_date, end_date, bucket: str) -> tuple:
+    if start_date is None or end_date is None:
+        first, last = db.query(
+            func.min(HarvestDailyStat.harvest_date), func.max(HarvestDailyStat.harvest_date)
+        ).one()
+        start_date = start_date or first
+        end_date = end_date or last
+    if start_date and end_date:
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="Начало периода позже его конца")
+        buckets = (end_date - start_date).days // BUCKET_DAYS[bucket] + 1
+        if buckets > MAX_TIMESERIES_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Слишком длинный период для интервала {bucket}: не более {MAX_TIMESERIES_BUCKETS} точек"
+            )
+    return start_date, end_date
+
+
+def _filtered(query, table, start_date, end_date, brigade_id, crop_names):
+    if start_date:
+        query = query.filter(table.harvest_date >= start_date)
+    if end_date:
+        query = query.filter(table.harvest_date <= end_date)
+    if brigade_id:
+        query = query.filter(table.brigade_id == brigade_id)
+    if crop_names is not None:
+        query = query.filter(table.crop_type.in_(crop_names))
+    return query
+
+
+def summary_statement(group_by=None, start_date=None, end_date=None):
+    """Суммы суточных итогов за период: всего (сбор и число записей) или по группе ("crop", "brigade")"""
+    table = HarvestDailyStat
+    if group_by is None:
+        statement = select(func.sum(table.total_quantity), func.sum(table.log_count))
+    else:
+        group = getattr(table, GROUP_COLUMNS[group_by][1])
+        statement = select(group, func.sum(table.total_quantity).label("total")).group_by(group)
+    return _filtered(statement, table, start_date, end_date, None, None)
+
+
+def top_groups_statement(group_by: str, start_date=None, end_date=None, brigade_id=None, crop_names=None, limit=10):
+    """Первые limit групп по сумме за период: (ключ группы, сумма)"""
+    table, column_name = GROUP_COLUMNS[group_by]
+    group = getattr(table, column_name)
+    total = func.sum(table.total_quantity)
+    return _filtered(
+        select(group, total), table, start_date, end_date, brigade_id, crop_names
+    ).group_by(group).order_by(total.desc(), group).limit(limit)
+
+
+def timeseries_statement(
+    db: Session, bucket: str, group_by: str, keys, start_date=None, end_date=None, brigade_id=None, crop_names=None
+):
+    """Точки рядов выбранных групп: (ключ, начало интервала, сумма, число записей)"""
+    table, column_name = GROUP_COLUMNS[group_by]
+    group = getattr(table, column_name)
+    period = bucket_expression(db, bucket, table).label("period")
+    return _filtered(
+        select(group, period, func.sum(table.total_quantity), func.sum(table.log_count)),
+        table, start_date, end_date, brigade_id, crop_names
+    ).filter(group.in_(keys)).group_by(group, period).order_by(group, period)
+
+
+def harvest_timeseries(
+    db: Session, bucket: str, group_by: str, start_date=None, end_date=None,
+    brigade_id=None, crop_names=None, limit: int = 10
+) -> dict:
+    """Ряды по интервалам времени: группы упорядочены по сумме за период, берутся первые limit"""
+    start_date, end_date = _date_range(db, start_date, end_date, bucket)
+    top_groups = db.execute(top_groups_statement(group_by, start_date, end_date, brigade_id, crop_names, limit)).all()
+    keys = [row[0] for row in top_groups]
+
+    points = db.execute(timeseries_statement(
+        db, bucket, group_by, keys, start_date, end_date, brigade_id, crop_names
+    )).all()
+
+    names = {}
+    if group_by in GROUP_NAMES and keys:
+        id_column, name_column = GROUP_NAMES[group_by]
+        names = dict(db.query(id_column, name_column).filter(id_column.in_(keys)).all())
+
+    series = {key: [] for key in keys}
+    for key, period_start, quantity, logs in points:
+        series[key].append({"period": _iso(period_start), "quantity": float(quantity), "logs": int(logs)})
+
+    return {
+        "bucket": bucket,
+        "group_by": group_by,
+        "start_date": start_date,
+        "end_date": end_date,
+        "series": [
+            {"key": key, "name": names.get(key, key), "total": float(group_total), "points": series[key]}
+            for key, group_total in top_groups
+        ],
+    }
+
+
+def leaderboard_statement(start_date=None, end_date=None, brigade_id=None, crop_names=None, limit: int = 10):
+    """Один SELECT: суммы по сборщикам, место (RANK) и доля от общего сбора оконными функциями"""
+    table = HarvestCollectorDailyStat
+    quantity = func.sum(table.total_quantity)
+    totals = _filtered(select(
+        table.collector_id,
+        quantity.label("quantity"),
+        func.sum(table.log_count).label("logs"),
+        func.rank().over(order_by=quantity.desc()).label("rank"),
+        (quantity / func.sum(quantity).over()).label("share"),
+    ), table, start_date, end_date, brigade_id, crop_names)
+    totals = totals.group_by(table.collector_id).subquery()
+
+    return select(
+        totals.c.rank,
+        totals.c.collector_id,
+        Collector.full_name.label("collector_name"),
+        Collector.brigade_id,
+        Brigade.name.label("brigade_name"),
+        totals.c.quantity,
+        totals.c.logs,
+        totals.c.share,
+    ).join(Collector, Collector.id == totals.c.collector_id).join(
+        Brigade, Brigade.id == Collector.brigade_id
+    ).where(totals.c.rank <= limit).order_by(totals.c.rank, totals.c.collector_id)
+
+
+def harvest_leaderboard(db: Session, **filters) -> list:
+    """Первые N сборщиков по количеству (при равенстве сумм места делятся, строк может быть больше N)"""
+    return [
+        {
+            "rank": row.rank,
+            "collector_id": row.collector_id,
+            "collector_name": row.collector_name,
+            "brigade_id": row.brigade_id,
+            "brigade_name": row.brigade_name,
+            "quantity": float(row.quantity),
+            "logs": int(row.logs),
+            "share": round(float(row.share), 4),
+        }
+        for row in db.execute(leaderboard_statement(**filters))
+    ]
@@ -0,0 +1,125 @@
+from sqlalchemy import select, tuple_
+from typing import Iterator
+import csv
+import heapq
+import io
+import itertools
+import json
+from ..models.harvest import HarvestLog
+from ..models.collectors import Collector
+from ..models.brigades import Brigade
+from .harvest_partitions import JOURNAL_COLUMNS
+
+# Сколько строк забирать из серверного курсора за один раз (и отдавать одним чанком)
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    "id", "harvest_date", "collector_id", "collector_name", "brigade_id", "brigade_name",
+    "crop_type", "quantity", "quality_grade", "notes", "created_at",
+)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_statement(log=HarvestLog):
+    """SELECT выгрузки: плоские строки без ORM-объектов, в хронологическом порядке.
+
+    log — колонки таблицы журнала (HarvestLog или table.c таблицы архива сезона).
+    """
+    return select(
+        log.id,
+        log.harvest_date,
+        log.collector_id,
+        Collector.full_name.label("collector_name"),
+        log.brigade_id,
+        Brigade.name.label("brigade_name"),
+        log.crop_type,
+        log.quantity,
+        log.quality_grade,
+        log.notes,
+        log.created_at,
+    ).join(Collector, Collector.id == log.collector_id).join(
+        Brigade, Brigade.id == log.brigade_id
+    ).order_by(log.harvest_date, log.id)
+
+
+def filter_harvest_logs(query, start_date, end_date, collector_id, brigade_id, crop_ids, log=HarvestLog):
+    """Общие фильтры журнала (для Query и select()); crop_ids — результат поиска по справочнику культур,
+    log — колонки таблицы журнала (HarvestLog или table.c таблицы архива сезона)"""
+    if start_date:
+        query = query.filter(log.harvest_date >= start_date)
+    if end_date:
+        query = query.filter(log.harvest_date <= end_date)
+    if collector_id:
+        query = query.filter(log.collector_id == collector_id)
+    if brigade_id:
+        query = query.filter(log.brigade_id == brigade_id)
+    if crop_ids is not None:
+        query = query.filter(log.crop_id.in_(crop_ids))
+    return query
+
+
+def journal_page_statement(
+    log=HarvestLog, columnar: bool = False, start_date=None, end_date=None, collector_id=None,
+    brigade_id=None, crop_ids=None, after=None, limit: int = 50
+):
+    """SELECT страницы журнала по убыванию (harvest_date, id), строго после курсора after.
+
+    Для колоночного ответа — плоские кортежи выгрузки с именами, иначе только колонки журнала
+    (имена сборщиков и бригад берутся из справочников в памяти, без JOIN).
+    """
+    if columnar:
+        query = export_statement(log).order_by(None)
+    else:
+        query = select(*[getattr(log, name) for name in JOURNAL_COLUMNS])
+    query = filter_harvest_logs(query, start_date, end_date, collector_id, brigade_id, crop_ids, log)
+    # Keyset-пагинация: продолжаем строго после последней записи предыдущей страницы
+    if after:
+        query = query.filter(tuple_(log.harvest_date, log.id) < tuple_(*after))
+    return query.order_by(log.harvest_date.desc(), log.id.desc()).limit(limit)
+
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        # BOM, чтобы Excel открывал кириллицу в UTF-8
+        buffer.write("\ufeff")
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=lambda value: value.isoformat()) + "\n"
+        for row in rows
+    )
+
+
+def iter_export(session_scope, statements: list, file_format: str) -> Iterator[str]:
+    """Генератор чанков выгрузки.
+
+    Строки читаются через серверный курсор (stream_results) пачками по EXPORT_BATCH_SIZE,
+    поэтому память не растёт с размером диапазона. Сессия своя (session_scope — контекстный
+    менеджер сессии): генератор живёт дольше запроса. Несколько запросов (журнал и архивы
+    сезонов) читаются одновременно и сливаются в общий хронологический порядок.
+    """
+    if file_format == "csv":
+        yield _csv_chunk([], header=True)
+
+    with session_scope() as db:
+        results = [
+            db.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+            for stmt in statements
+        ]
+        if len(results) == 1:
+            batches = results[0].partitions()
+        else:
+            merged = heapq.merge(*results, key=lambda row: (row.harvest_date, row.id))
+            batches = iter(lambda: list(itertools.islice(merged, EXPORT_BATCH_SIZE)), [])
+        for rows in batches:
+            yield _csv_chunk(rows) if file_format == "csv" else _ndjson_chunk(rows)
@@ -0,0 +1,213 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from pydantic import ValidationError
+from typing import AsyncIterator
+from collections import deque
+import codecs
+import csv
+import json
+from ..database import SessionLocal
+from ..schemas.schemas import HarvestLogCreate
+from ..models.harvest import HarvestLog
+from ..models.collectors import Collector
+from .harvest_rollup import apply_harvest_rows
+from .crops import crop_dictionary
+from .harvest_partitions import NO_PARTITION, SEASON_CLOSED, assign_log_ids, season_partitions
+from .reference_cache import reference_cache
+
+# Запись CSV длиннее этого (незакрытая кавычка) отклоняется, чтобы не копить остаток файла в памяти
+MAX_CSV_RECORD_CHARS = 1 << 20
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Построчное чтение потока тела запроса без загрузки файла целиком в память (строки — вместе с переводом строки)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in stream:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split("\n")
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _LineFeed:
+    """Источник строк для одного csv.reader на весь файл: строки подкладываются по мере чтения потока"""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _parse_csv(reader, feed: _LineFeed, header: list) -> tuple:
+    """Разобрать все записи из подложенных строк: (заголовок, [(номер строки, поля или ошибка)])"""
+    records = []
+    while feed.lines:
+        start = reader.line_num + 1
+        try:
+            values = next(reader)
+        except csv.Error as e:
+            records.append((start, f"Ошибка разбора CSV: {e}"))
+            continue
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = values
+        elif len(values) != len(header):
+            records.append((start, "Число полей не совпадает с заголовком"))
+        else:
+            # Пустые ячейки CSV считаем отсутствующими значениями
+            records.append((start, {key: value for key, value in zip(header, values) if value != ""}))
+    return header, records
+
+
+async def _iter_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """Записи CSV одним csv.reader на весь поток; номер — строка файла, с которой начинается запись.
+
+    Поле в кавычках может содержать переводы строк: строки копятся, пока число кавычек не станет
+    чётным, и только тогда reader разбирает запись целиком.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed, strict=True)
+    header = None
+    pending = 0
+    quotes = 0
+    async for line in iter_lines(stream):
+        feed.lines.append(line)
+        pending += len(line)
+        quotes += line.count('"')
+        # Незакрытая кавычка: после MAX_CSV_RECORD_CHARS reader разбирает что есть и сообщает об ошибке
+        if quotes % 2 and pending <= MAX_CSV_RECORD_CHARS:
+            continue
+        header, records = _parse_csv(reader, feed, header)
+        pending = quotes = 0
+        for record in records:
+            yield record
+    _, records = _parse_csv(reader, feed, header)
+    for record in records:
+        yield record
+
+
+async def iter_records(stream: AsyncIterator[bytes], file_format: str) -> AsyncIterator[tuple]:
+    """Записи файла импорта: пары (номер строки файла, словарь полей или текст ошибки разбора).
+
+    CSV — первая запись заголовок, поля в кавычках могут занимать несколько строк;
+    NDJSON — один JSON-объект на строку.
+    """
+    if file_format == "csv":
+        async for record in _iter_csv(stream):
+            yield record
+        return
+    line_number = 0
+    async for line in iter_lines(stream):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, "Некорректный JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Ожидается JSON-объект"
+            continue
+        yield line_number, record
+
+
+def load_memberships(db: Session, collector_ids, memberships: dict):
+    """Дополнить кэш «сборщик → бригада» одним запросом — только для ещё неизвестных сборщиков
+    (несуществующие запоминаются как None). Строки сборщиков блокируются на чтение до конца транзакции:
+    перевод в другую бригаду дождётся записи, иначе итоги сезона попадут не в ту бригаду"""
+    unknown = set(collector_ids) - memberships.keys()
+    if unknown:
+        memberships.update(
+            db.query(Collector.id, Collector.brigade_id).filter(Collector.id.in_(unknown))
+            .with_for_update(read=True).all()
+        )
+        for collector_id in unknown:
+            memberships.setdefault(collector_id, None)
+
+
+def insert_logs(db: Session, logs: list, memberships: dict) -> tuple:
+    """Вставить проверенные записи (пары (ключ, HarvestLogCreate)) и учесть их в итогах, без commit().
+
+    Возвращает (ключ -> (id, created_at) вставленных записей, список (ключ, ошибка) отклонённых).
+    """
+    load_memberships(db, (log.collector_id for _, log in logs), memberships)
+    closed = reference_cache.snapshot(db).archives
+    unopened = season_partitions.ensure(db, {log.harvest_date.year for _, log in logs} - closed.keys())
+    keys, rows, errors = [], [], []
+    for key, log in logs:
+        brigade_id = memberships.get(log.collector_id)
+        if brigade_id is None:
+            errors.append((key, "Сборщик не найден"))
+        elif brigade_id != log.brigade_id:
+            errors.append((key, "Сборщик не состоит в указанной бригаде"))
+        elif log.harvest_date.year in closed:
+            errors.append((key, SEASON_CLOSED))
+        elif log.harvest_date.year in unopened:
+            errors.append((key, NO_PARTITION))
+        else:
+            keys.append(key)
+            rows.append(log.dict())
+
+    # Названия культур сводим к справочнику один раз на каждое уникальное написание
+    crops = {name: crop_dictionary.resolve(db, name) for name in {row["crop_type"] for row in rows}}
+    for row in rows:
+        row["crop_id"], row["crop_type"] = crops[row["crop_type"]]
+
+    if not rows:
+        return {}, errors
+    # Многострочный INSERT ... RETURNING; id возвращаются в порядке строк
+    assign_log_ids(db.connection(), rows)
+    result = db.execute(
+        insert(HarvestLog).returning(HarvestLog.id, HarvestLog.created_at, sort_by_parameter_order=True), rows
+    )
+    inserted = dict(zip(keys, result.all()))
+    apply_harvest_rows(db, rows)
+    return inserted, errors
+
+
+def import_batch(batch: list) -> tuple:
+    """Проверить и вставить пачку записей одной транзакцией в собственной сессии
+    (пачки выполняются в пуле потоков, и сессию между ними делить нельзя).
+
+    Членство «сборщик → бригада» читается из базы в транзакции пачки: сборщика могли перевести
+    между пачками одного импорта. Возвращает (число вставленных записей, список ошибок по строкам).
+    """
+    errors = []
+    valid = []
+    for row_number, record in batch:
+        if isinstance(record, str):
+            errors.append({"row": row_number, "errors": [record]})
+            continue
+        try:
+            valid.append((row_number, HarvestLogCreate(**record)))
+        except ValidationError as e:
+            errors.append({
+                "row": row_number,
+                "errors": [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()]
+            })
+
+    db = SessionLocal()
+    try:
+        inserted, failed = insert_logs(db, valid, {})
+        if inserted:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    errors += [{"row": row_number, "errors": [message]} for row_number, message in failed]
+    errors.sort(key=lambda error: error["row"])
+    return len(inserted), errors
@@ -0,0 +1,274 @@
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.exc import DisconnectionError, IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import asyncio
+import itertools
+import logging
+import os
+import uuid
+from ..config import settings
+from ..database import SessionLocal
+from ..models.harvest import HarvestIngestReject
+from ..schemas.schemas import HarvestLogCreate
+from .harvest_import import insert_logs
+from .harvest_partitions import NO_PARTITION, SEASON_CLOSED
+from .reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+# Ошибки проверки членства -> HTTP-статус (как у create_harvest_log)
+REJECTION_STATUS = {"Сборщик не найден": 404, "Сборщик не состоит в указанной бригаде": 400, SEASON_CLOSED: 409, NO_PARTITION: 409}
+OVERLOADED = "Очередь записи журнала переполнена, повторите попытку позже"
+NOT_SAVED = "Запись не сохранена, повторите попытку позже"
+WRITE_FAILED = "Не удалось записать после {attempts} попыток: {error}"
+
+# База недоступна или перегружена: пачка повторяется целиком позже. Любая другая ошибка —
+# дело в самих строках, и пачка пишется по одной, чтобы одна строка не держала остальные
+CONNECTION_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError, OSError)
+
+
+class HarvestIngestor:
+    """Приём взвешиваний с весов с отложенной пачечной записью (write-behind).
+
+    Запись проверяется по справочнику сборщиков в памяти воркера и сразу подтверждается
+    временным идентификатором; фоновая задача пишет накопленное многострочным INSERT раз в
+    flush_ms или по набору batch_rows записей. При записи членство перепроверяется по базе
+    (справочник мог не успеть увидеть перевод сборщика в другом воркере). Отклонённая запись уже
+    подтверждена весам, поэтому она сохраняется в harvest_ingest_rejects (в той же транзакции, что и пачка)
+    и находится по временному id.
+    Пачка, упавшая не из-за соединения, пишется по одной записи; запись, которая не пишется
+    max_attempts проходов подряд, тоже отклоняется — иначе она возвращалась бы в очередь бесконечно.
+    С durable ответ отдаётся только после commit() пачки. Без запущенной задачи (буфер выключен)
+    каждая запись пишется сразу, отдельной транзакцией.
+    """
+
+    def __init__(self, batch_rows: int, flush_ms: int, max_pending: int, durable: bool, max_attempts: int = 3):
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_ms / 1000
+        self.max_pending = max_pending
+        self.durable = durable
+        self.max_attempts = max_attempts
+        self._pending = []  # (временный id, HarvestLogCreate, future или None)
+        self._attempts = {}  # временный id -> неудачных попыток записи
+        self.reset_prefix()
+        self._wake = None
+        self._task = None
+        self._stopping = False
+        self.counters = {"accepted": 0, "written": 0, "rejected": 0, "batches": 0, "failed_batches": 0, "isolated_batches": 0}
+
+    def reset_prefix(self):
+        """Свой префикс временных id у каждого процесса (в том числе у воркеров, созданных fork())"""
+        self._prefix = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+
+    @property
+    def buffered(self) -> bool:
+        return self._task is not None
+
+    def _lookup_collector(self, collector_id: int):
+        db = SessionLocal()
+        try:
+            return reference_cache.collector(db, collector_id)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save_rejects(db, batch: list, rejected: dict):
+        """Сохранить отказы по записям, которым уже ответили 202 (без ожидающего подтверждения)"""
+        rows = [
+            {**log.dict(), "provisional_id": provisional_id, "reason": rejected[provisional_id]}
+            for provisional_id, log, future in batch
+            if future is None and provisional_id in rejected
+        ]
+        if rows:
+            db.execute(insert(HarvestIngestReject), rows)
+
+    def _write(self, batch: list, save_rejects: bool = False) -> tuple:
+        """Записать пачку одной транзакцией; (временный id -> (id, created_at), [(временный id, ошибка)]).
+        save_rejects — сохранить отказы по уже подтверждённым записям (запись из буфера)"""
+        db = SessionLocal()
+        try:
+            # Членство — заново из базы, а не из справочника в памяти
+            inserted, errors = insert_logs(db, [(provisional_id, log) for provisional_id, log, _ in batch], {})
+            if save_rejects:
+                self._save_rejects(db, batch, dict(errors))
+            db.commit()
+            return inserted, errors
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _reject(self, item: tuple, message: str):
+        db = SessionLocal()
+        try:
+            self._save_rejects(db, [item], {item[0]: message})
+            db.commit()
+        finally:
+            db.close()
+
+    def _write_each(self, batch: list) -> tuple:
+        """Пачка упала не из-за соединения — пишем по одной, чтобы отклонить только виновные записи.
+        (записанные, отклонённые, на повтор); при потере соединения на повтор уходит весь остаток"""
+        inserted, errors, retry = {}, [], []
+        for index, item in enumerate(batch):
+            try:
+                try:
+                    written, rejected = self._write([item], save_rejects=True)
+                except IntegrityError:
+                    # Ограничение целостности одной строки (сборщик удалён между проверкой и записью) не пройдёт и позже
+                    written, rejected = {}, [(item[0], "Сборщик не найден")]
+                    self._reject(item, rejected[0][1])
+                except CONNECTION_ERRORS:
+                    raise
+                except Exception as e:
+                    attempts = self._attempts.get(item[0], 0) + 1
+                    logger.exception("Не удалось записать запись %s (попытка %s)", item[0], attempts)
+                    if attempts < self.max_attempts:
+                        self._attempts[item[0]] = attempts
+                        retry.append(item)
+                        continue
+                    message = WRITE_FAILED.format(attempts=attempts, error=type(e).__name__)
+                    written, rejected = {}, [(item[0], message)]
+                    self._reject(item, message)
+            except CONNECTION_ERRORS:
+                logger.exception("Соединение с базой потеряно при записи по одной")
+                retry += batch[index:]
+                break
+            self._attempts.pop(item[0], None)
+            inserted.update(written)
+            errors += rejected
+        return inserted, errors, retry
+
+    async def submit(self, log: HarvestLogCreate) -> dict:
+        """Принять запись; {provisional_id, committed, id, created_at}"""
+        provisional_id = f"{self._prefix}-{next(self._sequence)}"
+        if not self.buffered:
+            item = (provisional_id, log, None)
+            inserted, errors = await run_in_threadpool(self._write, [item])
+            return self._acknowledge(provisional_id, inserted, dict(errors))
+
+        # Справочник сверяется с базой не чаще reference_check_seconds — обычно без обращения к базе
+        collector = reference_cache.fresh_collector(log.collector_id)
+        if collector is None:
+            collector = await run_in_threadpool(self._lookup_collector, log.collector_id)
+        if collector is None:
+            raise HTTPException(status_code=404, detail="Сборщик не найден")
+        if collector.brigade_id != log.brigade_id:
+            raise HTTPException(status_code=400, detail="Сборщик не состоит в указанной бригаде")
+
+        if len(self._pending) >= self.max_pending:
+            raise HTTPException(status_code=503, detail=OVERLOADED, headers={"Retry-After": "1"})
+        future = asyncio.get_running_loop().create_future() if self.durable else None
+        self._pending.append((provisional_id, log, future))
+        self.counters["accepted"] += 1
+        if len(self._pending) >= self.batch_rows:
+            self._wake.set()
+        if future is None:
+            return {"provisional_id": provisional_id, "committed": False, "id": None, "created_at": None}
+        return await future
+
+    @staticmethod
+    def _acknowledge(provisional_id: str, inserted: dict, rejected: dict) -> dict:
+        """Подтверждение записанной записи или HTTPException для отклонённой"""
+        if provisional_id in rejected:
+            message = rejected[provisional_id]
+            raise HTTPException(status_code=REJECTION_STATUS.get(message, 400), detail=message)
+        log_id, created_at = inserted[provisional_id]
+        return {"provisional_id": provisional_id, "committed": True, "id": log_id, "created_at": created_at}
+
+    def _requeue(self, items: list):
+        """Вернуть записи в начало очереди; ждущим подтверждения — сразу отказ (503), они повторят сами"""
+        retry = []
+        for item in items:
+            if item[2] is None:
+                retry.append(item)
+            else:
+                self._attempts.pop(item[0], None)
+                if not item[2].done():
+                    item[2].set_exception(HTTPException(status_code=503, detail=NOT_SAVED))
+        self._pending[:0] = retry
+
+    async def flush(self) -> bool:
+        """Записать всё накопленное пачками по batch_rows; False — база недоступна или часть записей
+        не записалась (они остались в очереди до следующего прохода)"""
+        while self._pending:
+            batch = self._pending[:self.batch_rows]
+            del self._pending[:len(batch)]
+            retry = []
+            try:
+                inserted, errors = await run_in_threadpool(self._write, batch, True)
+            except CONNECTION_ERRORS:
+                logger.exception("Не удалось записать пачку журнала (%s записей)", len(batch))
+                self.counters["failed_batches"] += 1
+                self._requeue(batch)
+                return False
+            except Exception:
+                logger.exception("Пачка журнала (%s записей) не записана, пишем по одной", len(batch))
+                self.counters["isolated_batches"] += 1
+                inserted, errors, retry = await run_in_threadpool(self._write_each, batch)
+
+            self.counters["batches"] += 1
+            self.counters["written"] += len(inserted)
+            self.counters["rejected"] += len(errors)
+            rejected = dict(errors)
+            for provisional_id, log, future in batch:
+                if provisional_id in rejected:
+                    logger.warning(
+                        "Запись %s (сборщик %s, бригада %s) отклонена при записи пачки: %s",
+                        provisional_id, log.collector_id, log.brigade_id, rejected[provisional_id]
+                    )
+                if future is not None and not future.done() and (provisional_id in inserted or provisional_id in rejected):
+                    try:
+                        future.set_result(self._acknowledge(provisional_id, inserted, rejected))
+                    except HTTPException as e:
+                        future.set_exception(e)
+            if retry:
+                # Остальное повторим на следующем проходе: в этом база уже отвечала ошибкой
+                self._requeue(retry)
+                return False
+        return True
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        """Запустить фоновую запись (в цикле событий воркера)"""
+        if self._task is None:
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить фоновую запись и дописать всё принятое"""
+        if self._task is None:
+            return
+        # Без cancel(): пачка, которая уже пишется в пуле потоков, должна дописаться и получить подтверждения
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        if not await self.flush():
+            logger.error("При остановке не записано %s принятых записей журнала", len(self._pending))
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self.buffered, "durable": self.durable, "pending": len(self._pending),
+            **self.counters,
+        }
+
+
+harvest_ingestor = HarvestIngestor(
+    settings.harvest_ingest_batch_rows, settings.harvest_ingest_flush_ms,
+    settings.harvest_ingest_max_pending, settings.harvest_ingest_durable, settings.harvest_ingest_max_attempts,
+)
+os.register_at_fork(after_in_child=harvest_ingestor.reset_prefix)
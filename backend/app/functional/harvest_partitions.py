@@ -0,0 +1,491 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import (
+    CheckConstraint, Column, Index, Integer, MetaData, Table, event, func, insert, inspect, select, text, union_all
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+from datetime import date
+import logging
+import threading
+from ..models.harvest import HarvestLog, HarvestArchive
+from .reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+SEASON_CLOSED = "Сезон закрыт: его журнал перенесён в архив"
+NO_PARTITION = "Сезон не открыт: секцию журнала не удалось создать, повторите попытку позже"
+READ_ONLY = "Архив журнала только для чтения"
+NO_LOG_ID = "id записи журнала выделяет приложение (assign_log_ids)"
+
+JOURNAL_COLUMNS = tuple(column.name for column in HarvestLog.__table__.columns)
+
+# Таблицы сезонов SQLite, архивов и счётчик id описаны отдельно от Base.metadata:
+# create_all и sync_indexes их не трогают
+archive_metadata = MetaData()
+_archive_lock = threading.Lock()
+
+# Ключ advisory-блокировки PostgreSQL, под которой создаются секции
+PARTITION_LOCK_KEY = 20240024
+# Сколько ждать блокировок при создании секции на лету, прежде чем отказать записи
+PARTITION_LOCK_TIMEOUT = "5s"
+
+# SQLite: id записей журнала общие для всех таблиц сезонов — выдаются из одной строки-счётчика
+log_ids = Table(
+    "harvest_log_ids", archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("last_id", Integer, nullable=False),
+)
+
+
+def partition_name(season: int) -> str:
+    return f"harvest_logs_{season}"
+
+
+def season_bounds(season: int) -> tuple:
+    return date(season, 1, 1), date(season, 12, 31)
+
+
+def _journal_table(name: str, *extra) -> Table:
+    with _archive_lock:
+        if name not in archive_metadata.tables:
+            Table(
+                name, archive_metadata,
+                *[
+                    Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                    for column in HarvestLog.__table__.columns
+                ],
+                *extra,
+            )
+        return archive_metadata.tables[name]
+
+
+def archive_table(season: int) -> Table:
+    """Таблица архива сезона: колонки журнала, индексы — только под запросы журнала (без crop_id)"""
+    name = f"harvest_archive_{season}"
+    return _journal_table(
+        name,
+        Index(f"ix_{name}_date_id", "harvest_date", "id"),
+        Index(f"ix_{name}_brigade_date_id", "brigade_id", "harvest_date", "id"),
+        Index(f"ix_{name}_collector_date_id", "collector_id", "harvest_date", "id"),
+    )
+
+
+def season_table(season: int) -> Table:
+    """Таблица сезона в SQLite (аналог секции PostgreSQL): индексы журнала и CHECK на даты сезона"""
+    name = partition_name(season)
+    first, last = season_bounds(season)
+    return _journal_table(
+        name,
+        CheckConstraint(f"harvest_date BETWEEN '{first}' AND '{last}'", name=f"ck_{name}_season"),
+        *[
+            Index(index.name.replace(HarvestLog.__tablename__, name, 1), *index.columns.keys())
+            for index in HarvestLog.__table__.indexes if index.columns.keys() != ["id"]
+        ],
+    )
+
+
+def _create_partition_sql(season: int) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(season)} PARTITION OF harvest_logs "
+        f"FOR VALUES FROM ('{season}-01-01') TO ('{season + 1}-01-01')"
+    )
+
+
+def _attach_partition_sql(season: int) -> list:
+    """Секция для работающей базы: CREATE TABLE ... PARTITION OF держал бы ACCESS EXCLUSIVE на harvest_logs
+    и останавливал чтение журнала, а ATTACH PARTITION берёт SHARE UPDATE EXCLUSIVE и чтению и записи не мешает"""
+    name = partition_name(season)
+    return [
+        f"CREATE TABLE IF NOT EXISTS {name} (LIKE harvest_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"ALTER TABLE harvest_logs ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{season}-01-01') TO ('{season + 1}-01-01')",
+    ]
+
+
+def _season_of(column: str) -> str:
+    return f"CAST(substr({column}, 1, 4) AS INTEGER)"
+
+
+def _sqlite_journal_view(connection, seasons):
+    """Пересоздать представление harvest_logs над таблицами сезонов и триггеры, раскладывающие запись по ним"""
+    columns = ", ".join(JOURNAL_COLUMNS)
+    values = ", ".join(f"NEW.{name}" for name in JOURNAL_COLUMNS)
+    assignments = ", ".join(f"{name} = NEW.{name}" for name in JOURNAL_COLUMNS)
+    tables = [partition_name(season) for season in sorted(seasons)]
+    statements = [
+        "DROP VIEW IF EXISTS harvest_logs",
+        "CREATE VIEW harvest_logs AS " + " UNION ALL ".join(f"SELECT {columns} FROM {table}" for table in tables),
+        "CREATE TRIGGER harvest_logs_insert INSTEAD OF INSERT ON harvest_logs BEGIN "
+        f"SELECT RAISE(ABORT, '{NO_LOG_ID}') WHERE NEW.id IS NULL; "
+        f"SELECT RAISE(ABORT, '{NO_PARTITION}') WHERE {_season_of('NEW.harvest_date')} "
+        f"NOT IN ({', '.join(map(str, sorted(seasons)))}); "
+        # Явно заданный id не должен совпасть с тем, что счётчик выдаст позже
+        "UPDATE harvest_log_ids SET last_id = NEW.id WHERE NEW.id > last_id; "
+        + "".join(
+            f"INSERT INTO {partition_name(season)} ({columns}) SELECT {values} "
+            f"WHERE {_season_of('NEW.harvest_date')} = {season}; "
+            for season in sorted(seasons)
+        )
+        + "END",
+        # Перенос записи в другой сезон отклоняется CHECK таблицы сезона
+        "CREATE TRIGGER harvest_logs_update INSTEAD OF UPDATE ON harvest_logs BEGIN "
+        + "".join(f"UPDATE {table} SET {assignments} WHERE id = OLD.id; " for table in tables)
+        + "END",
+        "CREATE TRIGGER harvest_logs_delete INSTEAD OF DELETE ON harvest_logs BEGIN "
+        + "".join(f"DELETE FROM {table} WHERE id = OLD.id; " for table in tables)
+        + "END",
+    ]
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def _create_season_table(connection, season: int):
+    table = season_table(season)
+    connection.execute(CreateTable(table, if_not_exists=True))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _is_view(connection, name: str) -> bool:
+    return connection.exec_driver_sql(
+        "SELECT type FROM sqlite_master WHERE name = ?", (name,)
+    ).scalar() == "view"
+
+
+def assign_log_ids(connection, rows: list):
+    """Выдать id новым записям журнала (словарям) до INSERT. Нужно только в SQLite: запись идёт через
+    представление harvest_logs, у которого нет своего автоинкремента, а lastrowid после триггера теряется"""
+    if connection.dialect.name != "sqlite":
+        return
+    rows = [row for row in rows if row.get("id") is None]
+    if not rows:
+        return
+    last_id = connection.execute(
+        log_ids.update().values(last_id=log_ids.c.last_id + len(rows)).returning(log_ids.c.last_id)
+    ).scalar_one()
+    for offset, row in enumerate(rows, start=last_id - len(rows) + 1):
+        row["id"] = offset
+
+
+@event.listens_for(HarvestLog, "before_insert")
+def _assign_orm_log_id(mapper, connection, target):
+    if target.id is None and connection.dialect.name == "sqlite":
+        row = {}
+        assign_log_ids(connection, [row])
+        target.id = row["id"]
+
+
+class SeasonPartitions:
+    """Журнал по сезонам. В PostgreSQL harvest_logs разбит на секции по диапазонам harvest_date,
+    и планировщик сам отбрасывает секции вне периода запроса. В SQLite то же устроено таблицами
+    harvest_logs_<сезон> под представлением harvest_logs: триггеры раскладывают запись по таблицам
+    сезонов, а закрытый сезон уходит в архив переименованием таблицы, без копирования строк.
+
+    Текущий и следующий сезон создаются заранее — при migrate и командой manage.py create-partitions.
+    Запись в сезон без секции (например, поздний ввод за давний год) создаёт её на лету: в PostgreSQL —
+    под advisory-блокировкой (параллельные CREATE TABLE сталкиваются на уникальности pg_type) и через
+    ATTACH PARTITION, в SQLite — в транзакции BEGIN IMMEDIATE. Список секций кэшируется в процессе,
+    незнакомый сезон перечитывает его из каталога.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._known = set()
+
+    @staticmethod
+    def _load(connection):
+        """Сезоны, у которых есть секция; None — журнал не разбит (SQLite до миграции)"""
+        if connection.dialect.name == "postgresql":
+            rows = connection.execute(text(
+                "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'harvest_logs'::regclass"
+            )).scalars()
+        elif _is_view(connection, HarvestLog.__tablename__):
+            rows = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars()
+        else:
+            return None
+        return {int(name.rsplit("_", 1)[1]) for name in rows if name.startswith(partition_name(""))}
+
+    def missing(self, db: Session, seasons) -> set:
+        """Сезоны, для которых нет секции"""
+        with self._lock:
+            missing = set(seasons) - self._known
+        if missing:
+            known = self._load(db.connection())
+            if known is None:
+                return set()
+            with self._lock:
+                self._known = known
+            missing -= known
+        return missing
+
+    def _open(self, bind, seasons) -> list:
+        """Создать секции сезонов (кроме закрытых) в отдельной транзакции; список созданных"""
+        with bind.connect() as connection:
+            postgresql = connection.dialect.name == "postgresql"
+            if postgresql:
+                connection.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                connection.execute(select(func.pg_advisory_xact_lock(PARTITION_LOCK_KEY)))
+            else:
+                # Писатель в SQLite и так один; IMMEDIATE берёт запись сразу, до чтения каталога
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            known = self._load(connection)
+            if known is None:
+                connection.rollback()
+                return []
+            archived = {row[0] for row in connection.execute(select(HarvestArchive.season))}
+            created = sorted(set(seasons) - known - archived)
+            if postgresql:
+                for season in created:
+                    for statement in _attach_partition_sql(season):
+                        connection.execute(text(statement))
+            elif created:
+                for season in created:
+                    _create_season_table(connection, season)
+                _sqlite_journal_view(connection, known | set(created))
+            connection.commit()
+        with self._lock:
+            self._known = known | set(created)
+        return created
+
+    def ensure(self, db: Session, seasons) -> set:
+        """Создать недостающие секции для записи в сезоны; вернуть те, что открыть не удалось
+        (не дождались блокировки). Закрытые сезоны проверяет вызывающий"""
+        if not self.missing(db, seasons):
+            return set()
+        try:
+            self._open(db.get_bind(), seasons)
+        except OperationalError:
+            logger.exception("Не удалось создать секции журнала для сезонов %s", sorted(seasons))
+        return self.missing(db, seasons)
+
+    def create(self, db: Session, seasons) -> list:
+        """Заранее создать недостающие секции сезонов (кроме закрытых); список созданных сезонов"""
+        return self._open(db.get_bind(), seasons)
+
+
+def upcoming_seasons() -> list:
+    """Сезоны, секции которых должны существовать всегда: текущий и следующий"""
+    this_season = date.today().year
+    return [this_season, this_season + 1]
+
+
+season_partitions = SeasonPartitions()
+
+
+def is_closed(db: Session, season: int) -> bool:
+    return season in reference_cache.snapshot(db).archives
+
+
+def journal_sources(db: Session, start_date=None, end_date=None) -> list:
+    """Таблицы журнала, которые может задеть период: [(таблица, последняя дата или None)].
+
+    Сначала открытый журнал, затем архивы от новых сезонов к старым; архивы вне периода не читаются.
+    """
+    sources = [(HarvestLog.__table__, None)]
+    for archive in sorted(reference_cache.snapshot(db).archives.values(), reverse=True):
+        if (start_date and archive.last_date < start_date) or (end_date and archive.first_date > end_date):
+            continue
+        sources.append((archive_table(archive.season), archive.last_date))
+    return sources
+
+
+def fetch_journal(db: Session, sources: list, build, limit: int) -> tuple:
+    """Первые limit строк по убыванию (harvest_date, id) из нескольких таблиц журнала: (колонки, строки).
+
+    build(columns) строит запрос к таблице по её колонкам. Архив, целиком более старый,
+    чем уже набранная страница, не читается.
+    """
+    keys, rows = None, []
+    for table, last_date in sources:
+        if last_date is not None and len(rows) >= limit and rows[limit - 1].harvest_date > last_date:
+            break
+        result = db.execute(build(table.c))
+        keys = keys or list(result.keys())
+        rows = sorted([*rows, *result.all()], key=lambda row: (row.harvest_date, row.id), reverse=True)[:limit]
+    return keys, rows
+
+
+def find_archived_log(db: Session, log_id: int):
+    """Строка архива по id (читаются только архивы, в диапазон id которых он попадает) или None"""
+    for archive in reference_cache.snapshot(db).archives.values():
+        if archive.min_id <= log_id <= archive.max_id:
+            table = archive_table(archive.season)
+            row = db.execute(select(table).where(table.c.id == log_id)).first()
+            if row is not None:
+                return row
+    return None
+
+
+def all_logs(db: Session):
+    """Весь журнал — открытые сезоны вместе с архивами (для пересчёта итогов)"""
+    live = HarvestLog.__table__
+    # До миграции секционирования (пересчёты в ранних миграциях) таблицы архивов ещё нет
+    if not inspect(db.get_bind()).has_table(HarvestArchive.__tablename__):
+        return live
+    seasons = [row[0] for row in db.query(HarvestArchive.season)]
+    if not seasons:
+        return live
+    return union_all(*[
+        select(*[table.c[name] for name in JOURNAL_COLUMNS])
+        for table in [live, *map(archive_table, seasons)]
+    ]).subquery("harvest_logs")
+
+
+def partition_harvest_logs(db: Session):
+    """Миграция: таблица архивов; в PostgreSQL harvest_logs становится секционированной по сезонам"""
+    bind = db.get_bind()
+    HarvestArchive.__table__.create(bind, checkfirst=True)
+    if bind.dialect.name != "postgresql":
+        return
+    if db.execute(text("SELECT relkind FROM pg_class WHERE relname = 'harvest_logs'")).scalar() == "p":
+        return
+
+    seasons = {int(row[0]) for row in db.execute(text("SELECT DISTINCT EXTRACT(YEAR FROM harvest_date) FROM harvest_logs"))}
+    seasons |= set(upcoming_seasons())
+    sequence = db.execute(text("SELECT pg_get_serial_sequence('harvest_logs', 'id')")).scalar()
+    for statement in (
+        "ALTER TABLE harvest_logs RENAME TO harvest_logs_unpartitioned",
+        "CREATE TABLE harvest_logs (LIKE harvest_logs_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (harvest_date)",
+        *[_create_partition_sql(season) for season in sorted(seasons)],
+        "INSERT INTO harvest_logs SELECT * FROM harvest_logs_unpartitioned",
+        f"ALTER SEQUENCE {sequence} OWNED BY harvest_logs.id",
+        "DROP TABLE harvest_logs_unpartitioned",
+        # Уникальность в секционированной таблице обязана включать ключ секционирования
+        "ALTER TABLE harvest_logs ADD PRIMARY KEY (id, harvest_date)",
+        "ALTER TABLE harvest_logs ADD FOREIGN KEY (collector_id) REFERENCES collectors (id)",
+        "ALTER TABLE harvest_logs ADD FOREIGN KEY (brigade_id) REFERENCES brigades (id)",
+        "ALTER TABLE harvest_logs ADD FOREIGN KEY (crop_id) REFERENCES crops (id)",
+    ):
+        db.execute(text(statement))
+    # Индексы секционированной таблицы создаются и во всех её секциях
+    for index in HarvestLog.__table__.indexes:
+        index.create(db.connection())
+    db.commit()
+
+
+def split_sqlite_journal(db: Session):
+    """Миграция для SQLite: журнал раскладывается по таблицам сезонов под представлением harvest_logs,
+    id новых записей выдаёт счётчик harvest_log_ids"""
+    connection = db.connection()
+    if connection.dialect.name != "sqlite" or _is_view(connection, HarvestLog.__tablename__):
+        return
+    live = HarvestLog.__table__
+    seasons = {
+        int(year) for year in
+        connection.exec_driver_sql("SELECT DISTINCT substr(harvest_date, 1, 4) FROM harvest_logs").scalars()
+    } | set(upcoming_seasons())
+    for season in sorted(seasons):
+        first, last = season_bounds(season)
+        table = season_table(season)
+        # Строки копируются до создания индексов: так индексы строятся один раз и без разрывов
+        connection.execute(CreateTable(table))
+        connection.execute(insert(table).from_select(
+            JOURNAL_COLUMNS,
+            select(*[live.c[name] for name in JOURNAL_COLUMNS]).where(
+                live.c.harvest_date >= first, live.c.harvest_date <= last
+            ).order_by(live.c.harvest_date, live.c.id),
+        ))
+        for index in table.indexes:
+            index.create(connection)
+
+    # id архивов тоже не должны повториться
+    last_id = max(
+        connection.execute(select(func.max(live.c.id))).scalar() or 0,
+        connection.execute(select(func.max(HarvestArchive.max_id))).scalar() or 0,
+    )
+    log_ids.create(connection)
+    connection.execute(insert(log_ids).values(id=1, last_id=last_id))
+    connection.exec_driver_sql("DROP TABLE harvest_logs")
+    _sqlite_journal_view(connection, seasons)
+    db.commit()
+
+
+def sync_season_indexes(db: Session):
+    """Индексы таблиц сезонов SQLite по индексам модели журнала (sync_indexes видит только модели)"""
+    connection = db.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    for season in SeasonPartitions._load(connection) or ():
+        for index in season_table(season).indexes:
+            index.create(connection, checkfirst=True)
+    db.commit()
+
+
+def _make_read_only(connection, table: Table):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "CREATE OR REPLACE FUNCTION harvest_archive_read_only() RETURNS trigger LANGUAGE plpgsql AS "
+            f"$$ BEGIN RAISE EXCEPTION '{READ_ONLY}'; END $$"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER {table.name}_read_only BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table.name} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION harvest_archive_read_only()"
+        ))
+        return
+    for operation in ("INSERT", "UPDATE", "DELETE"):
+        connection.execute(text(
+            f"CREATE TRIGGER {table.name}_no_{operation.lower()} BEFORE {operation} ON {table.name} "
+            f"BEGIN SELECT RAISE(ABORT, '{READ_ONLY}'); END"
+        ))
+
+
+def archive_season(db: Session, season: int) -> dict:
+    """Закрыть сезон: перенести его записи в компактную таблицу архива только для чтения.
+
+    Суточные итоги и итоги сезона не меняются — статистика по-прежнему видит сезон целиком.
+    Воркеры узнают о закрытии через версию справочников.
+    """
+    if season >= date.today().year:
+        raise ValueError(f"Сезон {season} ещё не закончился")
+    if db.get(HarvestArchive, season) is not None:
+        raise ValueError(f"Сезон {season} уже в архиве")
+
+    live = HarvestLog.__table__
+    first, last = season_bounds(season)
+    in_season = [live.c.harvest_date >= first, live.c.harvest_date <= last]
+    log_count, total_quantity, first_date, last_date, min_id, max_id = db.execute(select(
+        func.count(live.c.id), func.sum(live.c.quantity), func.min(live.c.harvest_date),
+        func.max(live.c.harvest_date), func.min(live.c.id), func.max(live.c.id),
+    ).where(*in_season)).one()
+    if not log_count:
+        raise ValueError(f"В сезоне {season} нет записей")
+
+    table = archive_table(season)
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        # Секция отсоединяется без копирования строк; её индексы заменяются индексами архива,
+        # а CLUSTER переписывает таблицу плотно и в порядке страниц журнала
+        connection.execute(text(f"ALTER TABLE harvest_logs DETACH PARTITION {partition_name(season)}"))
+        connection.execute(text(f"ALTER TABLE {partition_name(season)} RENAME TO {table.name}"))
+        indexes = connection.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :name "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE contype = 'p')"
+        ), {"name": table.name}).scalars().all()
+        for index_name in indexes:
+            connection.execute(text(f'DROP INDEX "{index_name}"'))
+        for index in table.indexes:
+            index.create(connection)
+        connection.execute(text(f"CLUSTER {table.name} USING ix_{table.name}_date_id"))
+    else:
+        # Таблица сезона выходит из представления и переименовывается в архив без копирования строк;
+        # её индексы заменяются индексами архива
+        remaining = SeasonPartitions._load(connection) - {season}
+        if not remaining:
+            remaining = {date.today().year}
+            _create_season_table(connection, date.today().year)
+        _sqlite_journal_view(connection, remaining)
+        connection.exec_driver_sql(f"ALTER TABLE {partition_name(season)} RENAME TO {table.name}")
+        for index in season_table(season).indexes:
+            connection.exec_driver_sql(f"DROP INDEX {index.name}")
+        for index in table.indexes:
+            index.create(connection)
+    _make_read_only(connection, table)
+
+    db.add(HarvestArchive(
+        season=season, table_name=table.name, log_count=log_count, total_quantity=total_quantity,
+        first_date=first_date, last_date=last_date, min_id=min_id, max_id=max_id,
+    ))
+    reference_cache.changed(db)
+    db.commit()
+    return {"season": season, "table": table.name, "logs": log_count, "first_date": first_date, "last_date": last_date}
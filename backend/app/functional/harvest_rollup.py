@@ -0,0 +1,92 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select
+from ..database import upsert_insert
+from ..models.harvest import HarvestLog, HarvestDailyStat, HarvestCollectorDailyStat
+from .season_stats import apply_season_rows, remove_season_log
+from .harvest_partitions import all_logs
+
+# Таблицы итогов и их ключи (поля HarvestLog)
+ROLLUPS = (
+    (HarvestDailyStat, ("harvest_date", "brigade_id", "crop_type", "quality_grade")),
+    (HarvestCollectorDailyStat, ("harvest_date", "collector_id", "brigade_id", "crop_type")),
+)
+
+
+def apply_harvest_log(db: Session, log: HarvestLog, sign: int = 1):
+    """Учесть запись журнала в суточных итогах и итогах сезона (sign=-1 — при удалении).
+
+    Вызывается до commit(), поэтому итоги меняются в той же транзакции, что и журнал.
+    """
+    if sign > 0:
+        apply_harvest_rows(db, [{
+            name: getattr(log, name)
+            for name in ("harvest_date", "brigade_id", "collector_id", "crop_type", "quality_grade", "quantity")
+        }])
+        return
+
+    quantity = log.quantity * sign
+    for model, key in ROLLUPS:
+        key_filter = [getattr(model, name) == getattr(log, name) for name in key]
+        db.query(model).filter(*key_filter).update(
+            {
+                model.total_quantity: model.total_quantity + quantity,
+                model.log_count: model.log_count - 1,
+            },
+            synchronize_session=False,
+        )
+        db.query(model).filter(*key_filter, model.log_count <= 0).delete(synchronize_session=False)
+    remove_season_log(db, log)
+
+
+def apply_harvest_rows(db: Session, rows: list):
+    """Учесть пачку новых записей журнала (словари с полями HarvestLog) одним upsert на таблицу итогов
+    (в том числе итогов сезона)"""
+    if not rows:
+        return
+    for model, key_names in ROLLUPS:
+        deltas = {}
+        for row in rows:
+            key = tuple(row[name] for name in key_names)
+            quantity, count = deltas.get(key, (0.0, 0))
+            deltas[key] = (quantity + row["quantity"], count + 1)
+
+        stmt = upsert_insert(db, model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_names),
+            set_={
+                "total_quantity": model.total_quantity + stmt.excluded.total_quantity,
+                "log_count": model.log_count + stmt.excluded.log_count,
+            },
+        )
+        db.execute(stmt, [
+            {**dict(zip(key_names, key)), "total_quantity": quantity, "log_count": count}
+            for key, (quantity, count) in deltas.items()
+        ])
+    apply_season_rows(db, rows)
+
+
+def rebuild_harvest_rollup(db: Session) -> int:
+    """Пересчитать суточные итоги по всему журналу (с архивами). Возвращает число строк общих итогов"""
+    logs = all_logs(db)
+    for model, key_names in ROLLUPS:
+        db.query(model).delete(synchronize_session=False)
+        key_columns = [logs.c[name] for name in key_names]
+        source = select(
+            *key_columns,
+            func.sum(logs.c.quantity),
+            func.count(logs.c.id),
+        ).group_by(*key_columns)
+        db.execute(
+            insert(model).from_select(list(key_names) + ["total_quantity", "log_count"], source)
+        )
+    db.commit()
+    return db.query(HarvestDailyStat).count()
+
+
+def recreate_harvest_rollup(db: Session) -> int:
+    """Пересоздать таблицы итогов (после смены ключа) и заполнить их по журналу"""
+    bind = db.get_bind()
+    for model, _ in ROLLUPS:
+        model.__table__.drop(bind, checkfirst=True)
+        model.__table__.create(bind)
+    return rebuild_harvest_rollup(db)
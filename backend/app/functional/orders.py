@@ -0,0 +1,168 @@
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from datetime import datetime, timedelta
+import asyncio
+import logging
+from ..config import settings
+from ..database import SessionLocal
+from ..models.orders import CartItem, Order, OrderItem
+from ..models.products import Product
+from .catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+RESERVED = "reserved"
+PAID = "paid"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+
+# Сколько просроченных заказов освобождать за один проход сборщика
+SWEEP_BATCH_SIZE = 100
+
+
+def reserve_stock(db: Session, lines: dict) -> list:
+    """Списать товар условным UPDATE (stock = stock - n WHERE stock >= n) по каждой строке.
+
+    Строки идут по возрастанию product_id: все транзакции блокируют строки products в одном
+    порядке и не попадают во взаимную блокировку на популярных товарах. Возвращает id товаров,
+    которых не хватило (тогда транзакцию нужно откатить).
+    """
+    shortages = []
+    for product_id in sorted(lines):
+        result = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= lines[product_id])
+            .values(stock=Product.stock - lines[product_id])
+        )
+        if result.rowcount == 0:
+            shortages.append(product_id)
+    return shortages
+
+
+def adjust_stock(db: Session, product_id: int, delta: int) -> bool:
+    """Изменить остаток на delta условным UPDATE (stock = stock + delta WHERE stock + delta >= 0).
+
+    Правка остатка из каталога не перезаписывает резервы, сделанные параллельно. False — остаток
+    ушёл бы в минус (тогда транзакцию нужно откатить).
+    """
+    result = db.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock + delta >= 0)
+        .values(stock=Product.stock + delta)
+    )
+    return result.rowcount > 0
+
+
+def release_stock(db: Session, order_id: int):
+    """Вернуть на склад товар заказа (в том же порядке блокировок, что и при резерве)"""
+    items = db.query(OrderItem.product_id, OrderItem.quantity).filter(
+        OrderItem.order_id == order_id
+    ).order_by(OrderItem.product_id).all()
+    for product_id, quantity in items:
+        db.execute(update(Product).where(Product.id == product_id).values(stock=Product.stock + quantity))
+
+
+def checkout(db: Session, user_id: int) -> Order:
+    """Оформить заказ по корзине: резерв всех строк, заказ и очистка корзины — одной транзакцией"""
+    lines = db.query(CartItem.product_id, CartItem.quantity, Product.name, Product.price).join(
+        Product, Product.id == CartItem.product_id
+    ).filter(CartItem.user_id == user_id).order_by(CartItem.product_id).all()
+    if not lines:
+        raise HTTPException(status_code=400, detail="Корзина пуста")
+
+    shortages = reserve_stock(db, {line.product_id: line.quantity for line in lines})
+    if shortages:
+        db.rollback()
+        names = ", ".join(line.name for line in lines if line.product_id in shortages)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Недостаточно товара на складе: {names}")
+
+    now = datetime.utcnow()
+    order = Order(
+        user_id=user_id,
+        status=RESERVED,
+        total=round(sum(line.price * line.quantity for line in lines), 2),
+        created_at=now,
+        expires_at=now + timedelta(minutes=settings.reservation_ttl_minutes),
+        items=[
+            OrderItem(product_id=line.product_id, quantity=line.quantity, price=line.price)
+            for line in lines
+        ],
+    )
+    db.add(order)
+    db.query(CartItem).filter(CartItem.user_id == user_id).delete(synchronize_session=False)
+    # Остатки изменились: списки каталога сбрасываются во всех воркерах
+    catalog_cache.changed(db)
+    db.commit()
+    return order
+
+
+def close_order(db: Session, user_id: int, order_id: int, new_status: str) -> Order:
+    """Перевести заказ из reserved в paid или cancelled.
+
+    Переход — условный UPDATE по статусу: оплата, отмена и сборщик просроченных резервов
+    не могут закрыть один заказ дважды (и дважды вернуть товар).
+    """
+    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+
+    conditions = [Order.id == order_id, Order.status == RESERVED]
+    if new_status == PAID:
+        conditions.append(Order.expires_at > datetime.utcnow())
+    result = db.execute(update(Order).where(*conditions).values(status=new_status))
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Резерв истёк или заказ уже закрыт")
+
+    if new_status == CANCELLED:
+        release_stock(db, order_id)
+        catalog_cache.changed(db)
+    db.commit()
+    db.refresh(order)
+    return order
+
+
+def release_expired_reservations(db: Session) -> int:
+    """Закрыть просроченные резервы и вернуть товар на склад. Возвращает число заказов"""
+    released = 0
+    while True:
+        order_ids = [row[0] for row in db.query(Order.id).filter(
+            Order.status == RESERVED, Order.expires_at <= datetime.utcnow()
+        ).order_by(Order.id).limit(SWEEP_BATCH_SIZE)]
+        if not order_ids:
+            return released
+        batch_released = 0
+        for order_id in order_ids:
+            result = db.execute(
+                update(Order).where(Order.id == order_id, Order.status == RESERVED).values(status=EXPIRED)
+            )
+            if result.rowcount:
+                release_stock(db, order_id)
+                batch_released += 1
+        if batch_released:
+            catalog_cache.changed(db)
+        db.commit()
+        released += batch_released
+
+
+def _sweep_once() -> int:
+    db = SessionLocal()
+    try:
+        return release_expired_reservations(db)
+    finally:
+        db.close()
+
+
+async def reservation_sweeper():
+    """Фоновая задача: раз в reservation_sweep_seconds освобождает просроченные резервы.
+
+    Запускается в каждом воркере; условные UPDATE делают параллельные проходы безопасными.
+    """
+    while True:
+        await asyncio.sleep(settings.reservation_sweep_seconds)
+        try:
+            await run_in_threadpool(_sweep_once)
+        except Exception:
+            logger.exception("Не удалось освободить просроченные резервы")
@@ -0,0 +1,20 @@
+from fastapi import HTTPException
+from datetime import date
+import base64
+import json
+
+
+def encode_cursor(harvest_date: date, log_id: int) -> str:
+    """Кодирование позиции последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps({"d": harvest_date.isoformat(), "id": log_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Декодирование курсора в пару (harvest_date, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return date.fromisoformat(payload["d"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Недействительный курсор")
@@ -0,0 +1,91 @@
+from sqlalchemy.orm import Session
+from datetime import date
+import json
+import re
+from ..models.harvest import HarvestLog
+from ..models.collectors import Collector
+from ..models.products import Product
+from ..models.users import User
+from .harvest_export import journal_page_statement
+from .harvest_analytics import summary_statement, top_groups_statement, timeseries_statement, leaderboard_statement
+from .season_stats import season_leaderboard_statement
+
+# Таблицы, полный просмотр которых на горячем пути считается деградацией
+WATCHED_TABLES = (
+    "harvest_logs", "harvest_daily_stats", "harvest_collector_daily_stats", "collector_season_stats",
+    "collectors", "products", "users",
+)
+
+SEASON_START = date(2025, 1, 1)
+SEASON_END = date(2025, 12, 31)
+
+
+def _journal(db: Session, columnar: bool = False, after=None, **filters):
+    # Страница журнала с запасом в одну строку, как её запрашивает роутер
+    return journal_page_statement(HarvestLog, columnar, after=after, limit=51, **filters)
+
+
+# Запросы роутеров, построенные теми же функциями, что и в обработчиках
+HOT_QUERIES = {
+    "journal: первая страница": lambda db: _journal(db),
+    "journal: следующая страница по курсору": lambda db: _journal(db, after=(SEASON_END, 1000)),
+    "journal: бригада, следующая страница": lambda db: _journal(db, brigade_id=1, after=(SEASON_END, 1000)),
+    "journal: диапазон дат": lambda db: _journal(db, start_date=SEASON_START, end_date=SEASON_END),
+    "journal: бригада + даты": lambda db: _journal(db, brigade_id=1, start_date=SEASON_START, end_date=SEASON_END),
+    "journal: сборщик + даты": lambda db: _journal(db, collector_id=1, start_date=SEASON_START, end_date=SEASON_END),
+    "journal: культура": lambda db: _journal(db, crop_ids=[1, 2]),
+    "journal: колонками, следующая страница": lambda db: _journal(db, columnar=True, after=(SEASON_END, 1000)),
+    "stats: итоги за период": lambda db: summary_statement(None, SEASON_START, SEASON_END),
+    "stats: итоги по культурам": lambda db: summary_statement("crop", SEASON_START, SEASON_END),
+    "stats: итоги по бригадам": lambda db: summary_statement("brigade", SEASON_START, SEASON_END),
+    "stats: ряд по неделям": lambda db: timeseries_statement(
+        db, "week", "crop", ["Томаты", "Огурцы"], SEASON_START, SEASON_END
+    ),
+    "stats: ряд по сборщикам": lambda db: top_groups_statement("collector", SEASON_START, SEASON_END),
+    "stats: рейтинг сборщиков": lambda db: leaderboard_statement(SEASON_START, SEASON_END),
+    "brigades: рейтинг сезона": lambda db: season_leaderboard_statement(SEASON_START.year),
+    "brigades: рейтинг сезона в бригаде": lambda db: season_leaderboard_statement(SEASON_START.year, brigade_id=1),
+    "brigades: сборщики бригады": lambda db: db.query(Collector).filter(Collector.brigade_id == 1),
+    "products: продукты категории": lambda db: db.query(Product).filter(Product.category_id == 1),
+    "auth: пользователь по username": lambda db: db.query(User).filter(User.username == "user"),
+}
+
+
+def _explain(db: Session, statement) -> tuple:
+    """(план в виде строк, список таблиц с полным просмотром)"""
+    connection = db.connection()
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+
+    if connection.dialect.name == "postgresql":
+        # Без seq scan планировщик обязан взять индекс, если подходящий существует
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        nodes, stack = [], [plan[0]["Plan"]]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.get("Plans", []))
+        lines = [f"{node['Node Type']} {node.get('Relation Name', '')}".strip() for node in nodes]
+        full_scans = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+    else:
+        lines = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+        full_scans = [
+            line.split()[1] for line in lines
+            if line.startswith("SCAN ") and "USING" not in line
+        ]
+    # Секции журнала (harvest_logs_2025) считаются самой таблицей
+    full_scans = [re.sub(r"_\d{4}$", "", table) for table in full_scans]
+    return lines, [table for table in full_scans if table in WATCHED_TABLES]
+
+
+def check_query_plans(db: Session) -> list:
+    """EXPLAIN каждого горячего запроса: [(название, план, таблицы с полным просмотром)]"""
+    report = []
+    for name, build in HOT_QUERIES.items():
+        statement = build(db)
+        statement = getattr(statement, "statement", statement)
+        lines, full_scans = _explain(db, statement)
+        report.append((name, lines, full_scans))
+    db.rollback()
+    return report
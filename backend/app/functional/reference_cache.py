@@ -0,0 +1,203 @@
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from sqlalchemy import event
+import threading
+import time
+from ..config import settings
+from ..models.brigades import Brigade
+from ..models.collectors import Collector
+from ..models.harvest import HarvestArchive
+from ..models.products import ProductCategory
+from ..models.reference import ReferenceVersion
+
+BrigadeRef = namedtuple("BrigadeRef", "id name")
+CollectorRef = namedtuple("CollectorRef", "id full_name photo personal_characteristic birth_year brigade_id")
+CategoryRef = namedtuple("CategoryRef", "id name description")
+ArchiveRef = namedtuple("ArchiveRef", "season table_name first_date last_date min_id max_id")
+
+
+class ReferenceSnapshot:
+    """Снимок справочников одной версии. После создания не меняется: при изменении справочников
+    строится новый снимок и подменяется целиком, поэтому читатель никогда не видит его наполовину"""
+
+    def __init__(self, version: int, brigades: dict, collectors: dict, categories: dict, archives: dict):
+        self.version = version
+        self.brigades = brigades
+        self.collectors = collectors
+        self.categories = categories
+        self.archives = archives  # закрытые сезоны журнала: сезон -> архив
+        self.brigade_collectors = {}  # бригада -> её сборщики (по возрастанию id)
+        for collector in collectors.values():
+            self.brigade_collectors.setdefault(collector.brigade_id, []).append(collector)
+
+    def collector_dict(self, collector: CollectorRef) -> dict:
+        """Сборщик с названием бригады (CollectorWithBrigade)"""
+        return {**collector._asdict(), "brigade_name": self.brigades[collector.brigade_id].name}
+
+    def brigade_dict(self, brigade: BrigadeRef) -> dict:
+        """Бригада со сборщиками (BrigadeWithCollectors)"""
+        return {
+            **brigade._asdict(),
+            "collectors": [collector._asdict() for collector in self.brigade_collectors.get(brigade.id, [])],
+        }
+
+
+class ReferenceCache:
+    """Справочники бригад, сборщиков и категорий (и список закрытых сезонов журнала) в памяти процесса.
+
+    Изменения в этом воркере видны сразу: обработчик вызывает changed(db) до commit(),
+    а после фиксации кэш сверяется с базой. Изменения других воркеров видны не позже чем
+    через check_seconds: версия справочников в базе (одна строка) сверяется не чаще этого,
+    и снимок перечитывается только если она изменилась. Незнакомый id сверяет версию сразу.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+
+    def _load(self, db: Session, version: int) -> ReferenceSnapshot:
+        snapshot = ReferenceSnapshot(
+            version,
+            {row.id: BrigadeRef(*row) for row in db.query(Brigade.id, Brigade.name).order_by(Brigade.id)},
+            {row.id: CollectorRef(*row) for row in db.query(
+                Collector.id, Collector.full_name, Collector.photo, Collector.personal_characteristic,
+                Collector.birth_year, Collector.brigade_id
+            ).order_by(Collector.id)},
+            {row.id: CategoryRef(*row) for row in db.query(
+                ProductCategory.id, ProductCategory.name, ProductCategory.description
+            ).order_by(ProductCategory.id)},
+            {row.season: ArchiveRef(*row) for row in db.query(
+                HarvestArchive.season, HarvestArchive.table_name, HarvestArchive.first_date,
+                HarvestArchive.last_date, HarvestArchive.min_id, HarvestArchive.max_id
+            )},
+        )
+        with self._lock:
+            # Параллельная перезагрузка могла уже положить снимок новее (например, с основной базы, а этот — с реплики)
+            if self._snapshot is None or self._snapshot.version <= version:
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def snapshot(self, db: Session, check: bool = False) -> ReferenceSnapshot:
+        """Актуальный снимок; check=True — сверить версию с базой независимо от check_seconds"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not check and time.monotonic() - self._checked_at < self.check_seconds:
+                self.hits += 1
+                return snapshot
+
+        # Версия читается раньше строк: строки новее версии лишь вызовут лишнюю перезагрузку
+        version = db.query(ReferenceVersion.version).filter(ReferenceVersion.id == 1).scalar() or 0
+        with self._lock:
+            self.checks += 1
+            if snapshot is not None and snapshot.version >= version:
+                self._checked_at = time.monotonic()
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+        return self._load(db, version)
+
+    def _lookup(self, db: Session, table: str, key: int):
+        snapshot = self.snapshot(db)
+        row = getattr(snapshot, table).get(key)
+        if row is None:
+            # Строку мог только что добавить другой воркер
+            row = getattr(self.snapshot(db, check=True), table).get(key)
+        return row
+
+    def brigade(self, db: Session, brigade_id: int):
+        return self._lookup(db, "brigades", brigade_id)
+
+    def collector(self, db: Session, collector_id: int):
+        return self._lookup(db, "collectors", collector_id)
+
+    def category(self, db: Session, category_id: int):
+        return self._lookup(db, "categories", category_id)
+
+    def fresh_collector(self, collector_id: int):
+        """Сборщик из снимка без обращения к базе; None — снимок пора сверить или сборщика в нём нет.
+        Для асинхронного кода: сверку с базой тогда выполняют через collector() в пуле потоков"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - self._checked_at >= self.check_seconds:
+                return None
+            collector = snapshot.collectors.get(collector_id)
+            if collector is not None:
+                self.hits += 1
+            return collector
+
+    def names(self, db: Session, collector_ids: set, brigade_ids: set) -> tuple:
+        """Имена сборщиков и названия бригад для строк журнала: (сборщик -> имя, бригада -> название)"""
+        snapshot = self.snapshot(db)
+        if not (collector_ids <= snapshot.collectors.keys() and brigade_ids <= snapshot.brigades.keys()):
+            snapshot = self.snapshot(db, check=True)
+        return (
+            {collector_id: snapshot.collectors[collector_id].full_name for collector_id in collector_ids},
+            {brigade_id: snapshot.brigades[brigade_id].name for brigade_id in brigade_ids},
+        )
+
+    def changed(self, db: Session):
+        """Отметить изменение справочников в текущей транзакции (вызывать до commit())"""
+        db.query(ReferenceVersion).filter(ReferenceVersion.id == 1).update(
+            {ReferenceVersion.version: ReferenceVersion.version + 1}, synchronize_session=False
+        )
+        db.info["reference_changed"] = True
+
+    def invalidate(self):
+        """Сверить версию при следующем обращении"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "version": snapshot.version if snapshot else None,
+                "brigades": len(snapshot.brigades) if snapshot else 0,
+                "collectors": len(snapshot.collectors) if snapshot else 0,
+                "categories": len(snapshot.categories) if snapshot else 0,
+                "archives": sorted(snapshot.archives) if snapshot else [],
+                "hits": self.hits,
+                "misses": self.misses,
+                "checks": self.checks,
+            }
+
+    def render_metrics(self) -> str:
+        """Метрики кэша в формате Prometheus (дописываются к /metrics)"""
+        stats = self.stats()
+        return "\n".join([
+            "# HELP reference_cache_requests_total Обращения к снимку справочников",
+            "# TYPE reference_cache_requests_total counter",
+            f'reference_cache_requests_total{{result="hit"}} {stats["hits"]}',
+            f'reference_cache_requests_total{{result="miss"}} {stats["misses"]}',
+            "# HELP reference_cache_version_checks_total Сверки версии справочников с базой",
+            "# TYPE reference_cache_version_checks_total counter",
+            f"reference_cache_version_checks_total {stats['checks']}",
+        ]) + "\n"
+
+
+reference_cache = ReferenceCache(settings.reference_check_seconds)
+
+
+@event.listens_for(Session, "after_commit")
+def _reference_committed(session):
+    if session.info.pop("reference_changed", False):
+        reference_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reference_rolled_back(session):
+    session.info.pop("reference_changed", None)
+
+
+def create_reference_version(db: Session):
+    """Миграция: таблица версии справочников с единственной строкой"""
+    ReferenceVersion.__table__.create(db.get_bind(), checkfirst=True)
+    if db.query(ReferenceVersion.id).filter(ReferenceVersion.id == 1).first() is None:
+        db.add(ReferenceVersion(id=1, version=0))
+        db.commit()
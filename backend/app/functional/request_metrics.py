@@ -0,0 +1,209 @@
+from starlette.datastructures import MutableHeaders
+from bisect import bisect_left
+from contextvars import ContextVar
+import heapq
+import logging
+import threading
+import time
+from ..config import settings
+
+logger = logging.getLogger("app.requests")
+
+# Статистика текущего запроса; обработчики в пуле потоков и run_sync видят её через копию контекста
+_current_request = ContextVar("current_request", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class RequestStats:
+    """SQL и прочие замеры одного запроса"""
+
+    def __init__(self, keep_statements: int):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.timings = {}  # фаза (например, hash) -> секунды
+        self.keep_statements = keep_statements
+        self._slowest = []  # куча (секунды, порядковый номер, SQL) размером keep_statements
+
+    def add_query(self, statement: str, seconds: float):
+        self.queries += 1
+        self.sql_seconds += seconds
+        if self.keep_statements:
+            item = (seconds, self.queries, statement)
+            if len(self._slowest) < self.keep_statements:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def slowest_statements(self) -> list:
+        return [(seconds, statement) for seconds, _, statement in sorted(self._slowest, reverse=True)]
+
+    def server_timing(self, total_seconds: float) -> str:
+        other = sum(self.timings.values())
+        parts = [f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.queries} SQL"']
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings.items()]
+        parts.append(f"app;dur={max(total_seconds - self.sql_seconds - other, 0) * 1000:.1f}")
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record_query(statement: str, seconds: float):
+    """Вызывается хуками движка после каждого SQL-запроса"""
+    stats = _current_request.get()
+    if stats is not None:
+        stats.add_query(statement, seconds)
+
+
+def record_timing(name: str, seconds: float):
+    """Учесть время отдельной фазы запроса (попадёт в Server-Timing)"""
+    stats = _current_request.get()
+    if stats is not None:
+        stats.timings[name] = stats.timings.get(name, 0.0) + seconds
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    """Гистограмма Prometheus с метками (значения хранятся по корзинам, при выводе — накопительно)"""
+
+    def __init__(self, name: str, description: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # метки -> [счётчики по корзинам (+Inf последним), сумма]
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label_names: tuple):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines += [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in sorted(self.series.items())
+        ]
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики запросов по маршрутам (шаблон пути, а не конкретный URL) в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ("method", "route")
+        self.requests = Counter("http_requests_total", "Число HTTP-запросов", route + ("status",))
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Время обработки запроса", route, DURATION_BUCKETS
+        )
+        self.sql_duration = Histogram(
+            "http_request_sql_seconds", "Суммарное время SQL за запрос", route, DURATION_BUCKETS
+        )
+        self.sql_queries = Histogram(
+            "http_request_sql_queries", "Число SQL-запросов за запрос", route, QUERY_COUNT_BUCKETS
+        )
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        labels = (method, route)
+        with self._lock:
+            self.requests.inc(labels + (status,))
+            self.duration.observe(labels, seconds)
+            self.sql_duration.observe(labels, stats.sql_seconds)
+            self.sql_queries.observe(labels, stats.queries)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.sql_duration, self.sql_queries):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """ASGI-middleware: замеры запроса, заголовок Server-Timing, журнал медленных запросов и метрики.
+
+    Время и SQL считаются до отправки заголовков ответа: у потоковых ответов (выгрузка)
+    работа после первого чанка в Server-Timing не попадает, но входит в гистограмму времени.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(settings.slow_request_statements)
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            metrics_registry.observe(scope["method"], route_path, status, elapsed, stats)
+            if settings.slow_request_ms and elapsed * 1000 >= settings.slow_request_ms:
+                _log_slow_request(scope, status, elapsed, stats)
+
+
+def _log_slow_request(scope, status: int, elapsed: float, stats: RequestStats):
+    statements = "".join(
+        f"\n    {seconds * 1000:.1f} мс: {' '.join(statement.split())[:300]}"
+        for seconds, statement in stats.slowest_statements()
+    )
+    logger.warning(
+        "Медленный запрос %s %s -> %s: %.1f мс, SQL: %d запросов за %.1f мс%s",
+        scope["method"], scope["path"], status, elapsed * 1000, stats.queries, stats.sql_seconds * 1000, statements
+    )
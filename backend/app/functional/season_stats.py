@@ -0,0 +1,246 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import case, extract, func, insert, select
+from datetime import date
+from ..database import upsert_insert
+from ..models.harvest import HarvestLog, HarvestCollectorDailyStat, CollectorSeasonStat, BrigadeSeasonStat
+from ..models.collectors import Collector
+from .harvest_partitions import all_logs
+
+# Счётчики по классам качества
+GRADE_COLUMNS = {"A": "grade_a_count", "B": "grade_b_count", "C": "grade_c_count"}
+COUNTERS = ("total_quantity", "log_count", *GRADE_COLUMNS.values())
+
+
+def current_season() -> int:
+    return date.today().year
+
+
+def _season_filter(model, season: int):
+    return [model.harvest_date >= date(season, 1, 1), model.harvest_date <= date(season, 12, 31)]
+
+
+def _deltas(rows: list, key, extra=None) -> dict:
+    """Приращения счётчиков по ключу; extra(row) — дополнительные поля строки итогов (последнее значение)"""
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault(key(row), {**dict.fromkeys(COUNTERS, 0), "last_harvest_date": None})
+        delta["total_quantity"] += row["quantity"]
+        delta["log_count"] += 1
+        if row["quality_grade"] in GRADE_COLUMNS:
+            delta[GRADE_COLUMNS[row["quality_grade"]]] += 1
+        if delta["last_harvest_date"] is None or row["harvest_date"] > delta["last_harvest_date"]:
+            delta["last_harvest_date"] = row["harvest_date"]
+        if extra:
+            delta.update(extra(row))
+    return deltas
+
+
+def _add(db: Session, model, key_names: tuple, deltas: dict):
+    """Прибавить приращения одним upsert; прочие поля (бригада сборщика) берутся из новых значений"""
+    if not deltas:
+        return
+    stmt = upsert_insert(db, model)
+    excluded = stmt.excluded
+    set_ = {name: getattr(model, name) + getattr(excluded, name) for name in COUNTERS}
+    set_["last_harvest_date"] = case(
+        (model.last_harvest_date.is_(None), excluded.last_harvest_date),
+        (excluded.last_harvest_date > model.last_harvest_date, excluded.last_harvest_date),
+        else_=model.last_harvest_date,
+    )
+    for name in next(iter(deltas.values())).keys() - set_.keys():
+        set_[name] = getattr(excluded, name)
+    db.execute(stmt.on_conflict_do_update(index_elements=list(key_names), set_=set_), [
+        {**dict(zip(key_names, key)), **values} for key, values in deltas.items()
+    ])
+
+
+def _subtract(db: Session, model, filters: list, values: dict):
+    db.query(model).filter(*filters).update(
+        {getattr(model, name): getattr(model, name) - values[name] for name in COUNTERS},
+        synchronize_session=False,
+    )
+
+
+def _refresh_brigade(db: Session, season: int, brigade_id: int):
+    """Последняя дата бригады — по её сборщикам; опустевшая строка удаляется"""
+    filters = [BrigadeSeasonStat.season == season, BrigadeSeasonStat.brigade_id == brigade_id]
+    db.query(BrigadeSeasonStat).filter(*filters, BrigadeSeasonStat.log_count <= 0).delete(synchronize_session=False)
+    last_date = db.query(func.max(CollectorSeasonStat.last_harvest_date)).filter(
+        CollectorSeasonStat.season == season, CollectorSeasonStat.brigade_id == brigade_id
+    ).scalar()
+    db.query(BrigadeSeasonStat).filter(*filters).update(
+        {BrigadeSeasonStat.last_harvest_date: last_date}, synchronize_session=False
+    )
+
+
+def apply_season_rows(db: Session, rows: list):
+    """Учесть новые записи журнала (словари с полями HarvestLog) в итогах сезона.
+
+    Бригада записи совпадает с текущей бригадой сборщика — это проверяется до вставки.
+    """
+    _add(db, CollectorSeasonStat, ("season", "collector_id"), _deltas(
+        rows, lambda row: (row["harvest_date"].year, row["collector_id"]),
+        extra=lambda row: {"brigade_id": row["brigade_id"]},
+    ))
+    _add(db, BrigadeSeasonStat, ("season", "brigade_id"), _deltas(
+        rows, lambda row: (row["harvest_date"].year, row["brigade_id"])
+    ))
+
+
+def remove_season_log(db: Session, log: HarvestLog):
+    """Вычесть удаляемую запись журнала из итогов сезона (после суточных итогов — по ним ищется последняя дата)"""
+    season = log.harvest_date.year
+    collector_filter = [CollectorSeasonStat.season == season, CollectorSeasonStat.collector_id == log.collector_id]
+    brigade_id = db.query(CollectorSeasonStat.brigade_id).filter(*collector_filter).scalar()
+    if brigade_id is None:
+        return
+    values = _deltas([{
+        "quantity": log.quantity, "quality_grade": log.quality_grade, "harvest_date": log.harvest_date
+    }], lambda row: None)[None]
+
+    _subtract(db, CollectorSeasonStat, collector_filter, values)
+    db.query(CollectorSeasonStat).filter(*collector_filter, CollectorSeasonStat.log_count <= 0).delete(
+        synchronize_session=False
+    )
+    last_date = db.query(func.max(HarvestCollectorDailyStat.harvest_date)).filter(
+        HarvestCollectorDailyStat.collector_id == log.collector_id, *_season_filter(HarvestCollectorDailyStat, season)
+    ).scalar()
+    db.query(CollectorSeasonStat).filter(*collector_filter).update(
+        {CollectorSeasonStat.last_harvest_date: last_date}, synchronize_session=False
+    )
+
+    # Бригада — текущая бригада сборщика (итоги бригады — это итоги её нынешнего состава)
+    _subtract(db, BrigadeSeasonStat, [
+        BrigadeSeasonStat.season == season, BrigadeSeasonStat.brigade_id == brigade_id
+    ], values)
+    _refresh_brigade(db, season, brigade_id)
+
+
+def transfer_collector(db: Session, collector_id: int, old_brigade_id: int, new_brigade_id: int):
+    """Перевод сборщика: его итоги всех сезонов переходят из старой бригады в новую (до commit())"""
+    rows = db.query(CollectorSeasonStat).filter(CollectorSeasonStat.collector_id == collector_id).all()
+    if not rows:
+        return
+    db.query(CollectorSeasonStat).filter(CollectorSeasonStat.collector_id == collector_id).update(
+        {CollectorSeasonStat.brigade_id: new_brigade_id}, synchronize_session=False
+    )
+    deltas = {}
+    for row in rows:
+        values = {name: getattr(row, name) for name in COUNTERS}
+        _subtract(db, BrigadeSeasonStat, [
+            BrigadeSeasonStat.season == row.season, BrigadeSeasonStat.brigade_id == old_brigade_id
+        ], values)
+        deltas[(row.season, new_brigade_id)] = {**values, "last_harvest_date": row.last_harvest_date}
+    _add(db, BrigadeSeasonStat, ("season", "brigade_id"), deltas)
+    for row in rows:
+        _refresh_brigade(db, row.season, old_brigade_id)
+
+
+def rebuild_season_stats(db: Session) -> int:
+    """Пересчитать итоги сезонов по журналу (с архивами). Возвращает число строк итогов по сборщикам"""
+    logs = all_logs(db)
+    db.query(BrigadeSeasonStat).delete(synchronize_session=False)
+    db.query(CollectorSeasonStat).delete(synchronize_session=False)
+
+    season = extract("year", logs.c.harvest_date)
+    grade_counts = [
+        func.sum(case((logs.c.quality_grade == grade, 1), else_=0)) for grade in GRADE_COLUMNS
+    ]
+    db.execute(insert(CollectorSeasonStat).from_select(
+        ["season", "collector_id", "brigade_id", *COUNTERS, "last_harvest_date"],
+        select(
+            season, logs.c.collector_id, Collector.brigade_id,
+            func.sum(logs.c.quantity), func.count(logs.c.id), *grade_counts,
+            func.max(logs.c.harvest_date),
+        ).join(Collector, Collector.id == logs.c.collector_id).group_by(
+            season, logs.c.collector_id, Collector.brigade_id
+        )
+    ))
+    db.execute(insert(BrigadeSeasonStat).from_select(
+        ["season", "brigade_id", *COUNTERS, "last_harvest_date"],
+        select(
+            CollectorSeasonStat.season, CollectorSeasonStat.brigade_id,
+            *[func.sum(getattr(CollectorSeasonStat, name)) for name in COUNTERS],
+            func.max(CollectorSeasonStat.last_harvest_date),
+        ).group_by(CollectorSeasonStat.season, CollectorSeasonStat.brigade_id)
+    ))
+    db.commit()
+    return db.query(CollectorSeasonStat).count()
+
+
+def create_season_stats(db: Session) -> int:
+    """Миграция: таблицы итогов сезона и их заполнение по журналу"""
+    bind = db.get_bind()
+    CollectorSeasonStat.__table__.create(bind, checkfirst=True)
+    BrigadeSeasonStat.__table__.create(bind, checkfirst=True)
+    return rebuild_season_stats(db)
+
+
+def _stats_dict(row, rank: int) -> dict:
+    return {
+        "season": row.season,
+        "total_quantity": row.total_quantity,
+        "log_count": row.log_count,
+        "grades": {grade: getattr(row, column) for grade, column in GRADE_COLUMNS.items()},
+        "last_harvest_date": row.last_harvest_date,
+        "rank": rank,
+    }
+
+
+def _ranked(rows: list, key: str) -> dict:
+    """id -> итоги с местом (при равных суммах место общее); rows отсортированы по сумме по убыванию"""
+    result, rank, previous = {}, 0, None
+    for position, row in enumerate(rows, start=1):
+        if row.total_quantity != previous:
+            rank, previous = position, row.total_quantity
+        result[getattr(row, key)] = _stats_dict(row, rank)
+    return result
+
+
+def collector_season_stats(db: Session, season: int) -> dict:
+    """Итоги сезона по всем сборщикам с местом в общем рейтинге: collector_id -> итоги"""
+    rows = db.query(CollectorSeasonStat).filter(CollectorSeasonStat.season == season).order_by(
+        CollectorSeasonStat.total_quantity.desc()
+    ).all()
+    return _ranked(rows, "collector_id")
+
+
+def brigade_season_stats(db: Session, season: int) -> dict:
+    """Итоги сезона по бригадам с местом среди бригад: brigade_id -> итоги"""
+    rows = db.query(BrigadeSeasonStat).filter(BrigadeSeasonStat.season == season).order_by(
+        BrigadeSeasonStat.total_quantity.desc()
+    ).all()
+    return _ranked(rows, "brigade_id")
+
+
+def season_leaderboard_statement(season: int, brigade_id=None, limit: int = 10):
+    """Рейтинг сезона по итогам сборщиков (внутри бригады, если она задана) — без чтения журнала"""
+    table = CollectorSeasonStat
+    ranked = select(
+        table,
+        func.rank().over(order_by=table.total_quantity.desc()).label("rank"),
+    ).where(table.season == season)
+    if brigade_id:
+        ranked = ranked.where(table.brigade_id == brigade_id)
+    ranked = ranked.subquery()
+    return select(ranked).where(ranked.c.rank <= limit).order_by(ranked.c.rank, ranked.c.collector_id)
+
+
+def season_leaderboard(db: Session, season: int, **filters) -> list:
+    """Первые N сборщиков сезона (при равенстве сумм места делятся, строк может быть больше N)"""
+    return [_stats_dict(row, row.rank) | {
+        "collector_id": row.collector_id, "brigade_id": row.brigade_id
+    } for row in db.execute(season_leaderboard_statement(season, **filters))]
+
+
+def collector_stats(db: Session, season: int, collector_id: int):
+    """Итоги сезона одного сборщика с местом в общем рейтинге (None — записей в сезоне нет)"""
+    row = db.query(CollectorSeasonStat).filter(
+        CollectorSeasonStat.season == season, CollectorSeasonStat.collector_id == collector_id
+    ).first()
+    if row is None:
+        return None
+    ahead = db.query(func.count(CollectorSeasonStat.id)).filter(
+        CollectorSeasonStat.season == season, CollectorSeasonStat.total_quantity > row.total_quantity
+    ).scalar()
+    return _stats_dict(row, ahead + 1)
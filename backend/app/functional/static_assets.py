@@ -0,0 +1,357 @@
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from anyio import to_thread
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+import threading
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём только gzip-варианты
+    brotli = None
+
+# Версионированный URL меняется вместе с содержимым — кэшировать можно «навсегда»
+IMMUTABLE = "public, max-age=31536000, immutable"
+# HTML и неверсионированные пути — только с проверкой ETag (повторная загрузка — 304 без тела)
+REVALIDATE = "no-cache"
+
+COMPRESSIBLE = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".map", ".ico"}
+MIN_COMPRESS_SIZE = 512
+CHUNK_SIZE = 64 * 1024
+
+# Относительные ссылки на ресурсы в HTML (href="styles/main.css", src="images/logo.png")
+ASSET_REFERENCE = re.compile(r'(?P<attr>\b(?:href|src))="(?P<url>(?![a-z]+:|/|#)[^"?#]+)"')
+
+
+def _versioned_name(path: str, digest: str) -> str:
+    """styles/main.css -> styles/main.<hash>.css"""
+    base, ext = posixpath.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+def _write_atomic(file: str, data: bytes):
+    """Записать файл целиком или не записать вовсе: временный файл в том же каталоге и os.replace.
+    Читатель (соседний процесс или уже открытый ответ) видит либо старое содержимое, либо новое"""
+    directory = os.path.dirname(file)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, file)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+class Asset:
+    def __init__(self, path: str, file: str, digest: str, size: int, variants: dict):
+        self.path = path
+        self.file = file
+        self.digest = digest
+        self.size = size
+        self.variants = variants  # кодировка (br, gzip) -> (файл, размер)
+        self.versioned = _versioned_name(path, digest)
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class AssetStore:
+    """Статика фронтенда и изображений: хэши содержимого, сжатые варианты и HTML с версионированными ссылками.
+
+    Каталоги-источники сливаются в одно пространство путей (первый имеет приоритет). Файлы,
+    добавленные после сборки, подхватываются при первом обращении к ним.
+    Сборка пишет в build_dir сжатые копии, переписанный HTML и manifest.json (каждый файл —
+    атомарной заменой); при повторной сборке неизменившиеся (по размеру и mtime) файлы заново
+    не хэшируются и не сжимаются. Без явной сборки (serve.py, manage.py build-assets) статика
+    собирается при первом обращении к ней, а не при старте процесса.
+    """
+
+    def __init__(self, roots: list, build_dir: str, url_prefix: str = "/assets/"):
+        self.roots = roots
+        self.build_dir = build_dir
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._assets = {}  # логический путь -> Asset
+        self._versioned = {}  # версионированный путь -> Asset
+        self.built = False
+
+    def _sources(self) -> dict:
+        sources = {}
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for directory, subdirs, files in os.walk(root):
+                subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+                for name in files:
+                    file = os.path.join(directory, name)
+                    path = os.path.relpath(file, root).replace(os.sep, "/")
+                    if not name.startswith(".") and path not in sources:
+                        sources[path] = file
+        return sources
+
+    def _compress(self, path: str, data: bytes) -> dict:
+        if posixpath.splitext(path)[1].lower() not in COMPRESSIBLE or len(data) < MIN_COMPRESS_SIZE:
+            return {}
+        encoders = {"gzip": (".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            encoders["br"] = (".br", lambda raw: brotli.compress(raw, quality=11))
+        variants = {}
+        for encoding, (suffix, encode) in encoders.items():
+            encoded = encode(data)
+            if len(encoded) >= len(data):
+                continue
+            file = os.path.join(self.build_dir, "compressed", path + suffix)
+            _write_atomic(file, encoded)
+            variants[encoding] = (file, len(encoded))
+        return variants
+
+    def _build_asset(self, path: str, file: str, data: bytes) -> Asset:
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        return Asset(path, file, digest, len(data), self._compress(path, data))
+
+    def _rewrite_html(self, path: str, html: str, assets: dict) -> str:
+        directory = posixpath.dirname(path)
+
+        def replace(match):
+            target = posixpath.normpath(posixpath.join(directory, match.group("url")))
+            asset = assets.get(target)
+            if asset is None or target.endswith(".html"):
+                return match.group(0)
+            return f'{match.group("attr")}="{self.url_prefix}{asset.versioned}"'
+
+        return ASSET_REFERENCE.sub(replace, html)
+
+    def build(self) -> dict:
+        """Собрать (или обновить) статику. Возвращает счётчики для журнала/CLI"""
+        manifest_file = os.path.join(self.build_dir, "manifest.json")
+        try:
+            with open(manifest_file) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+
+        assets, manifest, rebuilt = {}, {}, 0
+        sources = self._sources()
+        pages = {path: file for path, file in sources.items() if path.endswith(".html")}
+        for path, file in sources.items():
+            if path in pages:
+                continue
+            stat = os.stat(file)
+            entry = previous.get(path)
+            if (
+                entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and all(os.path.exists(variant) for variant, _ in entry["variants"].values())
+            ):
+                asset = Asset(path, file, entry["digest"], entry["size"], {
+                    encoding: tuple(variant) for encoding, variant in entry["variants"].items()
+                })
+            else:
+                with open(file, "rb") as f:
+                    asset = self._build_asset(path, file, f.read())
+                rebuilt += 1
+            assets[path] = asset
+            manifest[path] = {
+                "digest": asset.digest, "size": asset.size, "mtime_ns": stat.st_mtime_ns, "variants": asset.variants,
+            }
+
+        # HTML зависит от хэшей ресурсов, поэтому переписывается при каждой сборке
+        for path, file in pages.items():
+            with open(file, encoding="utf-8") as f:
+                html = self._rewrite_html(path, f.read(), assets).encode("utf-8")
+            built = os.path.join(self.build_dir, "pages", path)
+            _write_atomic(built, html)
+            assets[path] = self._build_asset(path, built, html)
+
+        _write_atomic(manifest_file, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+
+        with self._lock:
+            self._assets = assets
+            self._versioned = {asset.versioned: asset for asset in assets.values()}
+            self.built = True
+        return {"files": len(assets), "pages": len(pages), "rebuilt": rebuilt}
+
+    def ensure_built(self):
+        """Собрать статику, если её ещё не собирали (один раз на процесс, даже при параллельных запросах)"""
+        if self.built:
+            return
+        with self._build_lock:
+            if not self.built:
+                self.build()
+
+    def _discover(self, path: str):
+        """Файл, появившийся в каталогах-источниках после сборки (например, загруженное изображение):
+        хэшируется, сжимается и добавляется в хранилище. None — такого файла нет"""
+        path = posixpath.normpath(path)
+        if path.startswith((".", "/")) or path.endswith(".html") or any(part.startswith(".") for part in path.split("/")):
+            return None
+        for root in self.roots:
+            file = os.path.join(root, *path.split("/"))
+            if os.path.isfile(file):
+                break
+        else:
+            return None
+        with open(file, "rb") as f:
+            asset = self._build_asset(path, file, f.read())
+        with self._lock:
+            self._assets.setdefault(path, asset)
+            self._versioned.setdefault(asset.versioned, asset)
+            return self._assets[path]
+
+    def get(self, path: str):
+        """(Asset, версионированный ли путь) или (None, False)"""
+        self.ensure_built()
+        asset = self._versioned.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path) or self._discover(path), False
+
+    def url(self, path: str):
+        """Версионированный URL ресурса по логическому пути (или None, если такого нет)"""
+        self.ensure_built()
+        path = path.lstrip("/")
+        asset = self._assets.get(path) or self._discover(path)
+        return f"{self.url_prefix}{asset.versioned}" if asset is not None else None
+
+
+# Фронтенд и static_dir в одном пространстве путей: images/... из фронтенда и из static/images
+asset_store = AssetStore([settings.frontend_dir, settings.static_dir], settings.static_build_dir)
+
+
+def versioned_url(url):
+    """Локальный путь (images/x.png, /images/x.png, /static/images/x.png) -> версионированный URL.
+    Внешние и неизвестные адреса возвращаются как есть"""
+    if not url or "://" in url:
+        return url
+    path = url.lstrip("/")
+    static_prefix = settings.static_dir.strip("/") + "/"
+    if path.startswith(static_prefix):
+        path = path[len(static_prefix):]
+    return asset_store.url(path) or url
+
+
+class FileRangeResponse(Response):
+    """Ответ с куском файла: zero-copy через ASGI-расширение http.response.zerocopysend,
+    если сервер его поддерживает, иначе чтение чанками в пуле потоков"""
+
+    def __init__(self, file: str, offset: int, count: int, status_code: int, headers: dict, media_type: str,
+                 send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.file = file
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body  # False для HEAD: заголовки те же, тела нет
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.file, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend", "file": f.fileno(),
+                    "offset": self.offset, "count": self.count,
+                })
+                return
+            f.seek(self.offset)
+            remaining = self.count
+            while remaining:
+                chunk = await to_thread.run_sync(f.read, min(CHUNK_SIZE, remaining))
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining and chunk)})
+                if not chunk:
+                    break
+
+
+def _parse_range(header: str, size: int):
+    """Один диапазон bytes=start-end -> (offset, count); None — заголовок не поддерживается (отдаём целиком)"""
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if start:
+            offset = int(start)
+            last = min(int(end), size - 1) if end else size - 1
+        else:
+            offset = max(size - int(end), 0)
+            last = size - 1
+    except ValueError:
+        return None
+    if offset >= size or last < offset:
+        raise HTTPException(status_code=416, detail="Недопустимый диапазон", headers={"Content-Range": f"bytes */{size}"})
+    return offset, last - offset + 1
+
+
+def _encoding_weights(header: str) -> dict:
+    """Accept-Encoding -> {кодировка: q}; "br;q=0" — явный отказ, "*" — все неназванные"""
+    weights = {}
+    for item in header.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.lower()] = weight
+    return weights
+
+
+def _choose_encoding(header: str, variants: dict):
+    """Сжатый вариант с наибольшим q (при равных — br раньше gzip) или None — отдать как есть"""
+    weights = _encoding_weights(header)
+    best, best_weight = None, 0.0
+    for name in ("br", "gzip"):
+        weight = weights.get(name, weights.get("*", 0.0))
+        if name in variants and weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def asset_response(request: Request, asset: Asset, immutable: bool) -> Response:
+    """Ответ на ресурс: выбор сжатого варианта, ETag/304 и Range для несжатого"""
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""), asset.variants)
+    file, size = asset.variants[encoding] if encoding else (asset.file, asset.size)
+
+    etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE if immutable else REVALIDATE,
+        "accept-ranges": "bytes",
+    }
+    if asset.variants:
+        headers["vary"] = "Accept-Encoding"
+    if encoding:
+        headers["content-encoding"] = encoding
+
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    offset, count, status_code = 0, size, 200
+    range_header = request.headers.get("range")
+    if range_header and (request.headers.get("if-range", etag) == etag):
+        requested = _parse_range(range_header, size)
+        if requested:
+            offset, count = requested
+            status_code = 206
+            headers["content-range"] = f"bytes {offset}-{offset + count - 1}/{size}"
+
+    return FileRangeResponse(
+        file, offset, count, status_code, headers, asset.media_type, send_body=request.method != "HEAD"
+    )
@@ -1,15 +1,26 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .database import init_db
-from .routers import auth, products, brigades, harvest
+from .database import database_metrics, dispose_async_engines
+from .functional.auth import shutdown_hash_executor
+from .routers import auth, products, brigades, harvest, orders, assets
+from .functional.async_routes import asyncify_router
+from .functional.request_metrics import RequestMetricsMiddleware, metrics_registry
+from .functional.admission import AdmissionControlMiddleware, admission_controller
+from .functional.orders import reservation_sweeper
+from .functional.harvest_ingest import harvest_ingestor
+from .functional.reference_cache import reference_cache
+from .functional.static_assets import asset_store
+import asyncio
 import os
 
-# ВАЖНО: Импортируем все модели для создания таблиц
-from .models import users, brigades as brigades_model, collectors, products as products_model, harvest as harvest_model
-
 app = FastAPI(title=settings.app_name, debug=settings.debug)
 
+# Допуск по пулам маршрутов — внутри CORS (503 тоже получает CORS-заголовки) и внутри замеров (отказы видны в метриках)
+if settings.admission_enabled:
+    app.add_middleware(AdmissionControlMiddleware)
+
 # CORS - ВАЖНО: должен быть ДО всех роутеров!
 app.add_middleware(
     CORSMiddleware,
@@ -19,15 +30,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Замеры запросов (SQL, время, Server-Timing, медленные запросы) — снаружи всех остальных слоёв
+app.add_middleware(RequestMetricsMiddleware)
+
 # Роутеры API
+# В async-режиме обработчики каталога, бригад и журнала работают как async def поверх AsyncSession;
+# auth не переводится: регистрация и вход уже async def (bcrypt — в своём пуле, запросы к базе — в пуле потоков)
+api_routers = [products.router, brigades.router, harvest.router, orders.router]
+if settings.database_async:
+    api_routers = [asyncify_router(router) for router in api_routers]
+
 app.include_router(auth.router)
-app.include_router(products.router)
-app.include_router(brigades.router)
-app.include_router(harvest.router)
+app.include_router(assets.router)
+for router in api_routers:
+    app.include_router(router)
+
+def prepare(build_assets: bool = True):
+    """Однократная подготовка перед приёмом запросов. serve.py выполняет её в главном процессе до fork():
+    воркеры получают собранную статику в памяти готовой и не пишут в static_build_dir и в схему базы наперегонки"""
+    # Миграции со всеми моделями и пересчётами нужны только здесь и в manage.py — импорт приложения их не тянет
+    from .migrations import check_schema_version, migrate
+
+    # Схемой управляет python manage.py migrate; при старте только сверяем версию
+    if settings.auto_migrate:
+        migrate()
+    check_schema_version()
+    # Хэши и сжатые варианты статики; неизменившиеся файлы берутся из manifest.json прошлой сборки
+    if build_assets:
+        asset_store.build()
+    app.state.prepared = True
 
 @app.on_event("startup")
 def on_startup():
-    init_db()
+    # Без serve.py (run.py, uvicorn app.main:app) подготовка выполняется здесь, а статика
+    # собирается при первом обращении к ней — старт до первого ответа её не ждёт
+    if not getattr(app.state, "prepared", False):
+        prepare(build_assets=False)
+
+# Просроченные резервы заказов возвращаются на склад фоновой задачей в каждом воркере
+@app.on_event("startup")
+async def start_reservation_sweeper():
+    if settings.reservation_sweep_seconds:
+        app.state.reservation_sweeper = asyncio.create_task(reservation_sweeper())
+
+# Буфер приёма взвешиваний: фоновая запись пачками, при остановке дописывается всё принятое
+@app.on_event("startup")
+async def start_harvest_ingestor():
+    if settings.harvest_ingest_buffered:
+        harvest_ingestor.start()
+
+@app.on_event("shutdown")
+async def stop_harvest_ingestor():
+    await harvest_ingestor.stop()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    shutdown_hash_executor()
+
+@app.on_event("shutdown")
+async def stop_reservation_sweeper():
+    sweeper = getattr(app.state, "reservation_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+
+@app.on_event("shutdown")
+async def close_async_engines():
+    await dispose_async_engines()
 
 @app.get("/")
 def root():
@@ -35,4 +103,32 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/health/db")
+def database_health():
+    """Состояние пулов соединений основной базы и реплик"""
+    return database_metrics()
+
+@app.get("/health/admission")
+def admission_health():
+    """Загрузка пулов допуска: выполняются, ждут, допущено и отклонено"""
+    return admission_controller.stats()
+
+@app.get("/health/ingest")
+def ingest_health():
+    """Буфер приёма взвешиваний: в очереди, записано, отклонено"""
+    return harvest_ingestor.stats()
+
+@app.get("/health/reference")
+def reference_health():
+    """Справочники в памяти: версия, размер, попадания и перезагрузки"""
+    return reference_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Метрики запросов по маршрутам, пулов допуска и справочников в формате Prometheus (по процессу)"""
+    text = metrics_registry.render() + reference_cache.render_metrics()
+    if settings.admission_enabled:
+        text += admission_controller.render_metrics()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,92 @@
+from sqlalchemy import func, inspect
+from .database import Base, SessionLocal, engine, sync_indexes
+from .functional.crops import migrate_crop_dictionary
+from .functional.harvest_rollup import rebuild_harvest_rollup, recreate_harvest_rollup
+from .functional.reference_cache import create_reference_version
+from .functional.catalog_cache import create_catalog_version
+from .functional.season_stats import create_season_stats
+from .functional.harvest_partitions import (
+    partition_harvest_logs, season_partitions, split_sqlite_journal, sync_season_indexes, upcoming_seasons
+)
+from .models.schema import SchemaVersion
+# Все модели должны быть зарегистрированы в Base.metadata до create_all
+from .models import users, brigades, collectors, crops, products, harvest, orders, reference
+
+
+def create_tables(db):
+    """Создать недостающие таблицы"""
+    Base.metadata.create_all(bind=engine)
+
+
+def sync_model_indexes(db):
+    sync_indexes()
+    sync_season_indexes(db)
+
+
+# Миграции по порядку; каждая идемпотентна, поэтому новая база проходит их все без вреда
+MIGRATIONS = [
+    (1, "создание таблиц", create_tables),
+    (2, "справочник культур", migrate_crop_dictionary),
+    (3, "индексы по запросам роутеров", sync_model_indexes),
+    (4, "суточные итоги журнала", rebuild_harvest_rollup),
+    (5, "суточные итоги по сборщикам", recreate_harvest_rollup),
+    (6, "корзина и заказы", create_tables),
+    (7, "отклонённые при записи пачкой взвешивания", create_tables),
+    (8, "версия справочников", create_reference_version),
+    (9, "итоги сезона по сборщикам и бригадам", create_season_stats),
+    (10, "секции журнала по сезонам и архивы закрытых сезонов", partition_harvest_logs),
+    (11, "версия каталога", create_catalog_version),
+    (12, "журнал SQLite по таблицам сезонов", split_sqlite_journal),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version() -> int:
+    """Применённая версия схемы (0 — база не инициализирована)"""
+    if not inspect(engine).has_table(SchemaVersion.__tablename__):
+        return 0
+    db = SessionLocal()
+    try:
+        return db.query(func.max(SchemaVersion.version)).scalar() or 0
+    finally:
+        db.close()
+
+
+def migrate() -> list:
+    """Применить недостающие миграции. Возвращает список применённых (версия, описание)"""
+    applied = []
+    version = current_version()
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        db = SessionLocal()
+        try:
+            apply(db)
+            SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+            db.add(SchemaVersion(version=number))
+            db.commit()
+        finally:
+            db.close()
+        applied.append((number, description))
+    # Секции журнала на текущий и следующий сезон — заранее, чтобы первая запись сезона не ждала их создания
+    create_partitions()
+    return applied
+
+
+def create_partitions(seasons=None) -> list:
+    """Создать недостающие секции журнала (по умолчанию — текущего и следующего сезона); список созданных"""
+    db = SessionLocal()
+    try:
+        return season_partitions.create(db, seasons or upcoming_seasons())
+    finally:
+        db.close()
+
+
+def check_schema_version():
+    """Дешёвая проверка при старте: схема базы соответствует коду"""
+    version = current_version()
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Схема базы устарела (версия {version}, нужна {SCHEMA_VERSION}): выполните python manage.py migrate"
+        )
@@ -6,10 +6,10 @@ class Collector(Base):
     __tablename__ = "collectors"
 
     id = Column(Integer, primary_key=True, index=True)
-    full_name = Column(String(100), nullable=False, index=True)
+    full_name = Column(String(100), nullable=False)
     photo = Column(String, nullable=True)
     personal_characteristic = Column(String(500))
-    birth_year = Column(Integer, index=True, nullable=False)
-    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
+    birth_year = Column(Integer, nullable=False)
+    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False, index=True)
 
     brigade = relationship('Brigade', back_populates='collectors')
@@ -0,0 +1,10 @@
+from sqlalchemy import Integer, Column, String
+from ..database import Base
+
+class Crop(Base):
+    """Справочник культур"""
+    __tablename__ = "crops"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)  # Название для отображения
+    normalized_name = Column(String(100), nullable=False, unique=True, index=True)  # Ключ поиска и сопоставления
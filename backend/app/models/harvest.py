@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, Column, String, Float, ForeignKey, DateTime, Date
+from sqlalchemy import Integer, Column, String, Float, ForeignKey, DateTime, Date, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -6,16 +6,140 @@ from ..database import Base
 class HarvestLog(Base):
     """Журнал учета сбора урожая"""
     __tablename__ = "harvest_logs"
+    __table_args__ = (
+        # Порядок keyset-пагинации журнала: (harvest_date, id)
+        Index('ix_harvest_logs_date_id', 'harvest_date', 'id'),
+        # Фильтр по бригаде / сборщику + диапазон дат + тот же порядок страниц
+        Index('ix_harvest_logs_brigade_date_id', 'brigade_id', 'harvest_date', 'id'),
+        Index('ix_harvest_logs_collector_date_id', 'collector_id', 'harvest_date', 'id'),
+    )
+    # В SQLite harvest_logs — представление над таблицами сезонов: DELETE через триггер не сообщает число строк
+    __mapper_args__ = {"confirm_deleted_rows": False}
 
     id = Column(Integer, primary_key=True, index=True)
     collector_id = Column(Integer, ForeignKey('collectors.id'), nullable=False)
     brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
-    harvest_date = Column(Date, nullable=False, index=True)
-    crop_type = Column(String(100), nullable=False)  # Вид культуры
+    harvest_date = Column(Date, nullable=False)
+    crop_id = Column(Integer, ForeignKey('crops.id'), nullable=False, index=True)
+    crop_type = Column(String(100), nullable=False)  # Вид культуры (название из справочника)
     quantity = Column(Float, nullable=False)  # Количество (кг)
     quality_grade = Column(String(20), nullable=False)  # Класс качества (A, B, C)
     notes = Column(String(500), nullable=True)  # Примечания
     created_at = Column(DateTime, default=datetime.utcnow)
     
     collector = relationship('Collector', backref='harvest_logs')
-    brigade = relationship('Brigade', backref='harvest_logs')
\ No newline at end of file
+    brigade = relationship('Brigade', backref='harvest_logs')
+    crop = relationship('Crop')
+
+class HarvestDailyStat(Base):
+    """Суточные итоги сбора (день × бригада × культура × класс качества)"""
+    __tablename__ = "harvest_daily_stats"
+    __table_args__ = (
+        UniqueConstraint('harvest_date', 'brigade_id', 'crop_type', 'quality_grade', name='uq_harvest_daily_stats_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    harvest_date = Column(Date, nullable=False, index=True)
+    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
+    crop_type = Column(String(100), nullable=False)
+    quality_grade = Column(String(20), nullable=False)
+    total_quantity = Column(Float, nullable=False, default=0)  # Сумма (кг)
+    log_count = Column(Integer, nullable=False, default=0)  # Число записей журнала
+
+class HarvestCollectorDailyStat(Base):
+    """Суточные итоги по сборщикам (день × сборщик × бригада × культура).
+
+    Отдельно от HarvestDailyStat: сборщиков на порядки больше, чем бригад, и с ними
+    общие итоги выросли бы почти до размера журнала.
+    """
+    __tablename__ = "harvest_collector_daily_stats"
+    __table_args__ = (
+        UniqueConstraint(
+            'harvest_date', 'collector_id', 'brigade_id', 'crop_type', name='uq_harvest_collector_daily_stats_key'
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    harvest_date = Column(Date, nullable=False, index=True)
+    collector_id = Column(Integer, ForeignKey('collectors.id'), nullable=False)
+    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
+    crop_type = Column(String(100), nullable=False)
+    total_quantity = Column(Float, nullable=False, default=0)  # Сумма (кг)
+    log_count = Column(Integer, nullable=False, default=0)  # Число записей журнала
+
+class CollectorSeasonStat(Base):
+    """Итоги сезона (календарного года) по сборщику; бригада — текущая бригада сборщика.
+
+    Поддерживаются при записи и удалении журнала и при переводе сборщика, поэтому
+    рейтинг и карточки сборщиков не читают журнал.
+    """
+    __tablename__ = "collector_season_stats"
+    __table_args__ = (
+        UniqueConstraint('season', 'collector_id', name='uq_collector_season_stats_key'),
+        # Рейтинг сезона (в т.ч. внутри бригады): сортировка по сумме
+        Index('ix_collector_season_stats_season_quantity', 'season', 'total_quantity'),
+        Index('ix_collector_season_stats_brigade', 'season', 'brigade_id'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    season = Column(Integer, nullable=False)
+    collector_id = Column(Integer, ForeignKey('collectors.id'), nullable=False)
+    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
+    total_quantity = Column(Float, nullable=False, default=0)  # Сумма (кг)
+    log_count = Column(Integer, nullable=False, default=0)  # Число записей журнала
+    grade_a_count = Column(Integer, nullable=False, default=0)
+    grade_b_count = Column(Integer, nullable=False, default=0)
+    grade_c_count = Column(Integer, nullable=False, default=0)
+    last_harvest_date = Column(Date, nullable=True)
+
+class BrigadeSeasonStat(Base):
+    """Итоги сезона по бригаде — сумма итогов её текущих сборщиков"""
+    __tablename__ = "brigade_season_stats"
+    __table_args__ = (
+        UniqueConstraint('season', 'brigade_id', name='uq_brigade_season_stats_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    season = Column(Integer, nullable=False)
+    brigade_id = Column(Integer, ForeignKey('brigades.id'), nullable=False)
+    total_quantity = Column(Float, nullable=False, default=0)  # Сумма (кг)
+    log_count = Column(Integer, nullable=False, default=0)  # Число записей журнала
+    grade_a_count = Column(Integer, nullable=False, default=0)
+    grade_b_count = Column(Integer, nullable=False, default=0)
+    grade_c_count = Column(Integer, nullable=False, default=0)
+    last_harvest_date = Column(Date, nullable=True)
+
+class HarvestArchive(Base):
+    """Закрытый сезон журнала: его записи перенесены в отдельную таблицу только для чтения.
+
+    Границы дат и id позволяют читать архив, только если запрос может его задеть.
+    """
+    __tablename__ = "harvest_archives"
+
+    season = Column(Integer, primary_key=True, autoincrement=False)
+    table_name = Column(String(63), nullable=False)
+    log_count = Column(Integer, nullable=False)
+    total_quantity = Column(Float, nullable=False)
+    first_date = Column(Date, nullable=False)
+    last_date = Column(Date, nullable=False)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class HarvestIngestReject(Base):
+    """Взвешивание, принятое буфером (202), но отклонённое при записи пачки.
+    Весы уже получили подтверждение, поэтому отказ хранится для сверки по временному id.
+    """
+    __tablename__ = "harvest_ingest_rejects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provisional_id = Column(String(40), nullable=False, unique=True)
+    collector_id = Column(Integer, nullable=False, index=True)
+    brigade_id = Column(Integer, nullable=False)
+    harvest_date = Column(Date, nullable=False)
+    crop_type = Column(String(100), nullable=False)
+    quantity = Column(Float, nullable=False)
+    quality_grade = Column(String(20), nullable=False)
+    notes = Column(String(500), nullable=True)
+    reason = Column(String(200), nullable=False)
+    rejected_at = Column(DateTime, default=datetime.utcnow, index=True)
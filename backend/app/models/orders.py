@@ -0,0 +1,49 @@
+from sqlalchemy import Integer, Column, String, Float, ForeignKey, DateTime, UniqueConstraint, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..database import Base
+
+class CartItem(Base):
+    """Строка корзины пользователя"""
+    __tablename__ = "cart_items"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='uq_cart_items_user_product'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    added_at = Column(DateTime, default=datetime.utcnow)
+
+    product = relationship('Product')
+
+class Order(Base):
+    """Заказ. Товар списывается со склада при оформлении (status=reserved) и
+    возвращается, если заказ отменён или не оплачен до expires_at"""
+    __tablename__ = "orders"
+    __table_args__ = (
+        # Поиск просроченных резервов сборщиком
+        Index('ix_orders_status_expires_at', 'status', 'expires_at'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    status = Column(String(20), nullable=False)  # reserved, paid, cancelled, expired
+    total = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    items = relationship('OrderItem', back_populates='order')
+
+class OrderItem(Base):
+    """Строка заказа (цена фиксируется на момент оформления)"""
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+
+    order = relationship('Order', back_populates='items')
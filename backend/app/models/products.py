@@ -17,11 +17,11 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(200), nullable=False, index=True)
+    name = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=False)
     stock = Column(Integer, default=0)  # Количество на складе
-    category_id = Column(Integer, ForeignKey('product_categories.id'), nullable=False)
+    category_id = Column(Integer, ForeignKey('product_categories.id'), nullable=False, index=True)
     image_url = Column(String(500), nullable=True)
     
     category = relationship('ProductCategory', back_populates='products')
\ No newline at end of file
@@ -0,0 +1,16 @@
+from sqlalchemy import Integer, Column
+from ..database import Base
+
+class ReferenceVersion(Base):
+    """Версия справочников (бригады, сборщики, категории): растёт при каждом их изменении"""
+    __tablename__ = "reference_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class CatalogVersion(Base):
+    """Версия каталога (продукты, категории, остатки): растёт при каждом его изменении"""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
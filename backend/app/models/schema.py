@@ -0,0 +1,10 @@
+from sqlalchemy import Integer, Column, DateTime
+from datetime import datetime
+from ..database import Base
+
+class SchemaVersion(Base):
+    """Версия схемы базы (последняя применённая миграция)"""
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
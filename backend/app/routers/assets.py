@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse
+from ..functional.static_assets import asset_store, asset_response
+
+router = APIRouter(tags=["static"])
+
+
+async def _serve(request: Request, path: str):
+    if not asset_store.built:
+        # Первое обращение к статике в процессе: сборка — в пуле потоков, а не в цикле событий
+        await run_in_threadpool(asset_store.ensure_built)
+    asset, immutable = asset_store.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return asset_response(request, asset, immutable)
+
+
+@router.api_route("/assets/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_asset(path: str, request: Request):
+    """Ресурс по версионированному (immutable) или обычному (с проверкой ETag) пути"""
+    return await _serve(request, path)
+
+
+@router.api_route("/images/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_image(path: str, request: Request):
+    """Изображения по прежним адресам (например, из Product.image_url)"""
+    return await _serve(request, f"images/{path}")
+
+
+@router.get("/site", include_in_schema=False)
+async def site_root():
+    return RedirectResponse("/site/index.html")
+
+
+@router.api_route("/site/{page:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_page(page: str, request: Request):
+    """Страница фронтенда; ссылки на стили и изображения в ней уже версионированы"""
+    return await _serve(request, page or "index.html")
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+import time
 from ..database import get_db
 from ..schemas.schemas import UserResponse, UserRegistration, UserLogin
 from ..models.users import User
-from ..functional.auth import verify_password, verify_token, hash_password, create_token
+from ..config import settings
+from ..functional.auth import (
+    verify_password, verify_token, hash_password, create_token, password_needs_rehash,
+    user_cache, invalidate_user
+)
 
 router = APIRouter(
     prefix="/api/auth",
@@ -16,79 +22,93 @@ class TokenResponse(BaseModel):
     token_type: str
     user: dict
 
+def token_user(db_user: User) -> dict:
+    return {
+        "id": db_user.id,
+        "username": db_user.username,
+        "full_name": db_user.full_name
+    }
+
+# Регистрация и вход — async def: bcrypt ожидается без занятого потока сервера,
+# а запросы к базе выполняются в пуле потоков
 @router.post("/reg", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-def user_registration(user: UserRegistration, db: Session = Depends(get_db)):
+async def user_registration(user: UserRegistration, db: Session = Depends(get_db)):
     """Регистрация нового пользователя"""
     
     # Проверка существования пользователя
-    if db.query(User).filter(User.username == user.username).first():
-        raise HTTPException(status_code=400, detail="Пользователь с таким username уже существует")
+    def check_unique():
+        if db.query(User).filter(User.username == user.username).first():
+            raise HTTPException(status_code=400, detail="Пользователь с таким username уже существует")
+        
+        if user.vk_profile and db.query(User).filter(User.vk_profile == user.vk_profile).first():
+            raise HTTPException(status_code=400, detail="Этот VK профиль уже привязан к другому аккаунту")
     
-    if user.vk_profile and db.query(User).filter(User.vk_profile == user.vk_profile).first():
-        raise HTTPException(status_code=400, detail="Этот VK профиль уже привязан к другому аккаунту")
+    await run_in_threadpool(check_unique)
+    password_hash = await hash_password(user.password)
     
     # Создание нового пользователя
-    db_user = User(
-        username=user.username,
-        full_name=user.full_name,
-        password_hash=hash_password(user.password),
-        birth_date=user.birth_date,
-        address=user.address,
-        gender=user.gender,
-        hobby=user.hobby,
-        vk_profile=user.vk_profile,
-        blood_group=user.blood_group,
-        rh_factor=user.rh_factor
-    )
+    def create_user() -> dict:
+        db_user = User(
+            username=user.username,
+            full_name=user.full_name,
+            password_hash=password_hash,
+            birth_date=user.birth_date,
+            address=user.address,
+            gender=user.gender,
+            hobby=user.hobby,
+            vk_profile=user.vk_profile,
+            blood_group=user.blood_group,
+            rh_factor=user.rh_factor
+        )
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+        return token_user(db_user)
     
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    user_info = await run_in_threadpool(create_user)
     
     # Создание токена
-    token = create_token(db_user.id)
+    token = create_token(user_info["id"])
     
-    return TokenResponse(
-        access_token=token,
-        token_type="bearer",
-        user={
-            "id": db_user.id,
-            "username": db_user.username,
-            "full_name": db_user.full_name
-        }
-    )
+    return TokenResponse(access_token=token, token_type="bearer", user=user_info)
 
 @router.post("/login", response_model=TokenResponse, status_code=status.HTTP_200_OK)
-def user_login(user: UserLogin, db: Session = Depends(get_db)):
+async def user_login(user: UserLogin, db: Session = Depends(get_db)):
     """Авторизация пользователя"""
     
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await run_in_threadpool(lambda: db.query(User).filter(User.username == user.username).first())
     
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    if not db_user or not await verify_password(user.password, db_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный username или пароль"
         )
     
-    token = create_token(db_user.id)
+    # Поля читаем до commit(): после него объект перечитывается из базы, а здесь цикл событий
+    user_info = token_user(db_user)
+    
+    # Хеш с меньшей стоимостью bcrypt пересчитываем, пока пароль известен
+    if password_needs_rehash(db_user.password_hash):
+        db_user.password_hash = await hash_password(user.password)
+        await run_in_threadpool(db.commit)
+        invalidate_user(user_info["id"])
+    
+    token = create_token(user_info["id"])
     
-    return TokenResponse(
-        access_token=token,
-        token_type="bearer",
-        user={
-            "id": db_user.id,
-            "username": db_user.username,
-            "full_name": db_user.full_name
-        }
-    )
+    return TokenResponse(access_token=token, token_type="bearer", user=user_info)
 
 @router.get("/profile", response_model=UserResponse, status_code=status.HTTP_200_OK)
 def get_user_profile(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
     """Получение профиля пользователя"""
+    profile = user_cache.get(user_id)
+    if profile is not None:
+        return profile
     
     user = db.query(User).filter(User.id == user_id).first()
     
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    return user
\ No newline at end of file
+    profile = UserResponse.model_validate(user, from_attributes=True)
+    user_cache.set(user_id, profile, time.time() + settings.user_cache_ttl_seconds)
+    return profile
\ No newline at end of file
@@ -1,107 +1,96 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from typing import List, Optional
+from ..database import get_db, get_read_db
 from ..schemas.schemas import (
     BrigadeCreate, BrigadeResponse, BrigadeWithCollectors,
-    CollectorCreate, CollectorUpdate, CollectorResponse, CollectorWithBrigade
+    CollectorCreate, CollectorUpdate, CollectorResponse, CollectorWithBrigade, CollectorLeaderboardEntry
 )
 from ..models.brigades import Brigade
 from ..models.collectors import Collector
+from ..functional.columnar import negotiate_columnar, columnar_payload, columnar_response
+from ..functional.reference_cache import CollectorRef, reference_cache
+from ..functional.season_stats import (
+    current_season, collector_stats, collector_season_stats, brigade_season_stats, season_leaderboard,
+    transfer_collector
+)
 
 router = APIRouter(prefix="/api/brigades", tags=["brigades"])
 
-# Бригады
-@router.post("/", response_model=BrigadeResponse, status_code=status.HTTP_201_CREATED)
-def create_brigade(brigade: BrigadeCreate, db: Session = Depends(get_db)):
-    """Создать бригаду"""
-    existing = db.query(Brigade).filter(Brigade.name == brigade.name).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Бригада с таким названием уже существует")
-    
-    db_brigade = Brigade(**brigade.dict())
-    db.add(db_brigade)
-    db.commit()
-    db.refresh(db_brigade)
-    return db_brigade
-
-@router.get("/", response_model=List[BrigadeWithCollectors])
-def get_brigades(db: Session = Depends(get_db)):
-    """Получить все бригады со сборщиками"""
-    return db.query(Brigade).all()
-
-@router.get("/{brigade_id}", response_model=BrigadeWithCollectors)
-def get_brigade(brigade_id: int, db: Session = Depends(get_db)):
-    """Получить бригаду по ID"""
-    brigade = db.query(Brigade).filter(Brigade.id == brigade_id).first()
-    if not brigade:
-        raise HTTPException(status_code=404, detail="Бригада не найдена")
-    return brigade
-
-@router.delete("/{brigade_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_brigade(brigade_id: int, db: Session = Depends(get_db)):
-    """Удалить бригаду"""
-    db_brigade = db.query(Brigade).filter(Brigade.id == brigade_id).first()
-    if not db_brigade:
-        raise HTTPException(status_code=404, detail="Бригада не найдена")
-    
-    # Проверяем, есть ли сборщики в бригаде
-    if db_brigade.collectors:
-        raise HTTPException(status_code=400, detail="Нельзя удалить бригаду со сборщиками")
-    
-    db.delete(db_brigade)
-    db.commit()
-    return None
-
-# Сборщики
+# Сборщики (объявлены до /{brigade_id}, иначе путь /collectors перехватывается им)
 @router.post("/collectors", response_model=CollectorResponse, status_code=status.HTTP_201_CREATED)
 def create_collector(collector: CollectorCreate, db: Session = Depends(get_db)):
     """Создать сборщика"""
     # Проверяем существование бригады
-    brigade = db.query(Brigade).filter(Brigade.id == collector.brigade_id).first()
-    if not brigade:
+    if not reference_cache.brigade(db, collector.brigade_id):
         raise HTTPException(status_code=404, detail="Бригада не найдена")
     
     db_collector = Collector(**collector.dict())
     db.add(db_collector)
+    reference_cache.changed(db)
     db.commit()
     db.refresh(db_collector)
     return db_collector
 
 @router.get("/collectors", response_model=List[CollectorWithBrigade])
-def get_collectors(brigade_id: int = None, db: Session = Depends(get_db)):
-    """Получить всех сборщиков (с фильтрацией по бригаде)"""
-    query = db.query(Collector)
+def get_collectors(
+    request: Request,
+    response: Response,
+    brigade_id: int = None,
+    season: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Получить всех сборщиков (с фильтрацией по бригаде) с итогами сезона; поддерживает колоночный формат"""
+    # Сборщики и названия бригад — из справочников в памяти, без запроса с JOIN
+    snapshot = reference_cache.snapshot(db)
     if brigade_id:
-        query = query.filter(Collector.brigade_id == brigade_id)
+        collectors = snapshot.brigade_collectors.get(brigade_id, [])
+    else:
+        collectors = list(snapshot.collectors.values())
     
-    collectors = query.all()
-    result = []
-    for collector in collectors:
-        collector_dict = {
-            "id": collector.id,
-            "full_name": collector.full_name,
-            "photo": collector.photo,
-            "personal_characteristic": collector.personal_characteristic,
-            "birth_year": collector.birth_year,
-            "brigade_id": collector.brigade_id,
-            "brigade_name": collector.brigade.name
-        }
-        result.append(collector_dict)
-    return result
+    fmt = negotiate_columnar(request, response)
+    if fmt:
+        keys = list(CollectorRef._fields) + ["brigade_name"]
+        rows = [collector + (snapshot.brigades[collector.brigade_id].name,) for collector in collectors]
+        payload = columnar_payload(keys, rows, {"brigades": ("brigade_id", "brigade_name")})
+        return columnar_response(payload, fmt)
+    
+    stats = collector_season_stats(db, season or current_season())
+    return [
+        {**snapshot.collector_dict(collector), "season_stats": stats.get(collector.id)}
+        for collector in collectors
+    ]
+
+@router.get("/collectors/leaderboard", response_model=List[CollectorLeaderboardEntry])
+def get_collectors_leaderboard(
+    season: Optional[int] = None,
+    brigade_id: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """Рейтинг сборщиков за сезон (в бригаде, если указана) по итогам сезона, без чтения журнала"""
+    entries = season_leaderboard(db, season or current_season(), brigade_id=brigade_id, limit=limit)
+    collector_names, brigade_names = reference_cache.names(
+        db, {entry["collector_id"] for entry in entries}, {entry["brigade_id"] for entry in entries}
+    )
+    return [
+        {**entry, "collector_name": collector_names[entry["collector_id"]], "brigade_name": brigade_names[entry["brigade_id"]]}
+        for entry in entries
+    ]
 
 @router.get("/collectors/{collector_id}", response_model=CollectorResponse)
-def get_collector(collector_id: int, db: Session = Depends(get_db)):
-    """Получить сборщика по ID"""
-    collector = db.query(Collector).filter(Collector.id == collector_id).first()
+def get_collector(collector_id: int, season: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Получить сборщика по ID с итогами сезона"""
+    collector = reference_cache.collector(db, collector_id)
     if not collector:
         raise HTTPException(status_code=404, detail="Сборщик не найден")
-    return collector
+    return {**collector._asdict(), "season_stats": collector_stats(db, season or current_season(), collector_id)}
 
 @router.put("/collectors/{collector_id}", response_model=CollectorResponse)
 def update_collector(collector_id: int, collector_update: CollectorUpdate, db: Session = Depends(get_db)):
     """Обновить сборщика (в т.ч. перевести в другую бригаду)"""
-    db_collector = db.query(Collector).filter(Collector.id == collector_id).first()
+    # Блокировка строки: перевод ждёт записи журнала, которые уже проверили членство по старой бригаде
+    db_collector = db.query(Collector).filter(Collector.id == collector_id).with_for_update().first()
     if not db_collector:
         raise HTTPException(status_code=404, detail="Сборщик не найден")
     
@@ -109,16 +98,22 @@ def update_collector(collector_id: int, collector_update: CollectorUpdate, db: S
     
     # Если меняем бригаду, проверяем её существование
     if 'brigade_id' in update_data:
-        brigade = db.query(Brigade).filter(Brigade.id == update_data['brigade_id']).first()
-        if not brigade:
+        if not reference_cache.brigade(db, update_data['brigade_id']):
             raise HTTPException(status_code=404, detail="Бригада не найдена")
     
+    # Перевод в другую бригаду: итоги сезона сборщика переходят вместе с ним
+    if update_data.get('brigade_id') not in (None, db_collector.brigade_id):
+        transfer_collector(db, collector_id, db_collector.brigade_id, update_data['brigade_id'])
+    
     for key, value in update_data.items():
         setattr(db_collector, key, value)
     
+    reference_cache.changed(db)
     db.commit()
     db.refresh(db_collector)
-    return db_collector
+    # Тот же ответ, что у get_collector: с итогами текущего сезона (после перевода — уже в новой бригаде)
+    collector = {field: getattr(db_collector, field) for field in CollectorRef._fields}
+    return {**collector, "season_stats": collector_stats(db, current_season(), collector_id)}
 
 @router.delete("/collectors/{collector_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_collector(collector_id: int, db: Session = Depends(get_db)):
@@ -128,5 +123,67 @@ def delete_collector(collector_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Сборщик не найден")
     
     db.delete(db_collector)
+    reference_cache.changed(db)
+    db.commit()
+    return None
+
+# Бригады
+def with_season_stats(brigade: dict, brigade_stats: dict, collector_stats_by_id: dict) -> dict:
+    """Бригада и её сборщики с итогами сезона (места — среди всех бригад и всех сборщиков)"""
+    brigade["season_stats"] = brigade_stats.get(brigade["id"])
+    for collector in brigade["collectors"]:
+        collector["season_stats"] = collector_stats_by_id.get(collector["id"])
+    return brigade
+
+@router.post("/", response_model=BrigadeResponse, status_code=status.HTTP_201_CREATED)
+def create_brigade(brigade: BrigadeCreate, db: Session = Depends(get_db)):
+    """Создать бригаду"""
+    existing = db.query(Brigade).filter(Brigade.name == brigade.name).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Бригада с таким названием уже существует")
+    
+    db_brigade = Brigade(**brigade.dict())
+    db.add(db_brigade)
+    reference_cache.changed(db)
+    db.commit()
+    db.refresh(db_brigade)
+    return db_brigade
+
+@router.get("/", response_model=List[BrigadeWithCollectors])
+def get_brigades(season: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Получить все бригады со сборщиками и итогами сезона"""
+    snapshot = reference_cache.snapshot(db)
+    season = season or current_season()
+    brigade_stats, collector_stats_by_id = brigade_season_stats(db, season), collector_season_stats(db, season)
+    return [
+        with_season_stats(snapshot.brigade_dict(brigade), brigade_stats, collector_stats_by_id)
+        for brigade in snapshot.brigades.values()
+    ]
+
+@router.get("/{brigade_id}", response_model=BrigadeWithCollectors)
+def get_brigade(brigade_id: int, season: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """Получить бригаду по ID с итогами сезона"""
+    brigade = reference_cache.brigade(db, brigade_id)
+    if not brigade:
+        raise HTTPException(status_code=404, detail="Бригада не найдена")
+    season = season or current_season()
+    return with_season_stats(
+        reference_cache.snapshot(db).brigade_dict(brigade),
+        brigade_season_stats(db, season), collector_season_stats(db, season)
+    )
+
+@router.delete("/{brigade_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_brigade(brigade_id: int, db: Session = Depends(get_db)):
+    """Удалить бригаду"""
+    db_brigade = db.query(Brigade).filter(Brigade.id == brigade_id).first()
+    if not db_brigade:
+        raise HTTPException(status_code=404, detail="Бригада не найдена")
+    
+    # Проверяем, есть ли сборщики в бригаде
+    if db_brigade.collectors:
+        raise HTTPException(status_code=400, detail="Нельзя удалить бригаду со сборщиками")
+    
+    db.delete(db_brigade)
+    reference_cache.changed(db)
     db.commit()
     return None
\ No newline at end of file
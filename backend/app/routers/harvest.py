@@ -1,64 +1,183 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import List, Optional
 from datetime import date
-from ..database import get_db
-from ..schemas.schemas import HarvestLogCreate, HarvestLogResponse, HarvestLogWithDetails
-from ..models.harvest import HarvestLog
-from ..models.collectors import Collector
-from ..models.brigades import Brigade
+from ..database import get_db, get_read_db, read_session
+from ..schemas.schemas import (
+    HarvestLogCreate, HarvestLogResponse, HarvestLogWithDetails, HarvestLogPage,
+    HarvestImportReport, HarvestLogAccepted, HarvestIngestRejectResponse
+)
+from ..functional.pagination import encode_cursor, decode_cursor
+from ..functional.harvest_rollup import apply_harvest_log
+from ..functional.harvest_import import iter_records, import_batch, load_memberships
+from ..functional.harvest_ingest import harvest_ingestor
+from ..functional.reference_cache import reference_cache
+from ..functional.harvest_partitions import (
+    NO_PARTITION, SEASON_CLOSED, season_partitions, is_closed, journal_sources, fetch_journal, find_archived_log
+)
+from ..functional.crops import crop_dictionary
+from ..functional.harvest_export import EXPORT_MEDIA_TYPES, export_statement, filter_harvest_logs, journal_page_statement, iter_export
+from ..functional.harvest_analytics import (
+    MAX_TIMESERIES_GROUPS, summary_statement, harvest_timeseries, harvest_leaderboard
+)
+from ..functional.columnar import negotiate_columnar, columnar_payload, columnar_response
+from ..models.harvest import HarvestLog, HarvestIngestReject
 
 router = APIRouter(prefix="/api/harvest", tags=["harvest"])
 
+# Размер страницы журнала
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Импорт: записей в одной транзакции и максимум строк в отчёте об ошибках
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+
 @router.post("/", response_model=HarvestLogResponse, status_code=status.HTTP_201_CREATED)
 def create_harvest_log(log: HarvestLogCreate, db: Session = Depends(get_db)):
     """Создать запись о сборе урожая"""
-    # Проверяем существование сборщика и бригады
-    collector = db.query(Collector).filter(Collector.id == log.collector_id).first()
-    if not collector:
+    # Членство — из базы в этой же транзакции, а не из справочника в памяти: снимок воркера мог ещё
+    # не увидеть перевод сборщика, и итоги сезона ушли бы в старую бригаду
+    memberships = {}
+    load_memberships(db, [log.collector_id], memberships)
+    brigade_id = memberships[log.collector_id]
+    if brigade_id is None:
         raise HTTPException(status_code=404, detail="Сборщик не найден")
     
-    brigade = db.query(Brigade).filter(Brigade.id == log.brigade_id).first()
-    if not brigade:
+    if not reference_cache.brigade(db, log.brigade_id):
         raise HTTPException(status_code=404, detail="Бригада не найдена")
     
     # Проверяем, что сборщик состоит в указанной бригаде
-    if collector.brigade_id != log.brigade_id:
+    if brigade_id != log.brigade_id:
         raise HTTPException(status_code=400, detail="Сборщик не состоит в указанной бригаде")
     
-    db_log = HarvestLog(**log.dict())
+    if is_closed(db, log.harvest_date.year):
+        raise HTTPException(status_code=409, detail=SEASON_CLOSED)
+    if season_partitions.ensure(db, {log.harvest_date.year}):
+        raise HTTPException(status_code=409, detail=NO_PARTITION)
+    
+    # Культура берётся из справочника: одинаковые названия в разном написании сводятся к одной
+    crop_id, crop_name = crop_dictionary.resolve(db, log.crop_type)
+    db_log = HarvestLog(**{**log.dict(), "crop_type": crop_name}, crop_id=crop_id)
     db.add(db_log)
+    apply_harvest_log(db, db_log)
     db.commit()
     db.refresh(db_log)
     return db_log
 
-@router.get("/", response_model=List[HarvestLogWithDetails])
+@router.post("/ingest", response_model=HarvestLogAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_harvest_log(log: HarvestLogCreate, response: Response):
+    """Приём взвешивания с весов: при включённом буфере запись подтверждается временным id
+    и пишется в базу пачкой (202), иначе — сразу (201)"""
+    accepted = await harvest_ingestor.submit(log)
+    if accepted["committed"]:
+        response.status_code = status.HTTP_201_CREATED
+    return accepted
+
+@router.post("/import", response_model=HarvestImportReport)
+async def import_harvest_logs(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")
+):
+    """Массовый импорт журнала из CSV или NDJSON (тело запроса читается потоком, каждая пачка — своя транзакция)"""
+    if format is None:
+        format = "ndjson" if "json" in request.headers.get("content-type", "") else "csv"
+    
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    
+    async def flush():
+        nonlocal imported, failed
+        inserted, batch_errors = await run_in_threadpool(import_batch, batch)
+        imported += inserted
+        failed += len(batch_errors)
+        errors.extend(batch_errors[:MAX_IMPORT_ERRORS - len(errors)])
+        batch.clear()
+    
+    async for record in iter_records(request.stream(), format):
+        batch.append(record)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+@router.get("/ingest/rejects", response_model=List[HarvestIngestRejectResponse])
+def get_ingest_rejects(
+    collector_id: Optional[int] = None,
+    since: Optional[date] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db)
+):
+    """Взвешивания, подтверждённые весам (202), но отклонённые при записи пачкой — для сверки"""
+    query = db.query(HarvestIngestReject)
+    if collector_id:
+        query = query.filter(HarvestIngestReject.collector_id == collector_id)
+    if since:
+        query = query.filter(HarvestIngestReject.rejected_at >= since)
+    return query.order_by(HarvestIngestReject.id.desc()).limit(limit).all()
+
+@router.get("/ingest/rejects/{provisional_id}", response_model=HarvestIngestRejectResponse)
+def get_ingest_reject(provisional_id: str, db: Session = Depends(get_read_db)):
+    """Отказ по временному id; 404 — запись не отклонялась (записана или ещё в очереди)"""
+    reject = db.query(HarvestIngestReject).filter(HarvestIngestReject.provisional_id == provisional_id).first()
+    if not reject:
+        raise HTTPException(status_code=404, detail="Отказ по этому временному id не найден")
+    return reject
+
+@router.get("/", response_model=HarvestLogPage)
 def get_harvest_logs(
+    request: Request,
+    response: Response,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     collector_id: Optional[int] = None,
     brigade_id: Optional[int] = None,
     crop_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db)
 ):
-    """Получить журнал сбора урожая с фильтрацией"""
-    query = db.query(HarvestLog)
+    """Получить журнал сбора урожая с фильтрацией (постранично, по курсору).
+
+    С Accept: application/vnd.garden.columnar+json (или MessagePack) страница отдаётся
+    колонками, а имена сборщиков и бригад — справочниками.
+    """
+    fmt = negotiate_columnar(request, response)
+    crop_ids = crop_dictionary.search(db, crop_type) if crop_type else None
+    after = decode_cursor(cursor) if cursor else None
     
-    if start_date:
-        query = query.filter(HarvestLog.harvest_date >= start_date)
-    if end_date:
-        query = query.filter(HarvestLog.harvest_date <= end_date)
-    if collector_id:
-        query = query.filter(HarvestLog.collector_id == collector_id)
-    if brigade_id:
-        query = query.filter(HarvestLog.brigade_id == brigade_id)
-    if crop_type:
-        query = query.filter(HarvestLog.crop_type.ilike(f"%{crop_type}%"))
+    def page_query(log):
+        return journal_page_statement(
+            log, bool(fmt), start_date, end_date, collector_id, brigade_id, crop_ids, after, limit + 1
+        )
+    
+    # Архивы закрытых сезонов читаются, только если период (и курсор) их задевает
+    upper = min(end_date or after[0], after[0]) if after else end_date
+    keys, logs = fetch_journal(db, journal_sources(db, start_date, upper), page_query, limit + 1)
     
-    logs = query.order_by(HarvestLog.harvest_date.desc()).all()
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1].harvest_date, logs[-1].id)
+    
+    if fmt:
+        payload = columnar_payload(
+            keys, logs,
+            {"collectors": ("collector_id", "collector_name"), "brigades": ("brigade_id", "brigade_name")},
+            next_cursor=next_cursor
+        )
+        return columnar_response(payload, fmt)
     
     # Добавляем информацию о сборщике и бригаде
+    collector_names, brigade_names = reference_cache.names(
+        db, {log.collector_id for log in logs}, {log.brigade_id for log in logs}
+    )
     result = []
     for log in logs:
         log_dict = {
@@ -71,20 +190,47 @@ def get_harvest_logs(
             "quality_grade": log.quality_grade,
             "notes": log.notes,
             "created_at": log.created_at,
-            "collector_name": log.collector.full_name,
-            "brigade_name": log.brigade.name
+            "collector_name": collector_names[log.collector_id],
+            "brigade_name": brigade_names[log.brigade_id]
         }
         result.append(log_dict)
     
-    return result
+    return {"items": result, "next_cursor": next_cursor}
+
+@router.get("/export")
+def export_harvest_logs(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    collector_id: Optional[int] = None,
+    brigade_id: Optional[int] = None,
+    crop_type: Optional[str] = None
+):
+    """Выгрузить журнал потоком (CSV или NDJSON) с теми же фильтрами"""
+    with read_session() as db:
+        crop_ids = crop_dictionary.search(db, crop_type) if crop_type else None
+        # Журнал и архивы закрытых сезонов, которые задевает период
+        sources = journal_sources(db, start_date, end_date)
+    statements = [
+        filter_harvest_logs(
+            export_statement(table.c), start_date, end_date, collector_id, brigade_id, crop_ids, table.c
+        )
+        for table, _ in sources
+    ]
+    return StreamingResponse(
+        iter_export(read_session, statements, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="harvest.{format}"'}
+    )
 
 @router.get("/{log_id}", response_model=HarvestLogWithDetails)
-def get_harvest_log(log_id: int, db: Session = Depends(get_db)):
-    """Получить запись по ID"""
-    log = db.query(HarvestLog).filter(HarvestLog.id == log_id).first()
+def get_harvest_log(log_id: int, db: Session = Depends(get_read_db)):
+    """Получить запись по ID (в том числе из архива закрытого сезона)"""
+    log = db.query(HarvestLog).filter(HarvestLog.id == log_id).first() or find_archived_log(db, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Запись не найдена")
     
+    collector_names, brigade_names = reference_cache.names(db, {log.collector_id}, {log.brigade_id})
     return {
         "id": log.id,
         "collector_id": log.collector_id,
@@ -95,53 +241,84 @@ def get_harvest_log(log_id: int, db: Session = Depends(get_db)):
         "quality_grade": log.quality_grade,
         "notes": log.notes,
         "created_at": log.created_at,
-        "collector_name": log.collector.full_name,
-        "brigade_name": log.brigade.name
+        "collector_name": collector_names[log.collector_id],
+        "brigade_name": brigade_names[log.brigade_id]
     }
 
 @router.get("/stats/summary")
 def get_harvest_stats(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить статистику по сбору урожая"""
-    query = db.query(HarvestLog)
-    
-    if start_date:
-        query = query.filter(HarvestLog.harvest_date >= start_date)
-    if end_date:
-        query = query.filter(HarvestLog.harvest_date <= end_date)
-    
-    total_quantity = query.with_entities(func.sum(HarvestLog.quantity)).scalar() or 0
-    total_logs = query.count()
+    # Считаем по суточным итогам, а не по журналу: стоимость зависит от числа дней, а не записей
+    total_quantity, total_logs = db.execute(summary_statement(None, start_date, end_date)).one()
+    total_quantity = total_quantity or 0
+    total_logs = int(total_logs or 0)
     
     # Статистика по культурам
-    crops_stats = query.with_entities(
-        HarvestLog.crop_type,
-        func.sum(HarvestLog.quantity).label('total')
-    ).group_by(HarvestLog.crop_type).all()
+    crops_stats = db.execute(summary_statement("crop", start_date, end_date)).all()
     
-    # Статистика по бригадам
-    brigades_stats = query.with_entities(
-        Brigade.name,
-        func.sum(HarvestLog.quantity).label('total')
-    ).join(Brigade).group_by(Brigade.name).all()
+    # Статистика по бригадам (названия — из справочника в памяти, суммы по одноимённым складываются)
+    brigades_stats = db.execute(summary_statement("brigade", start_date, end_date)).all()
+    _, brigade_names = reference_cache.names(db, set(), {b[0] for b in brigades_stats})
+    by_brigade = {}
+    for brigade_id, total in brigades_stats:
+        name = brigade_names[brigade_id]
+        by_brigade[name] = by_brigade.get(name, 0.0) + float(total)
     
     return {
         "total_quantity": float(total_quantity),
         "total_logs": total_logs,
         "by_crop": [{"crop": c[0], "quantity": float(c[1])} for c in crops_stats],
-        "by_brigade": [{"brigade": b[0], "quantity": float(b[1])} for b in brigades_stats]
+        "by_brigade": [{"brigade": name, "quantity": quantity} for name, quantity in sorted(by_brigade.items())]
     }
 
+@router.get("/stats/timeseries")
+def get_harvest_timeseries(
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    group_by: str = Query("crop", pattern="^(crop|brigade|collector|grade)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    brigade_id: Optional[int] = None,
+    crop_type: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_TIMESERIES_GROUPS),
+    db: Session = Depends(get_read_db)
+):
+    """Сбор по дням, неделям или месяцам в разрезе культур, бригад, сборщиков или классов качества"""
+    crop_names = crop_dictionary.search_names(db, crop_type) if crop_type else None
+    return harvest_timeseries(
+        db, bucket, group_by, start_date=start_date, end_date=end_date,
+        brigade_id=brigade_id, crop_names=crop_names, limit=limit
+    )
+
+@router.get("/stats/leaderboard")
+def get_harvest_leaderboard(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    brigade_id: Optional[int] = None,
+    crop_type: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """Рейтинг сборщиков по количеству собранного за период"""
+    crop_names = crop_dictionary.search_names(db, crop_type) if crop_type else None
+    return harvest_leaderboard(
+        db, start_date=start_date, end_date=end_date,
+        brigade_id=brigade_id, crop_names=crop_names, limit=limit
+    )
+
 @router.delete("/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_harvest_log(log_id: int, db: Session = Depends(get_db)):
     """Удалить запись"""
     log = db.query(HarvestLog).filter(HarvestLog.id == log_id).first()
     if not log:
+        if find_archived_log(db, log_id):
+            raise HTTPException(status_code=409, detail=SEASON_CLOSED)
         raise HTTPException(status_code=404, detail="Запись не найдена")
     
+    apply_harvest_log(db, log, sign=-1)
     db.delete(log)
     db.commit()
     return None
\ No newline at end of file
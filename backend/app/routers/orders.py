@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, status, HTTPException
+from sqlalchemy.orm import Session, selectinload
+from typing import List
+from ..database import get_db, upsert_insert
+from ..schemas.schemas import CartItemUpdate, CartResponse, OrderResponse
+from ..models.orders import CartItem, Order
+from ..models.products import Product
+from ..functional.auth import verify_token
+from ..functional.orders import PAID, CANCELLED, checkout, close_order
+
+router = APIRouter(prefix="/api", tags=["orders"])
+
+# Корзина
+@router.get("/cart", response_model=CartResponse)
+def get_cart(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Получить корзину текущего пользователя"""
+    lines = db.query(CartItem.product_id, Product.name, Product.price, CartItem.quantity).join(
+        Product, Product.id == CartItem.product_id
+    ).filter(CartItem.user_id == user_id).order_by(CartItem.added_at, CartItem.id).all()
+    return {
+        "items": [line._asdict() for line in lines],
+        "total": round(sum(line.price * line.quantity for line in lines), 2)
+    }
+
+@router.put("/cart/{product_id}", response_model=CartResponse)
+def set_cart_item(
+    product_id: int,
+    item: CartItemUpdate,
+    user_id: int = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """Задать количество товара в корзине (0 — убрать)"""
+    if item.quantity == 0:
+        db.query(CartItem).filter(CartItem.user_id == user_id, CartItem.product_id == product_id).delete()
+    else:
+        if not db.query(Product.id).filter(Product.id == product_id).first():
+            raise HTTPException(status_code=404, detail="Продукт не найден")
+        # Склад на этом шаге не проверяется и не резервируется — только при оформлении заказа
+        stmt = upsert_insert(db, CartItem).values(user_id=user_id, product_id=product_id, quantity=item.quantity)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "product_id"], set_={"quantity": item.quantity}
+        ))
+    db.commit()
+    return get_cart(user_id, db)
+
+@router.delete("/cart", status_code=status.HTTP_204_NO_CONTENT)
+def clear_cart(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Очистить корзину"""
+    db.query(CartItem).filter(CartItem.user_id == user_id).delete()
+    db.commit()
+    return None
+
+# Заказы
+@router.post("/orders", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
+def create_order(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Оформить заказ по корзине: товар резервируется на складе до оплаты"""
+    return checkout(db, user_id)
+
+@router.get("/orders", response_model=List[OrderResponse])
+def get_orders(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Заказы текущего пользователя (новые первыми)"""
+    return db.query(Order).options(selectinload(Order.items)).filter(
+        Order.user_id == user_id
+    ).order_by(Order.id.desc()).all()
+
+@router.post("/orders/{order_id}/pay", response_model=OrderResponse)
+def pay_order(order_id: int, user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Оплатить заказ (пока не истёк резерв)"""
+    return close_order(db, user_id, order_id, PAID)
+
+@router.post("/orders/{order_id}/cancel", response_model=OrderResponse)
+def cancel_order(order_id: int, user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
+    """Отменить неоплаченный заказ и вернуть товар на склад"""
+    return close_order(db, user_id, order_id, CANCELLED)
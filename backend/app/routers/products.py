@@ -1,15 +1,33 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, HTTPException, Request
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, joinedload
 from typing import List
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..schemas.schemas import (
     ProductCategoryCreate, ProductCategoryResponse,
     ProductCreate, ProductUpdate, ProductResponse
 )
 from ..models.products import ProductCategory, Product
+from ..functional.catalog_cache import catalog_cache
+from ..functional.reference_cache import reference_cache
+from ..functional.orders import adjust_stock
+from ..functional.static_assets import versioned_url
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+# Списки каталога кэшируются (catalog_cache) и строятся по основной базе:
+# ответ с отстающей реплики остался бы в кэше до следующей записи
+products_adapter = TypeAdapter(List[ProductResponse])
+categories_adapter = TypeAdapter(List[ProductCategoryResponse])
+
+
+def product_response(product: Product) -> ProductResponse:
+    """Продукт для ответа: локальное изображение — по версионированному адресу с долгим кэшированием"""
+    response = ProductResponse.model_validate(product)
+    response.image_url = versioned_url(response.image_url)
+    return response
+
+
 # Категории продукции
 @router.post("/categories", response_model=ProductCategoryResponse, status_code=status.HTTP_201_CREATED)
 def create_category(category: ProductCategoryCreate, db: Session = Depends(get_db)):
@@ -20,53 +38,67 @@ def create_category(category: ProductCategoryCreate, db: Session = Depends(get_d
     
     db_category = ProductCategory(**category.dict())
     db.add(db_category)
+    reference_cache.changed(db)
+    catalog_cache.changed(db)
     db.commit()
     db.refresh(db_category)
     return db_category
 
 @router.get("/categories", response_model=List[ProductCategoryResponse])
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_db)):
     """Получить все категории"""
-    return db.query(ProductCategory).all()
+    def build():
+        categories = [category._asdict() for category in reference_cache.snapshot(db).categories.values()]
+        return categories_adapter.dump_json(categories_adapter.validate_python(categories))
+    
+    return catalog_cache.respond(request, db, ("categories",), build)
+
+@router.get("/cache/stats")
+def get_catalog_cache_stats():
+    """Счётчики кэша каталога"""
+    return catalog_cache.stats()
 
 @router.get("/categories/{category_id}", response_model=ProductCategoryResponse)
-def get_category(category_id: int, db: Session = Depends(get_db)):
+def get_category(category_id: int, db: Session = Depends(get_read_db)):
     """Получить категорию по ID"""
-    category = db.query(ProductCategory).filter(ProductCategory.id == category_id).first()
+    category = reference_cache.category(db, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Категория не найдена")
-    return category
+    return category._asdict()
 
 # Продукция
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """Создать продукт"""
     # Проверяем существование категории
-    category = db.query(ProductCategory).filter(ProductCategory.id == product.category_id).first()
-    if not category:
+    if not reference_cache.category(db, product.category_id):
         raise HTTPException(status_code=404, detail="Категория не найдена")
     
     db_product = Product(**product.dict())
     db.add(db_product)
+    catalog_cache.changed(db)
     db.commit()
     db.refresh(db_product)
-    return db_product
+    return product_response(db_product)
 
 @router.get("/", response_model=List[ProductResponse])
-def get_products(category_id: int = None, db: Session = Depends(get_db)):
+def get_products(request: Request, category_id: int = None, db: Session = Depends(get_db)):
     """Получить все продукты (с фильтрацией по категории)"""
-    query = db.query(Product)
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-    return query.all()
+    def build():
+        query = db.query(Product).options(joinedload(Product.category))
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        return products_adapter.dump_json([product_response(product) for product in query.all()])
+    
+    return catalog_cache.respond(request, db, ("products", category_id), build)
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, db: Session = Depends(get_read_db)):
     """Получить продукт по ID"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).options(joinedload(Product.category)).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Продукт не найден")
-    return product
+    return product_response(product)
 
 @router.put("/{product_id}", response_model=ProductResponse)
 def update_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
@@ -76,12 +108,21 @@ def update_product(product_id: int, product_update: ProductUpdate, db: Session =
         raise HTTPException(status_code=404, detail="Продукт не найден")
     
     update_data = product_update.dict(exclude_unset=True)
+    stock = update_data.pop('stock', None)
     for key, value in update_data.items():
         setattr(db_product, key, value)
     
+    # Остаток меняется на разницу с прочитанным, а не присваивается: резервы заказов,
+    # оформленных между чтением и записью, сохраняются
+    if stock is not None and stock != db_product.stock:
+        if not adjust_stock(db, product_id, stock - db_product.stock):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Остаток изменился: товар уже зарезервирован заказами")
+    
+    catalog_cache.changed(db)
     db.commit()
     db.refresh(db_product)
-    return db_product
+    return product_response(db_product)
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_product(product_id: int, db: Session = Depends(get_db)):
@@ -91,5 +132,6 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Продукт не найден")
     
     db.delete(db_product)
+    catalog_cache.changed(db)
     db.commit()
     return None
\ No newline at end of file
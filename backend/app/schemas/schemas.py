@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime, date
 import re
 
@@ -27,6 +27,15 @@ class CollectorUpdate(BaseModel):
     birth_year: Optional[int] = Field(None, ge=1950, le=2010)
     brigade_id: Optional[int] = None
 
+class SeasonStats(BaseModel):
+    """Итоги сезона (календарного года) по сборщику или бригаде"""
+    season: int
+    total_quantity: float
+    log_count: int
+    grades: Dict[str, int]  # класс качества -> число записей
+    last_harvest_date: Optional[date]
+    rank: int  # место среди сборщиков (или бригад) сезона
+
 class CollectorResponse(BaseModel):
     id: int
     full_name: str
@@ -34,6 +43,7 @@ class CollectorResponse(BaseModel):
     personal_characteristic: Optional[str]
     birth_year: int
     brigade_id: int
+    season_stats: Optional[SeasonStats] = None
 
     class Config:
         from_attributes = True
@@ -82,12 +92,20 @@ class ProductResponse(BaseModel):
     category_id: int
     image_url: Optional[str]
     category: ProductCategoryResponse
+
     class Config:
         from_attributes = True
 
 # === БРИГАДЫ (обновленные) ===
 class BrigadeWithCollectors(BrigadeResponse):
     collectors: List['CollectorResponse'] = []
+    season_stats: Optional[SeasonStats] = None
+
+class CollectorLeaderboardEntry(SeasonStats):
+    collector_id: int
+    collector_name: str
+    brigade_id: int
+    brigade_name: str
 
 class CollectorWithBrigade(CollectorResponse):
     brigade_name: str
@@ -121,10 +139,36 @@ class HarvestLogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class HarvestLogAccepted(BaseModel):
+    provisional_id: str
+    committed: bool  # False — запись в очереди на запись пачкой
+    id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class HarvestIngestRejectResponse(HarvestLogCreate):
+    provisional_id: str
+    reason: str
+    rejected_at: datetime
+    class Config:
+        from_attributes = True
+
 class HarvestLogWithDetails(HarvestLogResponse):
     collector_name: str
     brigade_name: str
 
+class HarvestLogPage(BaseModel):
+    items: List[HarvestLogWithDetails]
+    next_cursor: Optional[str] = None
+
+class HarvestImportError(BaseModel):
+    row: int  # строка файла, с которой начинается запись
+    errors: List[str]
+
+class HarvestImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[HarvestImportError]
+
 class UserRegistration(BaseModel):
     username: str = Field(..., min_length=3, description="Username должен быть уникальным")
     full_name: str = Field(..., min_length=3, description="ФИО")
@@ -193,3 +237,34 @@ class UserLogin(BaseModel):
     password: str
 
 
+
+# === КОРЗИНА И ЗАКАЗЫ ===
+class CartItemUpdate(BaseModel):
+    quantity: int = Field(..., ge=0, le=1000, description="0 — убрать товар из корзины")
+
+class CartItemResponse(BaseModel):
+    product_id: int
+    name: str
+    price: float
+    quantity: int
+
+class CartResponse(BaseModel):
+    items: List[CartItemResponse]
+    total: float
+
+class OrderItemResponse(BaseModel):
+    product_id: int
+    quantity: int
+    price: float
+    class Config:
+        from_attributes = True
+
+class OrderResponse(BaseModel):
+    id: int
+    status: str
+    total: float
+    created_at: datetime
+    expires_at: datetime
+    items: List[OrderItemResponse]
+    class Config:
+        from_attributes = True
@@ -0,0 +1,146 @@
+"""Проверка резерва склада под конкурентными оформлениями заказов: товара не продаётся больше, чем было.
+
+Запуск из каталога backend:
+    python -m benchmarks.checkout --users 300 --stock 100
+    python -m benchmarks.checkout --database-url postgresql://...   # пустая база, схема создаётся миграциями
+
+Каждый пользователь кладёт в корзину случайный набор популярных товаров (в случайном порядке),
+после чего все оформляют заказ одновременно. Код выхода 1, если остаток ушёл в минус, списано
+больше начального запаса, проданное не сходится с заказами или какой-то ответ — 5xx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def prepare(args) -> tuple:
+    """Товары с запасом args.stock и пользователи с корзинами; (id товаров, токены)"""
+    from sqlalchemy import insert
+    from datetime import date
+    from app.database import SessionLocal
+    from app.functional.auth import create_token
+    from app.models.orders import CartItem
+    from app.models.products import Product, ProductCategory
+    from app.models.users import User
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        category = ProductCategory(name=f"Проверка резерва {os.urandom(3).hex()}")
+        db.add(category)
+        db.flush()
+        products = [
+            Product(name=f"Популярное удобрение {number}", price=100.0, stock=args.stock, category_id=category.id)
+            for number in range(args.products)
+        ]
+        db.add_all(products)
+        db.flush()
+        product_ids = [product.id for product in products]
+
+        suffix = os.urandom(3).hex()
+        users = [
+            User(
+                username=f"checkout_{suffix}_{number}", full_name="Покупатель", password_hash="-",
+                birth_date=date(1990, 1, 1), address="Тестовый адрес 1", gender="Мужской", blood_group="1", rh_factor="+",
+            )
+            for number in range(args.users)
+        ]
+        db.add_all(users)
+        db.flush()
+
+        cart = []
+        for user in users:
+            chosen = rng.sample(product_ids, rng.randint(1, len(product_ids)))
+            cart += [{"user_id": user.id, "product_id": product_id, "quantity": rng.randint(1, 3)} for product_id in chosen]
+        db.execute(insert(CartItem), cart)
+        db.commit()
+        return product_ids, [create_token(user.id) for user in users]
+    finally:
+        db.close()
+
+
+def verify(product_ids: list) -> dict:
+    """Сверить остатки со списанным по заказам в статусе reserved"""
+    from sqlalchemy import func
+    from app.database import SessionLocal
+    from app.models.orders import Order, OrderItem
+    from app.models.products import Product
+
+    db = SessionLocal()
+    try:
+        stock = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(product_ids)))
+        sold = dict(db.query(OrderItem.product_id, func.sum(OrderItem.quantity)).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(OrderItem.product_id.in_(product_ids), Order.status == "reserved").group_by(OrderItem.product_id))
+    finally:
+        db.close()
+    return {
+        product_id: {"stock": stock[product_id], "sold": int(sold.get(product_id, 0))}
+        for product_id in product_ids
+    }
+
+
+async def checkout_all(app, tokens: list) -> dict:
+    import httpx
+
+    statuses = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def order(token: str):
+            response = await client.post("/api/orders", headers={"Authorization": f"Bearer {token}"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        await asyncio.gather(*(order(token) for token in tokens))
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка отсутствия перепродажи при параллельных заказах")
+    parser.add_argument("--database-url", help="по умолчанию — временная база SQLite")
+    parser.add_argument("--users", type=int, default=300, help="параллельных оформлений заказа")
+    parser.add_argument("--products", type=int, default=3, help="популярных товаров в корзинах")
+    parser.add_argument("--stock", type=int, default=100, help="начальный запас каждого товара")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp, 'checkout.db')}"
+        os.environ.setdefault("SLOW_REQUEST_MS", "0")
+        # Проверяется резерв склада, а не отказы по перегрузке: все заказы должны дойти до базы
+        os.environ.setdefault("ADMISSION_ENABLED", "false")
+        from app.main import app
+        from app.migrations import migrate
+
+        migrate()
+        product_ids, tokens = prepare(args)
+        started = time.perf_counter()
+        statuses = asyncio.run(checkout_all(app, tokens))
+        elapsed = time.perf_counter() - started
+        products = verify(product_ids)
+
+    failures = []
+    for product_id, result in products.items():
+        if result["stock"] < 0:
+            failures.append(f"товар {product_id}: отрицательный остаток {result['stock']}")
+        if result["stock"] + result["sold"] != args.stock:
+            failures.append(f"товар {product_id}: остаток {result['stock']} + продано {result['sold']} != {args.stock}")
+    server_errors = sum(count for code, count in statuses.items() if code >= 500)
+    if server_errors:
+        failures.append(f"ответов 5xx: {server_errors}")
+
+    print(json.dumps({
+        "checkouts": args.users,
+        "seconds": round(elapsed, 3),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "products": products,
+        "failures": failures,
+    }, ensure_ascii=False, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Синтетические данные для бенчмарков: воспроизводимые при одном и том же --seed.
+
+Запуск из каталога backend (база создаётся/обновляется через миграции):
+    python -m benchmarks.dataset --database-url sqlite:///bench.db --logs 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, fields
+from datetime import date, datetime, time as dt_time, timedelta
+
+BENCH_USERNAME = "bench_user"
+BENCH_PASSWORD = "Bench-Pass_1!"
+
+CROPS = (
+    "Томаты", "Огурцы", "Картофель", "Морковь", "Капуста", "Свёкла",
+    "Лук", "Чеснок", "Перец", "Кабачки", "Тыква", "Клубника",
+)
+FIRST_NAMES = ("Иван", "Пётр", "Анна", "Мария", "Сергей", "Ольга", "Дмитрий", "Елена", "Алексей", "Наталья")
+LAST_NAMES = ("Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Волков", "Соколов", "Орлов", "Зайцев")
+GRADES = ("A", "B", "C")
+
+
+@dataclass
+class DatasetConfig:
+    seed: int = 42
+    categories: int = 10
+    products: int = 500
+    brigades: int = 20
+    collectors_per_brigade: int = 15
+    logs: int = 100_000
+    days: int = 730
+    end_date: date = date(2025, 12, 31)
+    batch_size: int = 10_000
+
+
+def generate(db, config: DatasetConfig) -> dict:
+    """Заполнить пустую базу; возвращает число созданных строк по таблицам"""
+    from sqlalchemy import insert
+    from app.functional.auth import hash_password
+    from app.functional.crops import crop_dictionary
+    from app.functional.harvest_partitions import assign_log_ids, season_partitions
+    from app.functional.harvest_rollup import rebuild_harvest_rollup
+    from app.functional.season_stats import rebuild_season_stats
+    from app.models.brigades import Brigade
+    from app.models.collectors import Collector
+    from app.models.harvest import HarvestLog
+    from app.models.products import Product, ProductCategory
+    from app.models.users import User
+
+    rng = random.Random(config.seed)
+
+    db.execute(insert(ProductCategory), [
+        {"name": f"Категория {number}", "description": f"Удобрения группы {number}"}
+        for number in range(1, config.categories + 1)
+    ])
+    category_ids = [row[0] for row in db.query(ProductCategory.id).order_by(ProductCategory.id)]
+    db.execute(insert(Product), [
+        {
+            "name": f"Удобрение {number}",
+            "description": "Синтетический товар для нагрузочного теста",
+            "price": round(rng.uniform(50, 5000), 2),
+            "stock": rng.randint(0, 1000),
+            "category_id": rng.choice(category_ids),
+        }
+        for number in range(1, config.products + 1)
+    ])
+
+    db.execute(insert(Brigade), [{"name": f"Бригада {number}"} for number in range(1, config.brigades + 1)])
+    brigade_ids = [row[0] for row in db.query(Brigade.id).order_by(Brigade.id)]
+    db.execute(insert(Collector), [
+        {
+            "full_name": f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}",
+            "birth_year": rng.randint(1960, 2005),
+            "brigade_id": brigade_id,
+        }
+        for brigade_id in brigade_ids
+        for _ in range(config.collectors_per_brigade)
+    ])
+    collectors = db.query(Collector.id, Collector.brigade_id).order_by(Collector.id).all()
+
+    crops = [crop_dictionary.resolve(db, name) for name in CROPS]
+    db.add(User(
+        username=BENCH_USERNAME,
+        full_name="Нагрузочный Тест",
+        password_hash=asyncio.run(hash_password(BENCH_PASSWORD)),
+        birth_date=date(1990, 1, 1),
+        address="Тестовый адрес 1",
+        gender="Женский",
+        blood_group="1",
+        rh_factor="+",
+    ))
+    db.commit()
+
+    start_date = config.end_date - timedelta(days=config.days - 1)
+    season_partitions.create(db, range(start_date.year, config.end_date.year + 1))
+    for offset in range(0, config.logs, config.batch_size):
+        rows = []
+        for _ in range(min(config.batch_size, config.logs - offset)):
+            collector_id, brigade_id = rng.choice(collectors)
+            crop_id, crop_name = rng.choice(crops)
+            harvest_date = start_date + timedelta(days=rng.randrange(config.days))
+            rows.append({
+                "collector_id": collector_id,
+                "brigade_id": brigade_id,
+                "harvest_date": harvest_date,
+                "crop_id": crop_id,
+                "crop_type": crop_name,
+                "quantity": round(rng.uniform(0.5, 120), 1),
+                "quality_grade": rng.choice(GRADES),
+                "notes": None,
+                "created_at": datetime.combine(harvest_date, dt_time(18, 0)),
+            })
+        assign_log_ids(db.connection(), rows)
+        db.execute(insert(HarvestLog), rows)
+        db.commit()
+
+    rollup_rows = rebuild_harvest_rollup(db)
+    season_rows = rebuild_season_stats(db)
+    return {
+        "product_categories": config.categories,
+        "products": config.products,
+        "brigades": config.brigades,
+        "collectors": len(collectors),
+        "crops": len(crops),
+        "harvest_logs": config.logs,
+        "harvest_daily_stats": rollup_rows,
+        "collector_season_stats": season_rows,
+    }
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = DatasetConfig()
+    for field in fields(DatasetConfig):
+        if field.type is date:
+            continue
+        parser.add_argument(
+            "--" + field.name.replace("_", "-"), type=int, default=getattr(defaults, field.name),
+            help=f"по умолчанию {getattr(defaults, field.name)}"
+        )
+
+
+def config_from_args(args) -> DatasetConfig:
+    return DatasetConfig(**{
+        field.name: getattr(args, field.name) for field in fields(DatasetConfig) if field.type is not date
+    })
+
+
+def create_dataset(database_url: str, config: DatasetConfig) -> dict:
+    """Применить миграции к базе по URL и заполнить её. Приложение импортируется уже с этим URL"""
+    os.environ["DATABASE_URL"] = database_url
+    from app.database import SessionLocal
+    from app.migrations import migrate
+
+    migrate()
+    db = SessionLocal()
+    try:
+        return generate(db, config)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных для бенчмарков")
+    parser.add_argument("--database-url", required=True, help="пустая база SQLite или PostgreSQL")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = create_dataset(args.database_url, config_from_args(args))
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
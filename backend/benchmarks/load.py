@@ -0,0 +1,221 @@
+"""Нагрузочный тест всех роутеров через ASGI-клиент в том же процессе (без сети и uvicorn).
+
+Запуск из каталога backend:
+    python -m benchmarks.load --requests 5000 --concurrency 32 --output benchmarks/results/load.json
+    python -m benchmarks.load --database-url postgresql://... --baseline benchmarks/results/load.json
+
+Без --database-url база SQLite создаётся во временном каталоге генератором benchmarks.dataset
+(масштаб задаётся теми же параметрами: --logs, --brigades и т. д.). Обращения выбираются
+случайно с весами из SCENARIOS, последовательность воспроизводима при одном --seed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from .dataset import BENCH_USERNAME, BENCH_PASSWORD, add_config_arguments, config_from_args, create_dataset
+
+
+class Fixture:
+    """Идентификаторы из базы, по которым строятся запросы"""
+
+    def __init__(self, db):
+        from sqlalchemy import func
+        from app.models.brigades import Brigade
+        from app.models.collectors import Collector
+        from app.models.harvest import HarvestLog
+        from app.models.products import Product, ProductCategory
+
+        self.product_ids = [row[0] for row in db.query(Product.id)]
+        self.category_ids = [row[0] for row in db.query(ProductCategory.id)]
+        self.brigade_ids = [row[0] for row in db.query(Brigade.id)]
+        self.collectors = db.query(Collector.id, Collector.brigade_id).all()
+        self.min_log_id, self.max_log_id = db.query(func.min(HarvestLog.id), func.max(HarvestLog.id)).one()
+        self.first_date, self.last_date = db.query(
+            func.min(HarvestLog.harvest_date), func.max(HarvestLog.harvest_date)
+        ).one()
+        self.token = None
+
+    def log_id(self, rng) -> int:
+        return rng.randint(self.min_log_id, self.max_log_id)
+
+    def period(self, rng, days: int) -> str:
+        start = self.first_date + timedelta(days=rng.randrange(max((self.last_date - self.first_date).days - days, 1)))
+        return f"start_date={start}&end_date={start + timedelta(days=days)}"
+
+    def new_log(self, rng) -> dict:
+        collector_id, brigade_id = rng.choice(self.collectors)
+        return {
+            "collector_id": collector_id,
+            "brigade_id": brigade_id,
+            "harvest_date": str(self.last_date),
+            "crop_type": "Томаты",
+            "quantity": round(rng.uniform(1, 50), 1),
+            "quality_grade": rng.choice("ABC"),
+        }
+
+
+COLUMNAR = {"Accept": "application/vnd.garden.columnar+json"}
+
+# (название, вес, метод, построитель (путь, тело, заголовки) по фикстуре и генератору)
+SCENARIOS = [
+    ("auth: login", 1, "POST", lambda f, rng: ("/api/auth/login", {"username": BENCH_USERNAME, "password": BENCH_PASSWORD}, None)),
+    ("auth: profile", 5, "GET", lambda f, rng: ("/api/auth/profile", None, {"Authorization": f"Bearer {f.token}"})),
+    ("products: список", 10, "GET", lambda f, rng: ("/api/products/", None, None)),
+    ("products: категория", 5, "GET", lambda f, rng: (f"/api/products/?category_id={rng.choice(f.category_ids)}", None, None)),
+    ("products: товар", 10, "GET", lambda f, rng: (f"/api/products/{rng.choice(f.product_ids)}", None, None)),
+    ("products: категории", 3, "GET", lambda f, rng: ("/api/products/categories", None, None)),
+    ("brigades: список", 3, "GET", lambda f, rng: ("/api/brigades/", None, None)),
+    ("brigades: бригада", 5, "GET", lambda f, rng: (f"/api/brigades/{rng.choice(f.brigade_ids)}", None, None)),
+    ("brigades: сборщики бригады", 5, "GET", lambda f, rng: (f"/api/brigades/collectors?brigade_id={rng.choice(f.brigade_ids)}", None, None)),
+    ("brigades: рейтинг сезона", 2, "GET", lambda f, rng: (f"/api/brigades/collectors/leaderboard?season={f.last_date.year}&brigade_id={rng.choice(f.brigade_ids)}", None, None)),
+    ("brigades: сборщик", 5, "GET", lambda f, rng: (f"/api/brigades/collectors/{rng.choice(f.collectors)[0]}", None, None)),
+    ("harvest: журнал", 10, "GET", lambda f, rng: ("/api/harvest/", None, None)),
+    ("harvest: журнал бригады за месяц", 5, "GET", lambda f, rng: (f"/api/harvest/?brigade_id={rng.choice(f.brigade_ids)}&{f.period(rng, 30)}", None, None)),
+    ("harvest: журнал колонками", 5, "GET", lambda f, rng: ("/api/harvest/?limit=500", None, COLUMNAR)),
+    ("harvest: запись", 5, "GET", lambda f, rng: (f"/api/harvest/{f.log_id(rng)}", None, None)),
+    ("harvest: итоги", 3, "GET", lambda f, rng: ("/api/harvest/stats/summary", None, None)),
+    ("harvest: ряд по неделям", 2, "GET", lambda f, rng: (f"/api/harvest/stats/timeseries?bucket=week&{f.period(rng, 365)}", None, None)),
+    ("harvest: рейтинг", 2, "GET", lambda f, rng: (f"/api/harvest/stats/leaderboard?{f.period(rng, 90)}", None, None)),
+    ("harvest: выгрузка за неделю", 1, "GET", lambda f, rng: (f"/api/harvest/export?format=csv&{f.period(rng, 7)}", None, None)),
+    ("harvest: новая запись", 3, "POST", lambda f, rng: ("/api/harvest/", f.new_log(rng), None)),
+    ("harvest: взвешивание с весов", 3, "POST", lambda f, rng: ("/api/harvest/ingest", f.new_log(rng), None)),
+]
+
+
+def percentile(ordered: list, share: float) -> float:
+    """Перцентиль по ближайшему рангу (ordered отсортирован)"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(percentile(ordered, 0.99) * 1000, 2),
+            "max": round((ordered[-1] if ordered else 0.0) * 1000, 2),
+        },
+    }
+
+
+async def run_load(app, fixture: Fixture, scenarios: list, total: int, concurrency: int, seed: int) -> tuple:
+    """Прогнать total запросов в concurrency параллельных «клиентах»; (задержки, ошибки, время) по сценариям"""
+    import httpx
+
+    samples = {name: [] for name, *_ in scenarios}
+    errors = {name: 0 for name, *_ in scenarios}
+    weights = [weight for _, weight, *_ in scenarios]
+    remaining = total
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        login = await client.post("/api/auth/login", json={"username": BENCH_USERNAME, "password": BENCH_PASSWORD})
+        login.raise_for_status()
+        fixture.token = login.json()["access_token"]
+
+        async def worker(number: int):
+            nonlocal remaining
+            rng = random.Random(seed * 1000 + number)
+            while remaining > 0:
+                remaining -= 1
+                name, _, method, build = rng.choices(scenarios, weights)[0]
+                path, body, headers = build(fixture, rng)
+                started = time.perf_counter()
+                response = await client.request(method, path, json=body, headers=headers)
+                samples[name].append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, errors, elapsed
+
+
+def compare(report: dict, baseline: dict):
+    """Напечатать изменение rps и p95 по сравнению с прошлым отчётом"""
+    print(f"{'сценарий':40} {'rps':>16} {'p95, мс':>20}")
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        rps_change = (current["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0
+        p95_change = (
+            (current["latency_ms"]["p95"] / previous["latency_ms"]["p95"] - 1) * 100
+            if previous["latency_ms"]["p95"] else 0
+        )
+        print(
+            f"{name:40} {current['rps']:>8} ({rps_change:+5.1f}%) "
+            f"{current['latency_ms']['p95']:>10} ({p95_change:+5.1f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API в процессе (ASGI)")
+    parser.add_argument("--database-url", help="заполненная benchmarks.dataset база; по умолчанию — временная SQLite")
+    parser.add_argument("--requests", type=int, default=2000, help="всего запросов")
+    parser.add_argument("--concurrency", type=int, default=16, help="параллельных клиентов")
+    parser.add_argument("--only", help="только сценарии, в названии которых есть эта строка")
+    parser.add_argument("--output", help="записать отчёт в JSON-файл")
+    parser.add_argument("--baseline", help="сравнить с прошлым JSON-отчётом")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        dataset = None
+        if not database_url:
+            database_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            dataset = create_dataset(database_url, config)
+        os.environ["DATABASE_URL"] = database_url
+
+        from app.database import SessionLocal
+        from app.main import app
+
+        db = SessionLocal()
+        try:
+            fixture = Fixture(db)
+        finally:
+            db.close()
+        scenarios = [scenario for scenario in SCENARIOS if not args.only or args.only in scenario[0]]
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                return await run_load(app, fixture, scenarios, args.requests, args.concurrency, config.seed)
+
+        samples, errors, elapsed = asyncio.run(run())
+
+    report = {
+        "benchmark": "load_in_process",
+        "python": sys.version.split()[0],
+        "database": database_url.split(":", 1)[0],
+        "dataset": dataset or "внешняя база",
+        "seed": config.seed,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "total": summarize([value for values in samples.values() for value in values], sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(samples[name], errors[name], elapsed) for name in samples if samples[name]},
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
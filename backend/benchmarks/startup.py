@@ -0,0 +1,82 @@
+"""Время от запуска процесса uvicorn до первого успешного ответа /health.
+
+Запуск из каталога backend:
+    python -m benchmarks.startup --runs 5 --output benchmarks/results/startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_for_health(url: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=0.5) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def measure(env: dict, port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_health(f"http://127.0.0.1:{port}/health", timeout):
+            raise RuntimeError("Сервер не ответил на /health")
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк времени старта (time-to-first-request)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--database-url", help="по умолчанию — временная база SQLite")
+    parser.add_argument("--output", help="записать результат в JSON-файл")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as tmp:
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        subprocess.run([sys.executable, "manage.py", "migrate"], cwd=BACKEND_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings = [measure(env, args.port, args.timeout) for _ in range(args.runs)]
+
+    result = {
+        "benchmark": "startup_time_to_first_request",
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "seconds": {
+            "min": round(min(timings), 4),
+            "median": round(statistics.median(timings), 4),
+            "max": round(max(timings), 4),
+        },
+    }
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
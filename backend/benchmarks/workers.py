@@ -0,0 +1,152 @@
+"""Масштабирование по воркерам: rps GET /api/products/ у serve.py с 1, 2, ... N воркерами.
+
+Запуск из каталога backend:
+    python -m benchmarks.workers --workers 1 2 4 --duration 10 --output benchmarks/results/workers.json
+
+Сервер запускается отдельным процессом и слушает сеть, как в продакшене. Нагрузку дают
+несколько процессов-клиентов с постоянными (keep-alive) соединениями, чтобы клиент не стал
+узким местом раньше сервера. Для честного замера клиентам нужны свои ядра сверх ядер воркеров.
+Без --database-url база SQLite создаётся во временном каталоге генератором benchmarks.dataset.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .dataset import add_config_arguments, config_from_args, create_dataset
+from .load import summarize
+from .startup import BACKEND_DIR, wait_for_health
+
+PATH = "/api/products/"
+
+
+def client(host: str, port: int, connections: int, duration: float) -> tuple:
+    """Один процесс-клиент: connections потоков, каждый со своим keep-alive соединением.
+    Возвращает (задержки успешных ответов, число ошибок)"""
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def loop():
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request("GET", PATH)
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    local.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=10)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=loop) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def load(pool, args, duration: float) -> list:
+    futures = [
+        pool.submit(client, "127.0.0.1", args.port, args.connections, duration) for _ in range(args.clients)
+    ]
+    return [future.result() for future in futures]
+
+
+def measure(env: dict, workers: int, args) -> dict:
+    """Запустить serve.py с workers воркерами, прогреть и нагрузить; по SIGTERM замерить остановку"""
+    process = subprocess.Popen(
+        [sys.executable, "serve.py"], cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**env, "SERVER_WORKERS": str(workers), "SERVER_PORT": str(args.port)},
+    )
+    try:
+        if not wait_for_health(f"http://127.0.0.1:{args.port}/health", args.timeout):
+            raise RuntimeError("Сервер не ответил на /health")
+        with ProcessPoolExecutor(args.clients) as pool:
+            # Прогрев: все воркеры стартовали, кэш каталога заполнен
+            load(pool, args, args.warmup)
+            started = time.perf_counter()
+            results = load(pool, args, args.duration)
+            elapsed = time.perf_counter() - started
+    finally:
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+    return {
+        "workers": workers,
+        **summarize([value for latencies, _ in results for value in latencies], sum(e for _, e in results), elapsed),
+        "shutdown_seconds": round(time.perf_counter() - stopping, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк масштабирования rps по числу воркеров serve.py")
+    parser.add_argument("--workers", type=int, nargs="+", help="числа воркеров; по умолчанию 1, 2, 4 ... до числа ядер")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд нагрузки на каждое число воркеров")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--clients", type=int, default=4, help="процессов-клиентов")
+    parser.add_argument("--connections", type=int, default=8, help="keep-alive соединений на клиента")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--database-url", help="заполненная benchmarks.dataset база; по умолчанию — временная SQLite")
+    parser.add_argument("--output", help="записать отчёт в JSON-файл")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        if not database_url:
+            database_url = f"sqlite:///{os.path.join(tmp, 'workers.db')}"
+            create_dataset(database_url, config_from_args(args))
+        # serve импортирует настройки приложения — только после того, как выбрана база
+        os.environ["DATABASE_URL"] = database_url
+        from serve import available_cpus
+
+        cpus = available_cpus()
+        counts = args.workers or sorted({*(2 ** power for power in range(cpus.bit_length())), cpus})
+        # Замеряется сам сервер: допуск по пулам отрезал бы часть нагрузки 503
+        env = {**os.environ, "DATABASE_URL": database_url, "ADMISSION_ENABLED": "false"}
+        runs = [measure(env, workers, args) for workers in counts]
+
+    baseline = runs[0]["rps"] / runs[0]["workers"] if runs[0]["rps"] else 0
+    for run in runs:
+        run["speedup"] = round(run["rps"] / runs[0]["rps"], 2) if runs[0]["rps"] else 0
+        # Доля линейного роста от одного воркера
+        run["efficiency"] = round(run["rps"] / (baseline * run["workers"]), 2) if baseline else 0
+
+    report = {
+        "benchmark": "workers_scaling",
+        "python": sys.version.split()[0],
+        "path": PATH,
+        "cpus": cpus,
+        "clients": args.clients,
+        "connections": args.clients * args.connections,
+        "seconds": args.duration,
+        "runs": runs,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import sys
+from app.database import SessionLocal, sync_indexes
+from app.functional.harvest_rollup import rebuild_harvest_rollup
+from app.functional.season_stats import rebuild_season_stats
+from app.functional.harvest_partitions import archive_season, sync_season_indexes
+from app.functional.crops import migrate_crop_dictionary
+from app.functional.query_plans import check_query_plans
+from app.functional.orders import release_expired_reservations
+from app.functional.static_assets import asset_store
+from app.migrations import migrate, current_version, create_partitions
+
+
+def migrate_db(args):
+    """Применить недостающие миграции схемы"""
+    applied = migrate()
+    for number, description in applied:
+        print(f"✅ Миграция {number}: {description}")
+    print(f"Версия схемы: {current_version()}")
+
+
+def create_season_partitions(args):
+    """Заранее создать секции журнала; запускать по расписанию, например раз в месяц
+    (запись в сезон без секции создаёт её сама, но ждёт блокировку)"""
+    created = create_partitions(args.seasons)
+    print(f"✅ Созданы секции сезонов: {', '.join(map(str, created))}" if created else "Все секции уже есть")
+
+
+def rebuild_rollup(args):
+    """Пересчитать суточные итоги и итоги сезона журнала урожая"""
+    db = SessionLocal()
+    try:
+        rows = rebuild_harvest_rollup(db)
+        print(f"✅ Суточные итоги пересчитаны: {rows} строк")
+        rows = rebuild_season_stats(db)
+        print(f"✅ Итоги сезона пересчитаны: {rows} строк по сборщикам")
+    finally:
+        db.close()
+
+
+def archive_harvest_season(args):
+    """Закрыть сезон: перенести его журнал в архив только для чтения"""
+    db = SessionLocal()
+    try:
+        archived = archive_season(db, args.season)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+    print(
+        f"✅ Сезон {archived['season']} в архиве {archived['table']}: {archived['logs']} записей "
+        f"с {archived['first_date']} по {archived['last_date']}"
+    )
+
+
+def migrate_crops(args):
+    """Перевести журнал на справочник культур и пересчитать итоги"""
+    db = SessionLocal()
+    try:
+        updated = migrate_crop_dictionary(db)
+        print(f"✅ Справочник культур заполнен, обновлено записей журнала: {updated}")
+        rows = rebuild_harvest_rollup(db)
+        print(f"✅ Суточные итоги пересчитаны: {rows} строк")
+    finally:
+        db.close()
+
+
+def sync_db_indexes(args):
+    """Создать недостающие и удалить устаревшие индексы"""
+    sync_indexes()
+    db = SessionLocal()
+    try:
+        sync_season_indexes(db)
+    finally:
+        db.close()
+    print("✅ Индексы приведены к моделям")
+
+
+def release_reservations(args):
+    """Вернуть на склад товар просроченных неоплаченных заказов"""
+    db = SessionLocal()
+    try:
+        released = release_expired_reservations(db)
+        print(f"✅ Освобождено просроченных резервов: {released}")
+    finally:
+        db.close()
+
+
+def build_assets(args):
+    """Посчитать хэши статики и заранее сжать её (gzip, brotli), чтобы старт сервера не тратил на это время"""
+    result = asset_store.build()
+    print(f"✅ Статика собрана: {result['files']} файлов, из них страниц {result['pages']}, пересобрано {result['rebuilt']}")
+
+
+def check_plans(args):
+    """EXPLAIN горячих запросов; код выхода 1, если какой-то из них деградировал до полного просмотра"""
+    db = SessionLocal()
+    try:
+        report = check_query_plans(db)
+    finally:
+        db.close()
+
+    failed = 0
+    for name, lines, full_scans in report:
+        status = "❌" if full_scans else "✅"
+        print(f"{status} {name}")
+        if full_scans or args.verbose:
+            for line in lines:
+                print(f"    {line}")
+        failed += bool(full_scans)
+    if failed:
+        print(f"Полный просмотр таблиц в {failed} запросах")
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Служебные команды платформы учёта урожая")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="создать или обновить схему базы").set_defaults(func=migrate_db)
+    partitions = commands.add_parser("create-partitions", help="создать секции журнала на будущие сезоны")
+    partitions.add_argument("seasons", type=int, nargs="*", help="сезоны (по умолчанию текущий и следующий)")
+    partitions.set_defaults(func=create_season_partitions)
+    commands.add_parser("rebuild-rollup", help="пересчитать суточные итоги и итоги сезона журнала").set_defaults(func=rebuild_rollup)
+    archive = commands.add_parser("archive-season", help="перенести журнал закончившегося сезона в архив")
+    archive.add_argument("season", type=int, help="сезон (год)")
+    archive.set_defaults(func=archive_harvest_season)
+    commands.add_parser("migrate-crops", help="перевести журнал на справочник культур").set_defaults(func=migrate_crops)
+    commands.add_parser("sync-indexes", help="привести индексы базы к моделям").set_defaults(func=sync_db_indexes)
+    commands.add_parser(
+        "release-reservations", help="освободить просроченные резервы заказов"
+    ).set_defaults(func=release_reservations)
+    commands.add_parser("build-assets", help="собрать статику фронтенда").set_defaults(func=build_assets)
+    plans = commands.add_parser("check-query-plans", help="проверить планы горячих запросов (EXPLAIN)")
+    plans.add_argument("-v", "--verbose", action="store_true", help="печатать планы всех запросов")
+    plans.set_defaults(func=check_plans)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
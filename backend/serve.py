@@ -0,0 +1,169 @@
+"""Продакшен-запуск: несколько воркеров uvicorn на общем слушающем сокете.
+
+Приложение импортируется, а миграции и сборка статики выполняются один раз в главном процессе
+до fork(): воркеры стартуют быстрее, делят с ним неизменённые страницы памяти и не пишут
+в static_build_dir одновременно. Главный процесс перезапускает упавшие воркеры,
+а по SIGTERM (или SIGINT) останавливает их мягко: воркер перестаёт принимать соединения,
+дослуживает начатые запросы (не дольше SERVER_GRACEFUL_TIMEOUT_SECONDS) и выполняет
+shutdown-обработчики — буфер взвешиваний дописывается в базу. Для разработки — run.py.
+
+    python serve.py                     # воркеров по числу доступных ядер
+    SERVER_WORKERS=4 SERVER_PORT=8080 python serve.py
+"""
+import importlib.util
+import logging
+import math
+import os
+import signal
+import sys
+import time
+import uvicorn
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Код выхода воркера, который не смог стартовать (как у uvicorn): такой воркер не перезапускается
+STARTUP_FAILURE = 3
+# Воркер, упавший быстрее этого, перезапускается с паузой — чтобы не крутить перезапуски впустую
+MIN_WORKER_LIFETIME = 1.0
+
+
+def available_cpus() -> int:
+    """Ядра, доступные процессу: привязка к CPU и квота cgroup v2 (лимит CPU контейнера)"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+def build_config(app) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=settings.server_host,
+        port=settings.server_port,
+        # uvloop и httptools заметно быстрее asyncio и h11, но это необязательные зависимости
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        timeout_keep_alive=settings.server_keep_alive_seconds,
+        backlog=settings.server_backlog,
+        limit_concurrency=settings.server_limit_concurrency,
+        timeout_graceful_shutdown=settings.server_graceful_timeout_seconds,
+        access_log=settings.server_access_log,
+        lifespan="on",
+    )
+
+
+class Supervisor:
+    """Главный процесс: держит сокет и заданное число воркеров"""
+
+    def __init__(self, config: uvicorn.Config, sock, workers: int):
+        self.config = config
+        self.sock = sock
+        self.count = workers
+        self.workers = {}  # pid -> время запуска
+        self.stopping = False
+        self.deadline = None
+        self.exit_code = 0
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker()
+        self.workers[pid] = time.monotonic()
+
+    def run_worker(self):
+        # Обработчики главного процесса воркеру не нужны: uvicorn ставит свои в цикле событий
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 1
+        try:
+            server = uvicorn.Server(self.config)
+            server.run(sockets=[self.sock])
+            code = 0 if server.started else STARTUP_FAILURE
+        except Exception:
+            logger.exception("Воркер %s упал", os.getpid())
+        finally:
+            # Без atexit и финализаторов главного процесса
+            os._exit(code)
+
+    def stop(self, signum=None, frame=None):
+        if not self.stopping:
+            logger.info("Остановка: воркеры дослуживают начатые запросы")
+            self.stopping = True
+            # Запас сверх таймаута uvicorn — на shutdown-обработчики
+            self.deadline = time.monotonic() + settings.server_graceful_timeout_seconds + 5
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            return False
+        started = self.workers.pop(pid, None)
+        code = os.waitstatus_to_exitcode(status)
+        if self.stopping or started is None:
+            return True
+        if code == STARTUP_FAILURE:
+            logger.error("Воркер %s не смог стартовать, останавливаю сервер", pid)
+            self.exit_code = STARTUP_FAILURE
+            self.stop()
+            return True
+        logger.warning("Воркер %s завершился (код %s), запускаю новый", pid, code)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        self.spawn()
+        return True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.count):
+            self.spawn()
+        logger.info("Запущено воркеров: %s (pid главного процесса %s)", self.count, os.getpid())
+
+        while self.workers:
+            if self.reap():
+                continue
+            if self.stopping and time.monotonic() > self.deadline:
+                logger.error("Воркеры не остановились вовремя, завершаю принудительно: %s", list(self.workers))
+                for pid in self.workers:
+                    os.kill(pid, signal.SIGKILL)
+                self.deadline = float("inf")
+            time.sleep(0.1)
+        self.sock.close()
+        return self.exit_code
+
+
+def main():
+    # Импорт приложения до fork(): модули, роутеры и настройки воркеры получают готовыми
+    from app.main import app, prepare
+    from app.database import engine
+
+    # Миграции (AUTO_MIGRATE), проверка схемы и сборка статики — один раз здесь, а не в каждом воркере:
+    # устаревшая схема — одна понятная ошибка, а воркеры (и перезапущенные) получают статику готовой
+    prepare()
+    # Соединения не должны переходить в воркеры через fork(): у каждого воркера свой пул
+    engine.dispose()
+
+    config = build_config(app)
+    workers = settings.server_workers or available_cpus()
+    if workers == 1 or not hasattr(os, "fork"):
+        uvicorn.Server(config).run()
+        return
+
+    sock = config.bind_socket()
+    # Соединения копятся в очереди ядра, пока воркеры стартуют
+    sock.listen(settings.server_backlog)
+    sys.exit(Supervisor(config, sock, workers).run())
+
+
+if __name__ == "__main__":
+    main()
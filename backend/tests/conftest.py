@@ -0,0 +1,138 @@
+"""Общие фикстуры: временная SQLite-база со схемой после всех миграций и ASGI-клиент приложения.
+
+Настройки читаются при импорте app, поэтому окружение задаётся до него.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="garden-tests-")
+# TEST_DATABASE_URL — прогнать тесты на пустой базе PostgreSQL (схема с секциями журнала)
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"
+os.environ["AUTO_MIGRATE"] = "false"
+# Справочники и кэш каталога сверяются с базой при каждом обращении: данные тестов меняются в обход роутеров
+os.environ["REFERENCE_CHECK_SECONDS"] = "0"
+os.environ["CATALOG_CHECK_SECONDS"] = "0"
+os.environ["RESERVATION_SWEEP_SECONDS"] = "0"
+# Дешёвый bcrypt; 5, а не минимальные 4 — чтобы проверить повышение стоимости старого хэша
+os.environ["BCRYPT_ROUNDS"] = "5"
+
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.database import Base, SessionLocal, engine
+from app.migrations import create_partitions, migrate
+from app.main import app
+from app.models.brigades import Brigade
+from app.models.collectors import Collector
+from app.models.products import Product, ProductCategory
+from app.functional.crops import crop_dictionary
+from app.functional.reference_cache import reference_cache
+from app.functional.catalog_cache import catalog_cache
+
+# Таблицы, которые не очищаются между тестами
+KEEP_TABLES = {"schema_version", "reference_version", "catalog_version"}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrate()
+    # Секции прошлых сезонов заранее: тесты пишут в них, и создание на лету проверяется отдельно
+    create_partitions(range(2020, date.today().year + 2))
+
+
+@pytest.fixture(autouse=True)
+def clean_db(schema):
+    """Пустая база и сброшенные кэши процесса перед каждым тестом"""
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name not in KEEP_TABLES:
+                connection.execute(table.delete())
+    db = SessionLocal()
+    try:
+        reference_cache.changed(db)
+        db.commit()
+        crop_dictionary.reload(db)
+    finally:
+        db.close()
+    catalog_cache.invalidate()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    # Без with: startup-обработчики тестам не нужны, схему создаёт фикстура schema
+    return TestClient(app)
+
+
+@pytest.fixture
+def count_queries():
+    """Контекст, считающий SQL-запросы к базе: with count_queries() as queries: ...; len(queries)"""
+    @contextmanager
+    def counting():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
+
+
+def add_brigade(db, name: str = "Бригада", collectors: int = 1) -> tuple:
+    """Бригада и её сборщики: (бригада, [сборщики])"""
+    brigade = Brigade(name=name)
+    db.add(brigade)
+    db.flush()
+    members = [
+        Collector(full_name=f"Сборщик {number}", birth_year=1990, brigade_id=brigade.id)
+        for number in range(collectors)
+    ]
+    db.add_all(members)
+    reference_cache.changed(db)
+    db.commit()
+    return brigade, members
+
+
+def add_products(db, count: int, stock: int = 10, name: str = "Удобрения") -> tuple:
+    """Категория и count товаров в ней: (категория, [товары])"""
+    category = ProductCategory(name=name)
+    db.add(category)
+    db.flush()
+    products = [
+        Product(name=f"Товар {number}", price=100.0, stock=stock, category_id=category.id)
+        for number in range(count)
+    ]
+    db.add_all(products)
+    reference_cache.changed(db)
+    db.commit()
+    catalog_cache.invalidate()
+    return category, products
+
+
+def log_payload(collector, harvest_date: date = None, **fields) -> dict:
+    """Тело POST /api/harvest/ для сборщика"""
+    return {
+        "collector_id": collector.id,
+        "brigade_id": collector.brigade_id,
+        "harvest_date": str(harvest_date or date.today()),
+        "crop_type": "Томаты",
+        "quantity": 10.0,
+        "quality_grade": "A",
+        **fields,
+    }
@@ -0,0 +1,52 @@
+"""Регистрация, вход и пересчёт хеша пароля"""
+import bcrypt
+import pytest
+from app.config import settings
+from app.models.users import User
+
+PASSWORD = "Secret_1!"
+
+
+@pytest.fixture
+def registered(client):
+    response = client.post("/api/auth/reg", json={
+        "username": "grower", "full_name": "Огородник", "password": PASSWORD, "birth_date": "1990-01-01",
+        "address": "Тестовый адрес 1", "gender": "Женский", "blood_group": "1", "rh_factor": "+",
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+def set_hash_rounds(db, rounds: int) -> str:
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+    db.query(User).update({User.password_hash: hashed})
+    db.commit()
+    return hashed
+
+
+def login(client) -> dict:
+    response = client.post("/api/auth/login", json={"username": "grower", "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_register_login_profile(client, registered):
+    assert registered["user"]["username"] == "grower"
+    token = login(client)["access_token"]
+    profile = client.get("/api/auth/profile", headers={"Authorization": f"Bearer {token}"})
+    assert profile.json()["full_name"] == "Огородник"
+    assert client.post("/api/auth/login", json={"username": "grower", "password": "Wrong_1!x"}).status_code == 401
+
+
+def test_weaker_hash_is_upgraded(client, db, registered):
+    set_hash_rounds(db, settings.bcrypt_rounds - 1)
+    login(client)
+    db.expire_all()
+    assert db.query(User.password_hash).scalar().split("$")[2] == f"{settings.bcrypt_rounds:02d}"
+
+
+def test_stronger_hash_is_kept(client, db, registered):
+    hashed = set_hash_rounds(db, settings.bcrypt_rounds + 1)
+    login(client)
+    db.expire_all()
+    assert db.query(User.password_hash).scalar() == hashed
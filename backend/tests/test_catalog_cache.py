@@ -0,0 +1,80 @@
+"""Кэш списков каталога привязан к версии каталога в базе: изменения других воркеров и остатки после заказов видны"""
+from argparse import Namespace
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import pytest
+from app.database import engine
+from app.functional.orders import release_expired_reservations
+from app.models.orders import Order
+from app.models.products import Product
+from app.models.reference import CatalogVersion
+from benchmarks.checkout import prepare
+
+STOCK = 5
+
+
+@pytest.fixture
+def shop():
+    """Товар с запасом STOCK и покупатель с ним в корзине: (id товара, заголовки покупателя)"""
+    (product_id,), (token,) = prepare(Namespace(users=1, products=1, stock=STOCK, seed=1))
+    return product_id, {"Authorization": f"Bearer {token}"}
+
+
+def catalog_stock(client, product_id: int) -> int:
+    response = client.get("/api/products/")
+    assert response.status_code == 200
+    return next(product["stock"] for product in response.json() if product["id"] == product_id)
+
+
+def catalog_version(db) -> int:
+    return db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar()
+
+
+def write_from_other_worker(product_id: int, stock: int, bump_version: bool):
+    """Запись в обход сессий этого процесса: его кэш узнаёт о ней только по версии в базе"""
+    with engine.begin() as connection:
+        connection.execute(update(Product).where(Product.id == product_id).values(stock=stock))
+        if bump_version:
+            connection.execute(update(CatalogVersion).values(version=CatalogVersion.version + 1))
+
+
+def test_other_worker_change_is_seen(client, shop):
+    product_id, _ = shop
+    assert catalog_stock(client, product_id) == STOCK
+
+    # Без новой версии ответ по-прежнему из кэша
+    write_from_other_worker(product_id, 3, bump_version=False)
+    assert catalog_stock(client, product_id) == STOCK
+
+    write_from_other_worker(product_id, 2, bump_version=True)
+    assert catalog_stock(client, product_id) == 2
+
+
+def test_orders_bump_catalog_version(client, db, shop):
+    product_id, headers = shop
+    assert catalog_stock(client, product_id) == STOCK
+    version = catalog_version(db)
+
+    order = client.post("/api/orders", headers=headers)
+    assert order.status_code == 201
+    reserved = sum(item["quantity"] for item in order.json()["items"])
+    assert catalog_version(db) == version + 1
+    assert catalog_stock(client, product_id) == STOCK - reserved
+
+    assert client.post(f"/api/orders/{order.json()['id']}/cancel", headers=headers).status_code == 200
+    assert catalog_version(db) == version + 2
+    assert catalog_stock(client, product_id) == STOCK
+
+
+def test_expired_reservations_bump_catalog_version(client, db, shop):
+    product_id, headers = shop
+    assert client.post("/api/orders", headers=headers).status_code == 201
+    version = catalog_version(db)
+
+    db.execute(update(Order).values(expires_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+    assert release_expired_reservations(db) == 1
+    assert catalog_version(db) == version + 1
+    assert release_expired_reservations(db) == 0
+    assert catalog_version(db) == version + 1
+    assert catalog_stock(client, product_id) == STOCK
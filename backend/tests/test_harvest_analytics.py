@@ -0,0 +1,102 @@
+"""Ряды по интервалам и рейтинги сборщиков по суточным итогам и итогам сезона"""
+from datetime import date
+import pytest
+from conftest import add_brigade, log_payload
+
+
+@pytest.fixture
+def collectors(client, db):
+    """Четыре сборщика в двух бригадах; сборы 2025 года: 30, 20, 20 и 10 кг"""
+    _, first = add_brigade(db, name="Север", collectors=2)
+    _, second = add_brigade(db, name="Юг", collectors=2)
+    members = first + second
+    logs = [
+        # Среда и четверг одной недели, понедельник следующей и другой месяц
+        (members[0], date(2025, 6, 4), "Томаты", 20.0, "A"),
+        (members[0], date(2025, 6, 5), "Огурцы", 10.0, "B"),
+        (members[1], date(2025, 6, 9), "Томаты", 20.0, "A"),
+        (members[2], date(2025, 6, 9), "Перец", 15.0, "C"),
+        (members[2], date(2025, 7, 1), "Перец", 5.0, "C"),
+        (members[3], date(2025, 7, 2), "Огурцы", 10.0, "A"),
+    ]
+    for collector, harvest_date, crop, quantity, grade in logs:
+        response = client.post("/api/harvest/", json=log_payload(
+            collector, harvest_date, crop_type=crop, quantity=quantity, quality_grade=grade
+        ))
+        assert response.status_code == 201
+    return members
+
+
+def timeseries(client, **params) -> dict:
+    response = client.get("/api/harvest/stats/timeseries", params={
+        "start_date": "2025-06-01", "end_date": "2025-07-31", **params
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_week_buckets_start_on_monday(client, collectors):
+    result = timeseries(client, bucket="week", group_by="crop")
+    series = {item["key"]: item for item in result["series"]}
+    assert [item["key"] for item in result["series"]] == ["Томаты", "Огурцы", "Перец"]
+    assert series["Томаты"]["points"] == [
+        {"period": "2025-06-02", "quantity": 20.0, "logs": 1},
+        {"period": "2025-06-09", "quantity": 20.0, "logs": 1},
+    ]
+    assert series["Огурцы"]["points"] == [
+        {"period": "2025-06-02", "quantity": 10.0, "logs": 1},
+        {"period": "2025-06-30", "quantity": 10.0, "logs": 1},
+    ]
+
+
+def test_month_buckets_and_group_names(client, collectors):
+    result = timeseries(client, bucket="month", group_by="brigade")
+    assert [(item["name"], item["total"]) for item in result["series"]] == [("Север", 50.0), ("Юг", 30.0)]
+    south = result["series"][1]["points"]
+    assert south == [
+        {"period": "2025-06-01", "quantity": 15.0, "logs": 1},
+        {"period": "2025-07-01", "quantity": 15.0, "logs": 2},
+    ]
+
+
+def test_group_cap_keeps_largest_groups(client, collectors):
+    result = timeseries(client, bucket="day", group_by="grade", limit=2)
+    assert [(item["key"], item["total"]) for item in result["series"]] == [("A", 50.0), ("C", 20.0)]
+    assert client.get("/api/harvest/stats/timeseries", params={"limit": 51}).status_code == 422
+
+
+def test_too_many_buckets_rejected(client, collectors):
+    response = client.get("/api/harvest/stats/timeseries", params={
+        "bucket": "day", "start_date": "2024-01-01", "end_date": "2025-12-31"
+    })
+    assert response.status_code == 400
+
+
+def test_leaderboard_ties_share_rank(client, collectors):
+    response = client.get("/api/harvest/stats/leaderboard", params={
+        "start_date": "2025-01-01", "end_date": "2025-12-31", "limit": 2
+    })
+    entries = response.json()
+    # Места при равенстве общие, поэтому строк больше limit
+    assert [(entry["rank"], entry["collector_id"], entry["quantity"]) for entry in entries] == [
+        (1, collectors[0].id, 30.0), (2, collectors[1].id, 20.0), (2, collectors[2].id, 20.0),
+    ]
+    assert entries[0]["share"] == 0.375
+    assert entries[1]["brigade_name"] == "Север"
+
+
+def test_leaderboard_within_brigade(client, collectors):
+    response = client.get("/api/harvest/stats/leaderboard", params={"brigade_id": collectors[2].brigade_id})
+    assert [(entry["rank"], entry["collector_id"]) for entry in response.json()] == [
+        (1, collectors[2].id), (2, collectors[3].id),
+    ]
+
+
+def test_season_leaderboard_ranks(client, collectors):
+    response = client.get("/api/brigades/collectors/leaderboard", params={"season": 2025, "limit": 3})
+    assert [(entry["rank"], entry["collector_id"]) for entry in response.json()] == [
+        (1, collectors[0].id), (2, collectors[1].id), (2, collectors[2].id),
+    ]
+    card = client.get(f"/api/brigades/collectors/{collectors[3].id}", params={"season": 2025}).json()
+    assert card["season_stats"]["rank"] == 4
+    assert card["season_stats"]["grades"] == {"A": 1, "B": 0, "C": 0}
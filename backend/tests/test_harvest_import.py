@@ -0,0 +1,62 @@
+"""Импорт журнала: CSV с многострочными полями, номера строк в отчёте об ошибках"""
+from datetime import date
+from conftest import add_brigade
+from app.models.harvest import HarvestLog
+
+HEADER = "collector_id,brigade_id,harvest_date,crop_type,quantity,quality_grade,notes\n"
+
+
+def import_csv(client, body: str, chunk: int = 7) -> dict:
+    # Мелкие куски: запись и поле в кавычках рвутся между чанками тела
+    data = body.encode()
+    response = client.post(
+        "/api/harvest/import?format=csv",
+        content=(data[start:start + chunk] for start in range(0, len(data), chunk)),
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_csv_quoted_newlines(client, db):
+    _, (collector,) = add_brigade(db)
+    today = date.today()
+    row = f"{collector.id},{collector.brigade_id},{today},Томаты"
+    report = import_csv(client, HEADER + (
+        f'{row},10,A,"line one\nline two"\n'
+        f'{row},5,B,"с ""кавычками"", и запятой"\r\n'
+        f"{row},7,C,\n"
+    ))
+    assert report == {"imported": 3, "failed": 0, "errors": []}
+    notes = [log.notes for log in db.query(HarvestLog).order_by(HarvestLog.id)]
+    assert notes == ["line one\nline two", 'с "кавычками", и запятой', None]
+
+
+def test_csv_error_rows_are_file_lines(client, db):
+    _, (collector,) = add_brigade(db)
+    row = f"{collector.id},{collector.brigade_id},{date.today()},Томаты"
+    report = import_csv(client, HEADER + (
+        f'{row},10,A,"многострочное\nпримечание"\n'   # строки 2-3
+        f"{row},10\n"                                 # строка 4: не хватает полей
+        "\n"                                          # строка 5: пустая
+        f"{row},-1,A,\n"                              # строка 6: количество не проходит проверку
+        f'{row},3,A,"незакрытая\n'                    # строка 7 до конца файла
+    ))
+    assert report["imported"] == 1
+    assert [error["row"] for error in report["errors"]] == [4, 6, 7]
+    assert report["errors"][0]["errors"] == ["Число полей не совпадает с заголовком"]
+
+
+def test_ndjson_error_rows_are_file_lines(client, db):
+    _, (collector,) = add_brigade(db)
+    record = (
+        f'{{"collector_id": {collector.id}, "brigade_id": {collector.brigade_id}, '
+        f'"harvest_date": "{date.today()}", "crop_type": "Томаты", "quantity": 1, "quality_grade": "A"}}'
+    )
+    response = client.post(
+        "/api/harvest/import?format=ndjson", content=f"{record}\n\nnot json\n{record}\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.json() == {
+        "imported": 2, "failed": 1, "errors": [{"row": 3, "errors": ["Некорректный JSON"]}]
+    }
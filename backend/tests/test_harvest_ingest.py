@@ -0,0 +1,116 @@
+"""Буфер взвешиваний: записи, подтверждённые 202 и отклонённые при записи пачки, сохраняются для сверки;
+строка, на которой падает пачка, не держит остальные и после max_attempts проходов отклоняется."""
+import asyncio
+from sqlalchemy.exc import OperationalError
+from app.functional import harvest_ingest
+from app.functional.harvest_ingest import HarvestIngestor
+from app.models.collectors import Collector
+from app.models.harvest import HarvestLog
+from app.schemas.schemas import HarvestLogCreate
+from conftest import add_brigade, log_payload
+
+
+def ingest_then_transfer(db, collector, brigade) -> list:
+    """Принять два взвешивания в буфер, перевести сборщика в другую бригаду и дописать буфер"""
+    ingestor = HarvestIngestor(batch_rows=100, flush_ms=60_000, max_pending=100, durable=False)
+
+    async def scenario():
+        ingestor.start()
+        accepted = [
+            await ingestor.submit(HarvestLogCreate(**log_payload(collector, quantity=quantity)))
+            for quantity in (5.0, 7.0)
+        ]
+        # Перевод в другом воркере: кэш этого воркера ещё не знает о нём
+        db.query(Collector).filter(Collector.id == collector.id).update({Collector.brigade_id: brigade.id})
+        db.commit()
+        await ingestor.stop()
+        return accepted, ingestor.stats()
+
+    return asyncio.run(scenario())
+
+
+def test_rejected_after_acknowledge_are_stored(client, db):
+    first, (collector,) = add_brigade(db, "Первая")
+    other, _ = add_brigade(db, "Вторая", collectors=0)
+
+    accepted, stats = ingest_then_transfer(db, collector, other)
+    assert [item["committed"] for item in accepted] == [False, False]
+    assert stats["rejected"] == 2 and stats["written"] == 0
+    assert db.query(HarvestLog).count() == 0
+
+    response = client.get("/api/harvest/ingest/rejects", params={"collector_id": collector.id})
+    assert response.status_code == 200
+    rejects = response.json()
+    assert {reject["provisional_id"] for reject in rejects} == {item["provisional_id"] for item in accepted}
+    assert {reject["quantity"] for reject in rejects} == {5.0, 7.0}
+    assert {reject["reason"] for reject in rejects} == {"Сборщик не состоит в указанной бригаде"}
+
+    response = client.get(f"/api/harvest/ingest/rejects/{accepted[0]['provisional_id']}")
+    assert response.status_code == 200
+    assert response.json()["brigade_id"] == first.id
+
+
+def test_written_record_has_no_reject(client, db):
+    _, (collector,) = add_brigade(db)
+
+    response = client.post("/api/harvest/ingest", json=log_payload(collector))
+    assert response.status_code == 201
+    assert client.get(f"/api/harvest/ingest/rejects/{response.json()['provisional_id']}").status_code == 404
+    assert client.get("/api/harvest/ingest/rejects").json() == []
+
+
+def poison(monkeypatch, error: Exception, quantity: float = 13.0):
+    """Запись пачки падает с error, если в ней есть взвешивание с таким количеством"""
+    insert_logs = harvest_ingest.insert_logs
+
+    def failing(db, items, memberships):
+        if any(log.quantity == quantity for _, log in items):
+            raise error
+        return insert_logs(db, items, memberships)
+
+    monkeypatch.setattr(harvest_ingest, "insert_logs", failing)
+
+
+def ingest_and_flush(collector, quantities, passes: int, **options) -> tuple:
+    """Принять взвешивания в буфер и дописать его passes проходами: (принятые, результаты проходов, счётчики)"""
+    ingestor = HarvestIngestor(batch_rows=100, flush_ms=60_000, max_pending=100, durable=False, **options)
+
+    async def scenario():
+        ingestor.start()
+        accepted = [
+            await ingestor.submit(HarvestLogCreate(**log_payload(collector, quantity=quantity)))
+            for quantity in quantities
+        ]
+        results = [await ingestor.flush() for _ in range(passes)]
+        await ingestor.stop()
+        return accepted, results, ingestor.stats()
+
+    return asyncio.run(scenario())
+
+
+def test_failing_row_is_isolated_and_rejected(client, db, monkeypatch):
+    _, (collector,) = add_brigade(db)
+    poison(monkeypatch, ValueError("плохая строка"))
+
+    accepted, results, stats = ingest_and_flush(collector, (5.0, 13.0, 7.0), passes=2, max_attempts=2)
+    # Первый проход записал соседние строки, второй исчерпал попытки виновной
+    assert results == [False, True]
+    assert sorted(quantity for quantity, in db.query(HarvestLog.quantity)) == [5.0, 7.0]
+    assert (stats["written"], stats["rejected"], stats["isolated_batches"], stats["pending"]) == (2, 1, 2, 0)
+
+    response = client.get(f"/api/harvest/ingest/rejects/{accepted[1]['provisional_id']}")
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 13.0
+    assert response.json()["reason"] == "Не удалось записать после 2 попыток: ValueError"
+
+
+def test_connection_error_keeps_batch_queued(db, monkeypatch):
+    _, (collector,) = add_brigade(db)
+    poison(monkeypatch, OperationalError("INSERT", {}, Exception("соединение потеряно")))
+
+    _, results, stats = ingest_and_flush(collector, (5.0, 13.0), passes=3, max_attempts=1)
+    # Пачка целиком остаётся в очереди, сколько бы проходов ни было: строки тут ни при чём
+    # (три прохода теста и ещё два при остановке)
+    assert results == [False, False, False]
+    assert (stats["written"], stats["rejected"], stats["failed_batches"], stats["pending"]) == (0, 0, 5, 2)
+    assert db.query(HarvestLog).count() == 0
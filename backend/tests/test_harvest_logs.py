@@ -0,0 +1,72 @@
+"""Запись журнала проверяет членство «сборщик → бригада» по базе, а не по снимку справочников воркера;
+перевод сборщика возвращает карточку с итогами сезона; списки с колоночным форматом отдают Vary: Accept
+в любом представлении."""
+from datetime import date
+import pytest
+from app.functional.columnar import COLUMNAR_JSON, COLUMNAR_MSGPACK
+from app.functional.reference_cache import reference_cache
+from app.functional.season_stats import transfer_collector
+from app.models.collectors import Collector
+from app.models.harvest import CollectorSeasonStat
+from conftest import add_brigade, log_payload
+
+
+def test_membership_checked_against_database(client, db):
+    first, (collector,) = add_brigade(db, "Первая")
+    second, _ = add_brigade(db, "Вторая", collectors=0)
+    collector_id, first_id, second_id = collector.id, first.id, second.id
+    assert client.post("/api/harvest/", json=log_payload(collector, date(2025, 6, 1))).status_code == 201
+
+    # Перевод другим воркером: версия справочников в снимке этого воркера прежняя
+    transfer_collector(db, collector_id, first_id, second_id)
+    db.query(Collector).filter(Collector.id == collector_id).update({Collector.brigade_id: second_id})
+    db.commit()
+    assert reference_cache.snapshot(db).collectors[collector_id].brigade_id == first_id
+
+    payload = {**log_payload(collector, date(2025, 6, 2)), "collector_id": collector_id}
+    response = client.post("/api/harvest/", json={**payload, "brigade_id": first_id})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Сборщик не состоит в указанной бригаде"
+
+    response = client.post("/api/harvest/", json={**payload, "brigade_id": second_id})
+    assert response.status_code == 201
+
+    stats = db.query(CollectorSeasonStat).filter(CollectorSeasonStat.collector_id == collector_id).one()
+    assert (stats.brigade_id, stats.log_count) == (second_id, 2)
+
+
+def test_unknown_collector(client, db):
+    _, (collector,) = add_brigade(db)
+    response = client.post("/api/harvest/", json={**log_payload(collector), "collector_id": collector.id + 100})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Сборщик не найден"
+
+
+def test_update_collector_returns_season_stats(client, db):
+    first, (collector,) = add_brigade(db, "Первая")
+    second, _ = add_brigade(db, "Вторая", collectors=0)
+    assert client.post("/api/harvest/", json=log_payload(collector, quantity=12.5)).status_code == 201
+
+    response = client.put(f"/api/brigades/collectors/{collector.id}", json={"brigade_id": second.id})
+    assert response.status_code == 200
+    updated = response.json()
+    assert updated == client.get(f"/api/brigades/collectors/{collector.id}").json()
+    assert updated["brigade_id"] == second.id
+    assert (updated["season_stats"]["total_quantity"], updated["season_stats"]["log_count"]) == (12.5, 1)
+
+
+@pytest.mark.parametrize("path", ["/api/harvest/", "/api/brigades/collectors"])
+@pytest.mark.parametrize("accept, media_type", [
+    (None, "application/json"),
+    ("application/json", "application/json"),
+    (COLUMNAR_JSON, COLUMNAR_JSON),
+    (COLUMNAR_MSGPACK, COLUMNAR_MSGPACK),
+])
+def test_lists_vary_on_accept(client, db, path, accept, media_type):
+    _, (collector,) = add_brigade(db)
+    assert client.post("/api/harvest/", json=log_payload(collector)).status_code == 201
+
+    response = client.get(path, headers={"Accept": accept} if accept else {})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    assert response.headers["vary"] == "Accept"
@@ -0,0 +1,73 @@
+"""Журнал по сезонам: запись в сезон без секции создаёт её на лету (в том числе из параллельных запросов),
+закрытый сезон уходит в архив без копирования строк — и в PostgreSQL, и в таблицах сезонов SQLite."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import pytest
+from sqlalchemy import inspect
+from app.database import SessionLocal, engine
+from app.functional.harvest_partitions import (
+    SEASON_CLOSED, SeasonPartitions, _sqlite_journal_view, archive_season, partition_name, season_partitions
+)
+from conftest import add_brigade, log_payload
+
+
+def seasons_with_partition() -> set:
+    with engine.connect() as connection:
+        return SeasonPartitions._load(connection)
+
+
+@pytest.fixture
+def old_season():
+    """Сезон раньше заранее созданных секций; его таблицы удаляются после теста (база PostgreSQL переживает прогон).
+    Запрашивается первой фикстурой: удаление ждёт, пока закроется сессия db"""
+    season = 2016
+    yield season
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            _sqlite_journal_view(connection, SeasonPartitions._load(connection) - {season})
+        for name in (partition_name(season), f"harvest_archive_{season}"):
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+    season_partitions._known = set()
+
+
+def test_write_creates_missing_season(old_season, client, db):
+    assert old_season not in seasons_with_partition()
+    _, (collector,) = add_brigade(db)
+
+    response = client.post("/api/harvest/", json=log_payload(collector, date(old_season, 8, 1)))
+    assert response.status_code == 201
+    assert old_season in seasons_with_partition()
+    assert client.get(f"/api/harvest/{response.json()['id']}").json()["harvest_date"] == f"{old_season}-08-01"
+
+
+def test_concurrent_writes_create_season_once(old_season):
+    def ensure(_) -> set:
+        db = SessionLocal()
+        try:
+            return season_partitions.ensure(db, {old_season})
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(ensure, range(4))) == [set()] * 4
+    assert old_season in seasons_with_partition()
+
+
+def test_archive_moves_season_table(old_season, client, db):
+    _, (collector,) = add_brigade(db)
+    ids = [
+        client.post("/api/harvest/", json=log_payload(collector, date(old_season, 7, day))).json()["id"]
+        for day in (1, 2)
+    ]
+    assert client.post("/api/harvest/", json=log_payload(collector, date(old_season + 5, 7, 1))).status_code == 201
+
+    archived = archive_season(db, old_season)
+    assert (archived["table"], archived["logs"]) == (f"harvest_archive_{old_season}", 2)
+    # Таблица сезона переименована, а не скопирована
+    assert not inspect(engine).has_table(partition_name(old_season))
+    assert old_season not in seasons_with_partition()
+
+    page = client.get("/api/harvest/", params={"limit": 10}).json()
+    assert [item["id"] for item in page["items"]][1:] == ids[::-1]
+    response = client.post("/api/harvest/", json=log_payload(collector, date(old_season, 7, 3)))
+    assert (response.status_code, response.json()["detail"]) == (409, SEASON_CLOSED)
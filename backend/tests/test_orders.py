@@ -0,0 +1,63 @@
+"""Резерв склада: параллельные оформления заказов не продают больше, чем было"""
+from argparse import Namespace
+import asyncio
+from sqlalchemy import event
+from conftest import add_products
+from app.database import SessionLocal, engine
+from app.main import app
+from app.functional.orders import reserve_stock
+from app.models.products import Product
+from benchmarks.checkout import checkout_all, prepare, verify
+
+STOCK = 20
+
+
+def test_parallel_checkouts_do_not_oversell():
+    product_ids, tokens = prepare(Namespace(users=60, products=3, stock=STOCK, seed=7))
+    statuses = asyncio.run(checkout_all(app, tokens))
+
+    assert set(statuses) <= {201, 409}
+    # Корзины больше запаса: часть заказов обязана получить отказ
+    assert statuses.get(409)
+    for product in verify(product_ids).values():
+        assert product["stock"] >= 0
+        assert product["stock"] + product["sold"] == STOCK
+
+
+def edit_stock_during_checkout(client, product_id: int, reserved: int, body: dict):
+    """PUT товара, между чтением которого и записью остатка параллельно резервируется reserved штук"""
+    done = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE products") and not done:
+            done.append(True)
+            other = SessionLocal()
+            try:
+                assert reserve_stock(other, {product_id: reserved}) == []
+                other.commit()
+            finally:
+                other.close()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        return client.put(f"/api/products/{product_id}", json=body)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_stock_edit_keeps_concurrent_reservation(client, db):
+    _, (product,) = add_products(db, 1, stock=10)
+    response = edit_stock_during_checkout(client, product.id, 4, {"stock": 15, "price": 120.0})
+    assert response.status_code == 200
+    assert response.json()["price"] == 120.0
+    # +5 к прочитанным 10, а не присваивание 15: резерв остаётся списанным
+    assert response.json()["stock"] == 11
+
+
+def test_stock_edit_below_reserved_is_rejected(client, db):
+    _, (product,) = add_products(db, 1, stock=10)
+    response = edit_stock_during_checkout(client, product.id, 8, {"stock": 5, "price": 120.0})
+    assert response.status_code == 409
+    db.expire_all()
+    # Отказ откатывает всю правку, резерв на месте
+    assert (db.get(Product, product.id).stock, db.get(Product, product.id).price) == (2, 100.0)
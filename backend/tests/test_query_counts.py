@@ -0,0 +1,63 @@
+"""Число SQL-запросов списков и карточек не растёт с числом строк (нет N+1)"""
+import pytest
+from conftest import add_brigade, add_products, log_payload
+from app.functional.catalog_cache import catalog_cache
+
+SIZES = (1, 50)
+
+
+def queries_for(client, count_queries, path: str, headers: dict = None) -> int:
+    # Первый запрос прогревает справочники в памяти; считается второй
+    assert client.get(path, headers=headers).status_code == 200
+    catalog_cache.invalidate()
+    with count_queries() as queries:
+        assert client.get(path, headers=headers).status_code == 200
+    return len(queries)
+
+
+@pytest.mark.parametrize("path, headers", [
+    ("/api/harvest/", None),
+    ("/api/harvest/{id}", None),
+    ("/api/harvest/?limit=500", {"Accept": "application/vnd.garden.columnar+json"}),
+])
+def test_harvest(client, db, count_queries, path, headers):
+    counts = []
+    for size in SIZES:
+        _, collectors = add_brigade(db, name=f"Бригада {size}", collectors=size)
+        ids = [client.post("/api/harvest/", json=log_payload(collector)).json()["id"] for collector in collectors]
+        counts.append(queries_for(client, count_queries, path.format(id=ids[-1]), headers))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("path", [
+    "/api/brigades/",
+    "/api/brigades/{brigade_id}",
+    "/api/brigades/collectors",
+    "/api/brigades/collectors?brigade_id={brigade_id}",
+    "/api/brigades/collectors/{collector_id}",
+])
+def test_brigades(client, db, count_queries, path):
+    counts = []
+    for size in SIZES:
+        brigade, collectors = add_brigade(db, name=f"Бригада {size}", collectors=size)
+        counts.append(queries_for(
+            client, count_queries, path.format(brigade_id=brigade.id, collector_id=collectors[-1].id)
+        ))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("path", [
+    "/api/products/",
+    "/api/products/?category_id={category_id}",
+    "/api/products/{product_id}",
+    "/api/products/categories",
+    "/api/products/categories/{category_id}",
+])
+def test_products(client, db, count_queries, path):
+    counts = []
+    for size in SIZES:
+        category, products = add_products(db, size, name=f"Удобрения {size}")
+        counts.append(queries_for(
+            client, count_queries, path.format(category_id=category.id, product_id=products[-1].id)
+        ))
+    assert counts[0] == counts[1]
@@ -0,0 +1,19 @@
+"""Горячие запросы роутеров не деградируют до полного просмотра таблиц (EXPLAIN, как python manage.py check-query-plans)"""
+import pytest
+from app.database import SessionLocal
+from app.functional.query_plans import HOT_QUERIES, check_query_plans
+
+
+@pytest.fixture(scope="module")
+def report():
+    db = SessionLocal()
+    try:
+        return {name: (lines, full_scans) for name, lines, full_scans in check_query_plans(db)}
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_no_full_scans(report, name):
+    lines, full_scans = report[name]
+    assert not full_scans, "\n".join(lines)
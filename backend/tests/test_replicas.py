@@ -0,0 +1,58 @@
+"""Чтение с реплик: недоступная реплика пропускается до истечения retry_seconds, в т.ч. для асинхронных движков"""
+import asyncio
+import os
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.database import ReplicaRouter
+
+
+def engines(tmp_path, prefix: str = "sqlite://") -> tuple:
+    """(основная база, [рабочая реплика, недоступная реплика]); недоступная — файл в несуществующем каталоге"""
+    make = create_async_engine if "aiosqlite" in prefix else create_engine
+    good = os.path.join(tmp_path, "replica.db")
+    broken = os.path.join(tmp_path, "missing", "replica.db")
+    return make(f"{prefix}/{os.path.join(tmp_path, 'primary.db')}"), [make(f"{prefix}/{good}"), make(f"{prefix}/{broken}")]
+
+
+def database_file(connection) -> str:
+    return os.path.basename(connection.exec_driver_sql("PRAGMA database_list").fetchone()[2])
+
+
+def test_broken_replica_is_skipped(tmp_path):
+    primary, (good, broken) = engines(tmp_path)
+    router = ReplicaRouter(primary, [broken, good], retry_seconds=60)
+
+    files = []
+    for _ in range(4):
+        with router.connect() as connection:
+            files.append(database_file(connection))
+    assert files == ["replica.db"] * 4
+    assert router.replica_status() == [{"healthy": False}, {"healthy": True}]
+
+
+def test_falls_back_to_primary(tmp_path):
+    primary, (_, broken) = engines(tmp_path)
+    router = ReplicaRouter(primary, [broken], retry_seconds=60)
+    with router.connect() as connection:
+        assert database_file(connection) == "primary.db"
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_async_broken_replica_is_skipped(tmp_path):
+    primary, (good, broken) = engines(tmp_path, "sqlite+aiosqlite://")
+    router = ReplicaRouter(primary, [broken, good], retry_seconds=60)
+
+    async def read() -> list:
+        files = []
+        for _ in range(3):
+            connection = await router.connect_async()
+            try:
+                files.append(await connection.run_sync(database_file))
+            finally:
+                await connection.close()
+        for db_engine in (primary, good, broken):
+            await db_engine.dispose()
+        return files
+
+    assert asyncio.run(read()) == ["replica.db"] * 3
+    assert router.replica_status() == [{"healthy": False}, {"healthy": True}]
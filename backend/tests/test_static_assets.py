@@ -0,0 +1,109 @@
+"""Статика: выбор сжатого варианта по Accept-Encoding с учётом q, атомарная пересборка, сборка не при старте,
+файлы, добавленные после сборки"""
+import gzip
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from conftest import add_products
+from app.functional.static_assets import IMMUTABLE, asset_store
+from app.main import app
+
+
+@pytest.fixture
+def frontend(tmp_path, monkeypatch):
+    """Статика из одного файла стилей во временном каталоге; сборки ещё не было"""
+    root = tmp_path / "frontend"
+    (root / "styles").mkdir(parents=True)
+    (root / "styles" / "main.css").write_text("body { color: green; }\n" * 100)
+    for name, value in (("roots", [str(root)]), ("build_dir", str(tmp_path / ".build")), ("_assets", {}), ("_versioned", {})):
+        monkeypatch.setattr(asset_store, name, value)
+    monkeypatch.setattr(asset_store, "built", False)
+
+
+@pytest.fixture
+def styles(frontend):
+    asset_store.build()
+    return asset_store.url("styles/main.css")
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("*;q=0.3, br;q=0", "gzip"),
+    ("identity", None),
+    ("", None),
+    ("br;q=abc, gzip", "gzip"),
+])
+def test_accept_encoding_weights(client, styles, accept, encoding):
+    response = client.get(styles, headers={"Accept-Encoding": accept})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text.startswith("body { color: green; }")
+
+
+def test_rebuild_replaces_files_atomically(styles, tmp_path):
+    asset, _ = asset_store.get("styles/main.css")
+    compressed = asset.variants["gzip"][0]
+    with open(compressed, "rb") as reader:
+        # Уже открытый ответ дочитывает прежнюю сборку: файл заменён, а не переписан поверх
+        (tmp_path / "frontend" / "styles" / "main.css").write_text("body { color: red; }\n" * 200)
+        asset_store.build()
+        assert gzip.decompress(reader.read()).startswith(b"body { color: green; }")
+    with open(compressed, "rb") as f:
+        assert gzip.decompress(f.read()).startswith(b"body { color: red; }")
+    assert not [name for _, _, files in os.walk(tmp_path / ".build") for name in files if name.endswith(".tmp")]
+
+
+def test_startup_skips_prepared_build(monkeypatch):
+    # Под serve.py статику собрал главный процесс до fork(): воркер её не пересобирает
+    monkeypatch.setattr(app.state, "prepared", True, raising=False)
+    monkeypatch.setattr(asset_store, "build", lambda: pytest.fail("сборка в воркере"))
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+
+
+def test_startup_leaves_assets_to_first_request(frontend):
+    # Без serve.py старт до первого ответа не ждёт сборки статики: она выполняется при первом обращении
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        assert not asset_store.built
+        response = client.get("/assets/styles/main.css")
+        assert response.status_code == 200
+        assert response.text.startswith("body { color: green; }")
+    assert asset_store.built
+
+
+def test_import_does_not_load_migrations(tmp_path):
+    # Миграции импортируются в prepare() и manage.py, а не вместе с приложением
+    code = "import sys, app.main; sys.exit('app.migrations' in sys.modules)"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'import.db'}"}
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", code], cwd=backend, env=env).returncode == 0
+
+
+def test_image_added_after_build(client, db, styles, tmp_path):
+    # Изображение загружено в работающий сервер: сборки после этого не было
+    (tmp_path / "frontend" / "images").mkdir()
+    (tmp_path / "frontend" / "images" / "new.png").write_bytes(b"\x89PNG" + b"\0" * 64)
+    _, (product,) = add_products(db, 1)
+    product.image_url = "/images/new.png"
+    db.commit()
+
+    assert client.get("/images/new.png").status_code == 200
+    image_url = client.get(f"/api/products/{product.id}").json()["image_url"]
+    assert image_url.startswith("/assets/images/new.") and image_url.endswith(".png")
+    assert client.get("/api/products/").json()[0]["image_url"] == image_url
+    response = client.get(image_url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
+
+
+@pytest.mark.parametrize("path", ["/images/missing.png", "/assets/..%2F..%2Fconftest.py", "/assets/.build/manifest.json"])
+def test_unknown_files_are_not_found(client, styles, path):
+    assert client.get(path).status_code == 404